@@ -0,0 +1,53 @@
+from .archive import RecallArchive, tokenize
+from .blobs import ImageBlobStore
+from .cache import MessageCache
+from .components import classify, classify_onebot
+from .dedup import LocalCoordinator, RecallCoordinator, SQLiteCoordinator
+from .fallback import RecallFallback
+from .llm_client import CircuitBreaker, LLMClient, LLMUnavailableError
+from .metrics import MetricsRegistry
+from .policy import GroupPolicy, PolicyTable, parse_overrides
+from .prefilter import ALLOW, DENY, UNDECIDED, LocalFilter
+from .prompt import PromptBuilder, estimate_tokens, truncate_middle
+from .ratelimit import RecallScheduler, TokenBucket
+from .records import CachedMessage
+from .replies import parse_combined_reply
+from .simhash import SimHashIndex, simhash
+from .store import MessageStore
+from .ttl_cache import TTLCache, content_key
+
+__all__ = [
+    "ALLOW",
+    "DENY",
+    "UNDECIDED",
+    "CachedMessage",
+    "CircuitBreaker",
+    "GroupPolicy",
+    "ImageBlobStore",
+    "LLMClient",
+    "LLMUnavailableError",
+    "LocalCoordinator",
+    "LocalFilter",
+    "MessageCache",
+    "MessageStore",
+    "MetricsRegistry",
+    "PolicyTable",
+    "PromptBuilder",
+    "RecallArchive",
+    "RecallCoordinator",
+    "RecallFallback",
+    "RecallScheduler",
+    "SQLiteCoordinator",
+    "SimHashIndex",
+    "TTLCache",
+    "TokenBucket",
+    "classify",
+    "classify_onebot",
+    "content_key",
+    "estimate_tokens",
+    "parse_combined_reply",
+    "parse_overrides",
+    "simhash",
+    "tokenize",
+    "truncate_middle",
+]
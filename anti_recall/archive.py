@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import deque
+
+from .records import CachedMessage
+
+# 英文和数字按整词索引，中日韩文字按相邻两字索引
+_TOKEN_RUNS = re.compile(r"[0-9a-z_]+|[぀-ヿ㐀-鿿가-힯]+")
+
+_EMPTY: deque = deque()
+
+
+def _is_wide(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def tokenize(text: str) -> set:
+    """把文本拆分为倒排索引使用的词项"""
+    tokens = set()
+    for run in _TOKEN_RUNS.findall(text.lower()):
+        if not _is_wide(run) or len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class ArchivedRecall:
+    __slots__ = ("message_id", "operator_id", "recalled_at", "record", "tokens")
+
+    def __init__(self, message_id, record, recalled_at, operator_id, tokens):
+        self.message_id = message_id
+        self.record = record
+        self.recalled_at = recalled_at
+        self.operator_id = operator_id
+        self.tokens = tokens
+
+
+class RecallArchive:
+    """有容量上限的撤回消息档案
+
+    记录按撤回时间顺序追加，超出 max_entries 时淘汰最旧的记录。
+    群组、发送者和词项各自维护一个按时间排序的倒排列表；最旧的记录总在每个列表的队首，
+    淘汰时只需从相关列表的队首弹出。查询从最短的候选列表开始，从新到旧遍历并逐条核对其余条件，
+    按时间范围提前结束，不会对全部记录排序。
+
+    指定 path 时，新记录追加写入 JSONL 文件（由后台任务批量写入），启动时从文件恢复。
+    写入失败时待写的记录保留到下次重试（最多保留 max_entries 条），错误通过 on_error 回调报告。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100000,
+        path: str | None = None,
+        flush_interval: float = 5,
+        on_error=None,
+    ):
+        self.max_entries = max_entries
+        self.path = path
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self._entries: deque = deque()
+        self._by_group: dict = {}
+        self._by_sender: dict = {}
+        self._by_token: dict = {}
+        self._pending: list = []
+        self._file_lines = 0
+        self._writer_task = None
+        self.evicted = 0
+        self.write_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def start(self):
+        """从文件恢复记录并启动后台写入任务"""
+        if not self.path:
+            return
+        await asyncio.to_thread(self._load)
+        self._writer_task = asyncio.create_task(self._run_writer())
+
+    async def close(self):
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        try:
+            await self.flush()
+        except (OSError, ValueError) as e:
+            self._report(e)
+
+    def add(
+        self,
+        message_id: str,
+        record: CachedMessage,
+        recalled_at: float | None = None,
+        operator_id=None,
+    ):
+        """归档一条撤回消息"""
+        if recalled_at is None:
+            recalled_at = time.time()
+        self._append(message_id, record, recalled_at, operator_id)
+        if self.path:
+            self._pending.append(_encode(message_id, record, recalled_at, operator_id))
+
+    def search(
+        self,
+        group_id: str | None = None,
+        sender_id: str | None = None,
+        keyword: str = "",
+        since: float | None = None,
+        until: float | None = None,
+        offset: int = 0,
+        limit: int = 10,
+    ) -> tuple:
+        """按条件查询，从新到旧返回 ([ArchivedRecall], 是否还有更多)"""
+        keyword = keyword.lower().strip()
+        query_tokens = tokenize(keyword) if keyword else set()
+        # 单个中文字符没有对应的二元词项，只能逐条核对内容
+        indexed = {token for token in query_tokens if len(token) > 1 or token.isascii()}
+        words = keyword.split()
+
+        lists = []
+        if group_id:
+            lists.append(self._by_group.get(group_id, _EMPTY))
+        if sender_id:
+            lists.append(self._by_sender.get(sender_id, _EMPTY))
+        for token in indexed:
+            lists.append(self._by_token.get(token, _EMPTY))
+        candidates = min(lists, key=len) if lists else self._entries
+
+        results = []
+        skipped = 0
+        for entry in reversed(candidates):
+            if until is not None and entry.recalled_at > until:
+                continue
+            if since is not None and entry.recalled_at < since:
+                break
+            record = entry.record
+            if group_id and record.group_id != group_id:
+                continue
+            if sender_id and record.sender_id != sender_id:
+                continue
+            if indexed and not all(token in entry.tokens for token in indexed):
+                continue
+            if words:
+                content = record.content.lower()
+                if not all(word in content for word in words):
+                    continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            if len(results) == limit:
+                return results, True
+            results.append(entry)
+        return results, False
+
+    def group_counts(self) -> dict:
+        return {group_id: len(entries) for group_id, entries in self._by_group.items()}
+
+    async def flush(self):
+        """把新归档的记录追加到文件，文件中的行数超过容量两倍时重写
+
+        写入失败时记录放回待写队列并抛出异常。
+        """
+        if not self.path or not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        try:
+            if self._file_lines + len(lines) > self.max_entries * 2:
+                await asyncio.to_thread(
+                    self._rewrite,
+                    [
+                        _encode(e.message_id, e.record, e.recalled_at, e.operator_id)
+                        for e in self._entries
+                    ],
+                )
+            else:
+                await asyncio.to_thread(self._append_lines, lines)
+        except BaseException:
+            # 超出容量的旧记录即使写入也会在下次重写时丢弃
+            self._pending = (lines + self._pending)[-self.max_entries :]
+            raise
+
+    async def _run_writer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except (OSError, ValueError) as e:
+                self._report(e)
+
+    def _report(self, error: Exception):
+        self.write_errors += 1
+        if self.on_error:
+            self.on_error(error)
+
+    def _append(self, message_id, record, recalled_at, operator_id):
+        # 词项字符串驻留共享，每条记录只保存元组
+        tokens = tuple(sys.intern(token) for token in tokenize(record.content))
+        entry = ArchivedRecall(message_id, record, recalled_at, operator_id, tokens)
+        self._entries.append(entry)
+        _index(self._by_group, record.group_id, entry)
+        _index(self._by_sender, record.sender_id, entry)
+        for token in tokens:
+            _index(self._by_token, token, entry)
+        while len(self._entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        entry = self._entries.popleft()
+        record = entry.record
+        _unindex(self._by_group, record.group_id)
+        _unindex(self._by_sender, record.sender_id)
+        for token in entry.tokens:
+            _unindex(self._by_token, token)
+        self.evicted += 1
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        self._file_lines = len(lines)
+        for line in lines[-self.max_entries :]:
+            try:
+                self._append(*_decode(line))
+            except (ValueError, TypeError):
+                continue
+
+    def _append_lines(self, lines: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in lines)
+        self._file_lines += len(lines)
+
+    def _rewrite(self, lines: list):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".archive-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in lines)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._file_lines = len(lines)
+
+
+def _index(index: dict, key, entry: ArchivedRecall):
+    entries = index.get(key)
+    if entries is None:
+        entries = index[key] = deque()
+    entries.append(entry)
+
+
+def _unindex(index: dict, key):
+    # 被淘汰的记录是全局最旧的，因此也是每个相关列表的队首
+    entries = index[key]
+    entries.popleft()
+    if not entries:
+        del index[key]
+
+
+def _encode(message_id, record: CachedMessage, recalled_at, operator_id) -> str:
+    row = list(record.to_row())
+    # 内容以明文保存，恢复时按未压缩的形式载入
+    row[5] = record.content
+    return json.dumps([message_id, recalled_at, operator_id, *row], ensure_ascii=False)
+
+
+def _decode(line: str) -> tuple:
+    message_id, recalled_at, operator_id, *row = json.loads(line)
+    return message_id, CachedMessage.from_row(row), recalled_at, operator_id
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import re
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict
+
+_DIGEST_NAME = re.compile(r"[0-9a-f]{64}")
+_INDEX_NAME = "urls.jsonl"
+
+
+class ImageBlobStore:
+    """按内容哈希保存图片的本地存储
+
+    - prefetch 只把地址放入有界队列后立即返回，由固定数量的后台任务下载，队列满时直接丢弃
+    - 文件名为内容的 SHA-256，不同地址指向同一张图片时只保存一份
+    - 总大小超过 max_bytes 时按最近使用顺序删除最旧的文件
+    - 地址到哈希的映射追加写入 urls.jsonl，启动时加载并压缩，没有地址指向的文件直接删除
+    - 只保存 Content-Type 为 image/* 的响应
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        workers: int = 4,
+        queue_size: int = 256,
+        timeout: float = 10,
+        max_image_bytes: int = 10 * 1024 * 1024,
+        index_size: int = 10000,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.index_size = index_size
+        # 哈希 -> 文件大小，按最近使用排序
+        self._blobs: OrderedDict = OrderedDict()
+        # 图片地址 -> 哈希
+        self._urls: OrderedDict = OrderedDict()
+        self._pending: set = set()
+        self._queue = None
+        self._worker_tasks: list = []
+        self._index_lock = threading.Lock()
+        self.total_bytes = 0
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    async def start(self):
+        """加载已有文件并启动下载任务"""
+        await asyncio.to_thread(self._load)
+        self._shrink()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._run_worker()) for _ in range(self.workers)
+        ]
+
+    async def close(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+
+    def prefetch(self, url: str) -> bool:
+        """把图片地址加入下载队列，不等待下载；已缓存、正在下载或队列已满时返回 False"""
+        if self._queue is None or url in self._pending or url in self._urls:
+            return False
+        try:
+            self._queue.put_nowait(url)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.add(url)
+        return True
+
+    def path_for(self, url: str):
+        """返回图片地址对应的本地文件路径，未缓存时返回 None"""
+        digest = self._urls.get(url)
+        if digest is None or digest not in self._blobs:
+            return None
+        path = self._blob_path(digest)
+        try:
+            # 更新修改时间，重启后仍能按最近使用顺序淘汰
+            os.utime(path)
+        except OSError:
+            self._forget(digest)
+            return None
+        self._blobs.move_to_end(digest)
+        self._urls.move_to_end(url)
+        return path
+
+    async def _run_worker(self):
+        while True:
+            url = await self._queue.get()
+            try:
+                digest, size = await asyncio.to_thread(self._download, url)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ValueError, http.client.HTTPException):
+                self.failed += 1
+            else:
+                self._remember(url, digest, size)
+            finally:
+                self._pending.discard(url)
+                self._queue.task_done()
+
+    def _download(self, url: str) -> tuple:
+        request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            content_type = response.headers.get_content_type()
+            if not content_type.startswith("image/"):
+                raise ValueError(f"不是图片: {content_type}")
+            data = response.read(self.max_image_bytes + 1)
+        if len(data) > self.max_image_bytes:
+            raise ValueError(f"图片超过 {self.max_image_bytes} 字节")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".blob-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        line = json.dumps([url, digest], ensure_ascii=False) + "\n"
+        with self._index_lock, open(self._index_path(), "a", encoding="utf-8") as f:
+            f.write(line)
+        return digest, len(data)
+
+    def _remember(self, url: str, digest: str, size: int):
+        if digest in self._blobs:
+            self.deduplicated += 1
+            self._blobs.move_to_end(digest)
+        else:
+            self.downloaded += 1
+            self._blobs[digest] = size
+            self.total_bytes += size
+        self._urls[url] = digest
+        self._urls.move_to_end(url)
+        while len(self._urls) > self.index_size:
+            self._urls.popitem(last=False)
+        self._shrink()
+
+    def _shrink(self):
+        # 至少保留最近写入的文件
+        while self.total_bytes > self.max_bytes and len(self._blobs) > 1:
+            oldest = next(iter(self._blobs))
+            self._forget(oldest)
+            try:
+                os.remove(self._blob_path(oldest))
+            except OSError:
+                pass
+            self.evicted += 1
+
+    def _forget(self, digest: str):
+        size = self._blobs.pop(digest, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, _INDEX_NAME)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(".blob-"):
+                    # 上次未写完的临时文件
+                    os.unlink(entry.path)
+                elif entry.is_file() and _DIGEST_NAME.fullmatch(entry.name):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        sizes = {digest: size for _, digest, size in entries}
+        lines = self._load_index(sizes)
+        referenced = set(self._urls.values())
+        for _, digest, size in sorted(entries):
+            if digest in referenced:
+                self._blobs[digest] = size
+                self.total_bytes += size
+            else:
+                # 重启后无法再按地址找到的文件只会占用空间
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    pass
+        if lines > len(self._urls):
+            self._rewrite_index()
+
+    def _load_index(self, sizes: dict) -> int:
+        """读取地址索引，后写入的记录覆盖先前的，返回文件行数"""
+        lines = 0
+        try:
+            with open(self._index_path(), encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        url, digest = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    if digest in sizes:
+                        self._urls[url] = digest
+                        self._urls.move_to_end(url)
+        except FileNotFoundError:
+            return 0
+        while len(self._urls) > self.index_size:
+            self._urls.popitem(last=False)
+        return lines
+
+    def _rewrite_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".blob-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for url, digest in self._urls.items():
+                    f.write(json.dumps([url, digest], ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self._index_path())
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,270 @@
+import heapq
+import sys
+from collections import OrderedDict, deque
+
+from .records import CachedMessage
+from .timeline import CONTEXT_TYPES, GroupTimeline
+
+# 每条缓存在记录本身之外的固定开销估算：OrderedDict 节点与哈希槽、群组索引中的槽位
+ENTRY_OVERHEAD = 128
+
+
+def entry_size(message_id: str, record: CachedMessage) -> int:
+    """一条缓存占用的字节数估算"""
+    return ENTRY_OVERHEAD + sys.getsizeof(message_id) + record.memory_size()
+
+
+class MessageCache:
+    """按插入顺序淘汰的有界消息缓存
+
+    消息基本按时间顺序到达，插入顺序即可近似时间顺序，
+    因此插入、查找、删除、淘汰都是 O(1)，不再需要每次按时间戳排序。
+    同时为每个群组维护按时间排序的文本消息索引，用于提取上下文。
+
+    recall_ttl 为撤回目标的保留时间，context_ttl 为可作为上下文的文本消息的保留时间，
+    均以秒为单位，0 表示不按时间过期。
+
+    max_bytes 为按字节计的内存预算（0 表示不限制），与条数上限同时生效。
+    min_group_messages 为每个群组至少保留的最新消息数：最旧的消息所在群组已不超过该数量时，
+    改为淘汰占用字节最多的群组中最旧的消息，避免刷屏的群组挤掉其他群组的全部记录；
+    超出保底数量的群组按占用字节维护在堆中，选出该群组为 O(log 群组数)。
+
+    group_limits 为单个群组的缓存条数上限 {群号: 上限}，群组超出上限时淘汰该群组最旧的消息。
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        recall_ttl: int = 0,
+        context_ttl: int = 0,
+        max_bytes: int = 0,
+        min_group_messages: int = 0,
+        group_limits: dict | None = None,
+    ):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.min_group_messages = min_group_messages
+        self.group_limits = dict(group_limits or {})
+        self.recall_ttl = recall_ttl
+        self.context_ttl = max(context_ttl, recall_ttl) if context_ttl else 0
+        self._entries: OrderedDict = OrderedDict()
+        self._group_counts: dict = {}
+        self._group_bytes: dict = {}
+        # 有群组保底数量或条数上限时，按插入顺序记录每个群组的 (消息 ID, 记录)，用于找到群组内最旧的消息。
+        # 同时保存记录本身：同一消息 ID 被删除后可能以其他群组（多账号共用缓存）或更新的记录重新缓存，
+        # 只有缓存中的记录仍是同一对象时条目才有效
+        self._group_order: dict = {}
+        # 有群组保底数量时，超出保底数量的群组按占用字节组成的最大堆 [(-字节数, 群号)]。
+        # 群组字节数变化时压入新条目，旧条目留在堆中，取堆顶时跳过与当前字节数不符的条目
+        self._over_quota: list = []
+        self.total_bytes = 0
+        self._timelines: dict = {}
+        # 非上下文消息只需保留到撤回时限，单独按时间顺序排队等待过期
+        self._short_lived: deque = deque()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, message_id) -> bool:
+        return message_id in self._entries
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def get(self, message_id: str, default=None):
+        """获取缓存的消息，不改变淘汰顺序"""
+        return self._entries.get(message_id, default)
+
+    def put(self, message_id: str, record: CachedMessage) -> int:
+        """缓存消息，返回本次因超出容量而淘汰的消息数"""
+        if message_id in self._entries:
+            self._discard(message_id)
+        self._entries[message_id] = record
+        group_id = record.group_id
+        count = self._group_counts[group_id] = self._group_counts.get(group_id, 0) + 1
+        size = entry_size(message_id, record)
+        self._group_bytes[group_id] = self._group_bytes.get(group_id, 0) + size
+        self.total_bytes += size
+        if self.min_group_messages and count > self.min_group_messages:
+            self._push_over_quota(group_id)
+        limit = self.group_limits.get(group_id) if self.group_limits else None
+        if self.min_group_messages or limit:
+            order = self._group_order.get(group_id)
+            if order is None:
+                order = self._group_order[group_id] = deque()
+            order.append((message_id, record))
+        if record.message_type in CONTEXT_TYPES:
+            timeline = self._timelines.get(group_id)
+            if timeline is None:
+                timeline = self._timelines[group_id] = GroupTimeline()
+            timeline.add(record.timestamp, message_id)
+        elif self.recall_ttl:
+            self._short_lived.append((record.timestamp, message_id))
+
+        evicted = 0
+        if limit and count > limit:
+            self._discard(self._group_order[group_id][0][0])
+            evicted += 1
+        entries = self._entries
+        while len(entries) > 1 and (
+            len(entries) > self.max_size
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+        ):
+            self._discard(self._eviction_victim())
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def _eviction_victim(self) -> str:
+        oldest_id = next(iter(self._entries))
+        quota = self.min_group_messages
+        if not quota:
+            return oldest_id
+        # 全局最旧的消息也是其所在群组最旧的消息，群组数量不超过保底时不淘汰它
+        if self._group_counts[self._entries[oldest_id].group_id] > quota:
+            return oldest_id
+        heap = self._over_quota
+        while heap:
+            negative_bytes, group_id = heap[0]
+            if (
+                self._group_counts.get(group_id, 0) > quota
+                and self._group_bytes[group_id] == -negative_bytes
+            ):
+                return self._group_order[group_id][0][0]
+            heapq.heappop(heap)
+        # 所有群组都在保底数量以内，只能按时间淘汰
+        return oldest_id
+
+    def _push_over_quota(self, group_id: str):
+        heap = self._over_quota
+        heapq.heappush(heap, (-self._group_bytes[group_id], group_id))
+        # 过期条目过多时重建，堆的大小保持在群组数的常数倍
+        if len(heap) > 2 * len(self._group_counts) + 64:
+            quota = self.min_group_messages
+            heap[:] = [
+                (-self._group_bytes[gid], gid)
+                for gid, count in self._group_counts.items()
+                if count > quota
+            ]
+            heapq.heapify(heap)
+
+    def pop(self, message_id: str, default=None):
+        """移除并返回缓存的消息"""
+        if message_id not in self._entries:
+            return default
+        return self._discard(message_id)
+
+    def clear(self) -> int:
+        """清空缓存，返回清理的消息数"""
+        size = len(self._entries)
+        self._entries.clear()
+        self._group_counts.clear()
+        self._group_bytes.clear()
+        self._group_order.clear()
+        self._over_quota.clear()
+        self.total_bytes = 0
+        self._timelines.clear()
+        self._short_lived.clear()
+        return size
+
+    def expire(self, now: float) -> int:
+        """按时间顺序清理过期消息，返回清理的消息数
+
+        只从最旧的一端开始检查，遇到未过期的消息即停止，不做全量扫描。
+        """
+        expired = 0
+        entries = self._entries
+
+        if self.recall_ttl:
+            deadline = now - self.recall_ttl
+            short_lived = self._short_lived
+            while short_lived and short_lived[0][0] <= deadline:
+                timestamp, message_id = short_lived.popleft()
+                record = entries.get(message_id)
+                if record is not None and record.timestamp == timestamp:
+                    self._discard(message_id)
+                    expired += 1
+
+        if self.context_ttl or self.recall_ttl:
+            while entries:
+                oldest_id = next(iter(entries))
+                record = entries[oldest_id]
+                ttl = (
+                    self.context_ttl
+                    if record.message_type in CONTEXT_TYPES
+                    else self.recall_ttl or self.context_ttl
+                )
+                if not ttl or record.timestamp + ttl > now:
+                    break
+                self._discard(oldest_id)
+                expired += 1
+
+        self.expirations += expired
+        return expired
+
+    def keys(self) -> list:
+        return list(self._entries.keys())
+
+    def items(self):
+        """按缓存顺序（从旧到新）遍历 (message_id, record)"""
+        return self._entries.items()
+
+    def group_counts(self) -> dict:
+        """各群组的缓存消息数"""
+        return dict(self._group_counts)
+
+    def group_bytes(self) -> dict:
+        """各群组的缓存占用字节数"""
+        return dict(self._group_bytes)
+
+    def latest(self, count: int) -> list:
+        """返回最新的 count 条消息 [(message_id, record)]，从新到旧"""
+        result = []
+        for message_id in reversed(self._entries):
+            if len(result) >= count:
+                break
+            result.append((message_id, self._entries[message_id]))
+        return result
+
+    def recent_in_group(self, group_id: str, before_timestamp: int, count: int) -> list:
+        """返回群组内早于 before_timestamp 的最后 count 条文本消息 [(message_id, record)]，从旧到新"""
+        timeline = self._timelines.get(group_id)
+        if timeline is None:
+            return []
+        return [
+            (message_id, self._entries[message_id])
+            for message_id in timeline.recent_before(before_timestamp, count)
+        ]
+
+    def _discard(self, message_id: str):
+        record = self._entries.pop(message_id)
+        group_id = record.group_id
+        size = entry_size(message_id, record)
+        self.total_bytes -= size
+        remaining = self._group_counts.get(group_id, 0) - 1
+        if remaining > 0:
+            self._group_counts[group_id] = remaining
+            self._group_bytes[group_id] -= size
+            if self.min_group_messages and remaining > self.min_group_messages:
+                self._push_over_quota(group_id)
+        else:
+            self._group_counts.pop(group_id, None)
+            self._group_bytes.pop(group_id, None)
+        order = self._group_order.get(group_id)
+        if order is not None:
+            if remaining > 0:
+                # 撤回等中途删除的条目留在队列中，移到队首时再一并清理
+                entries = self._entries
+                while order and entries.get(order[0][0]) is not order[0][1]:
+                    order.popleft()
+            else:
+                del self._group_order[group_id]
+        if record.message_type in CONTEXT_TYPES:
+            timeline = self._timelines.get(group_id)
+            if timeline is not None:
+                timeline.remove(record.timestamp, message_id)
+                if not timeline:
+                    del self._timelines[group_id]
+        return record
@@ -0,0 +1,136 @@
+# 组件类型（ComponentType 的值，小写）-> 消息类型
+MESSAGE_TYPE_NAMES = {
+    "plain": "文本",
+    "image": "图片",
+    "record": "语音",
+    "video": "视频",
+    "file": "文件",
+    "at": "提及",
+    "face": "表情",
+    "poke": "戳一戳",
+    "reply": "引用",
+}
+
+# component.type -> 小写类型名，ComponentType 枚举和字符串都能作为键
+_TYPE_KEYS: dict = {}
+
+
+def _type_key(component_type) -> str:
+    key = _TYPE_KEYS.get(component_type)
+    if key is None:
+        value = getattr(component_type, "value", component_type)
+        key = _TYPE_KEYS[component_type] = str(value).lower()
+    return key
+
+
+def _plain(component):
+    text = component.text
+    return text, ("text", text)
+
+
+def _image(component):
+    ref = (
+        getattr(component, "url", None)
+        or getattr(component, "file", None)
+        or getattr(component, "path", None)
+        or ""
+    )
+    # 图片地址只保存在结构化组件中，文本内容里的地址会被当作网址拦截，也会撑大提示词
+    return "[图片]", ("image", ref)
+
+
+def _at(component):
+    qq = str(getattr(component, "qq", ""))
+    name = getattr(component, "name", None) or ""
+    return f"@{name or qq}", ("at", qq, name)
+
+
+def _face(component):
+    face_id = str(getattr(component, "id", ""))
+    return "[表情]", ("face", face_id)
+
+
+def _reply(component):
+    reply_id = str(getattr(component, "id", ""))
+    return "[引用]", ("reply", reply_id)
+
+
+# 小写类型名 -> 组件转换函数，返回 (文本形式, 结构化组件)
+_CONVERTERS = {
+    "plain": _plain,
+    "image": _image,
+    "at": _at,
+    "face": _face,
+    "reply": _reply,
+}
+
+
+def classify(chain) -> tuple:
+    """单次遍历消息链，返回 (消息类型, 文本内容, 结构化组件)
+
+    消息类型取链中第一个可识别的组件类型；文本内容用于缓存键、上下文和 LLM 提示词；
+    结构化组件是 ("text", 文本) / ("image", 地址) / ("at", QQ, 昵称) / ("face", ID) /
+    ("reply", 消息 ID) 组成的元组，仅在消息包含文本以外的组件时返回，纯文本消息为 None。
+    """
+    if not chain:
+        return "未知", "", None
+
+    message_type = None
+    first_key = None
+    parts = []
+    components = []
+    rich = False
+    for component in chain:
+        key = _type_key(getattr(component, "type", ""))
+        if first_key is None:
+            first_key = key
+        if message_type is None:
+            message_type = MESSAGE_TYPE_NAMES.get(key)
+
+        converter = _CONVERTERS.get(key)
+        if converter is not None:
+            text, item = converter(component)
+        elif hasattr(component, "text"):
+            text, item = _plain(component)
+        else:
+            text = f"[{MESSAGE_TYPE_NAMES.get(key, key)}]"
+            item = ("text", text)
+        parts.append(text)
+        components.append(item)
+        if item[0] != "text":
+            rich = True
+
+    return (
+        message_type or first_key or "未知",
+        "".join(parts),
+        tuple(components) if rich else None,
+    )
+
+
+# OneBot v11 消息段类型 -> 组件类型（其余类型同名）
+_ONEBOT_TYPES = {"text": "plain"}
+
+
+class _Segment:
+    """把 OneBot 消息段包装成与消息组件相同的属性访问方式"""
+
+    __slots__ = ("_data", "type")
+
+    def __init__(self, segment: dict):
+        segment_type = segment.get("type", "")
+        self.type = _ONEBOT_TYPES.get(segment_type, segment_type)
+        self._data = segment.get("data") or {}
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def classify_onebot(segments) -> tuple:
+    """解析 OneBot v11 消息段列表（如 get_msg 返回的 message 字段），结果与 classify 相同"""
+    if isinstance(segments, str):
+        # 上报格式为字符串（CQ 码）时按纯文本处理
+        return ("文本", segments, None) if segments else ("未知", "", None)
+    return classify([_Segment(segment) for segment in segments or ()])
@@ -0,0 +1,148 @@
+import abc
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recall_leases (
+    group_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (group_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_recall_leases_expires ON recall_leases (expires);
+"""
+
+
+class RecallCoordinator(abc.ABC):
+    """多个机器人账号处在同一群时，为每条撤回选出唯一的处理者
+
+    claim 对 (群号, 消息 ID) 申请租约，租约期内其他账号的申请都会失败。
+    处理完成后不释放租约，避免较晚收到撤回通知的账号在处理结束后再处理一次；
+    租约过期后记录被清理，同一消息 ID 可以再次申请。
+    """
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    async def claim(self, group_id: str, message_id: str, owner: str) -> bool:
+        """申请成功或租约已由 owner 持有时返回 True"""
+
+    def holder(self, group_id: str, message_id: str):
+        """不申请租约，只查看当前持有者；无法廉价查询时返回 None"""
+
+
+class LocalCoordinator(RecallCoordinator):
+    """进程内协调：同一个 AstrBot 进程中的多个账号共用插件实例"""
+
+    def __init__(self, lease: float = 30):
+        self.lease = lease
+        # (群号, 消息 ID) -> (持有者, 到期时间)，按申请顺序排列，便于从最旧的一端清理
+        self._leases: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._leases)
+
+    async def claim(self, group_id: str, message_id: str, owner: str) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        key = (group_id, message_id)
+        current = self._leases.get(key)
+        if current is not None:
+            return current[0] == owner
+        self._leases[key] = (owner, now + self.lease)
+        return True
+
+    def holder(self, group_id: str, message_id: str):
+        lease = self._leases.get((group_id, message_id))
+        if lease is None or lease[1] <= time.monotonic():
+            return None
+        return lease[0]
+
+    def _prune(self, now: float):
+        leases = self._leases
+        while leases:
+            key = next(iter(leases))
+            if leases[key][1] > now:
+                break
+            del leases[key]
+
+
+class SQLiteCoordinator(RecallCoordinator):
+    """跨进程协调：多个 AstrBot 进程通过同一个 SQLite 文件上的写锁竞争租约
+
+    申请是一条 UPSERT：没有记录或原租约已过期时写入自己，然后读回持有者，
+    两步在同一个 IMMEDIATE 事务中完成，SQLite 的写锁保证同一时刻只有一个进程能写入。
+    """
+
+    def __init__(self, path: str, lease: float = 30, busy_timeout: float = 5):
+        self.path = path
+        self.lease = lease
+        self.busy_timeout = busy_timeout
+        self._conn = None
+        self._lock = threading.Lock()
+        self._claims = 0
+
+    async def start(self):
+        await asyncio.to_thread(self._open)
+
+    async def close(self):
+        if self._conn is not None:
+            await asyncio.to_thread(self._close)
+
+    async def claim(self, group_id: str, message_id: str, owner: str) -> bool:
+        return await asyncio.to_thread(self._claim, group_id, message_id, owner)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    def _claim(self, group_id: str, message_id: str, owner: str) -> bool:
+        # 租约到期时间用墙上时间，各进程的单调时钟不可比较
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO recall_leases (group_id, message_id, owner, expires) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (group_id, message_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                    "WHERE recall_leases.expires <= ?",
+                    (group_id, message_id, owner, now + self.lease, now),
+                )
+                row = conn.execute(
+                    "SELECT owner FROM recall_leases WHERE group_id = ? AND message_id = ?",
+                    (group_id, message_id),
+                ).fetchone()
+                self._claims += 1
+                # 定期清理过期的租约，不必每次申请都扫描
+                if self._claims % 100 == 0:
+                    conn.execute("DELETE FROM recall_leases WHERE expires <= ?", (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row is not None and row[0] == owner
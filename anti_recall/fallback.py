@@ -0,0 +1,88 @@
+import asyncio
+
+from .components import classify_onebot
+from .records import CachedMessage
+from .ttl_cache import TTLCache
+
+
+class RecallFallback:
+    """缓存中找不到撤回消息时，通过 OneBot 的 get_msg 接口获取原消息
+
+    无法获取的消息 ID 记入负缓存，一段时间内不再重复请求；超时视为暂时失败，不记入负缓存。
+    """
+
+    def __init__(
+        self,
+        timeout: float = 3,
+        negative_ttl: float = 600,
+        negative_size: int = 1000,
+        compress_threshold: int = 0,
+    ):
+        self.timeout = timeout
+        self.compress_threshold = compress_threshold
+        self._negative = TTLCache(negative_size, negative_ttl)
+        self.fetched = 0
+        self.not_found = 0
+        self.timeouts = 0
+        self.skipped = 0
+
+    async def fetch(
+        self, call_action, message_id: str, group_id: str | None = None, sender_id=None
+    ):
+        """返回 CachedMessage，无法获取时返回 None
+
+        call_action 为适配器的 call_action(action, **params) 协程函数；
+        sender_id 为撤回通知中的发送者，get_msg 的结果缺少发送者时使用。
+        """
+        if self._negative.get(message_id):
+            self.skipped += 1
+            return None
+        try:
+            data = await asyncio.wait_for(
+                call_action("get_msg", message_id=_onebot_id(message_id)),
+                self.timeout,
+            )
+        except TimeoutError:
+            self.timeouts += 1
+            return None
+        # 适配器对已删除或无权限的消息抛出各自的异常类型，一律按查询不到处理
+        except Exception:  # noqa: BLE001
+            data = None
+
+        record = (
+            self._to_record(data, group_id, sender_id)
+            if isinstance(data, dict)
+            else None
+        )
+        if record is None:
+            self.not_found += 1
+            self._negative.set(message_id, True)
+            return None
+        self.fetched += 1
+        return record
+
+    def _to_record(self, data: dict, group_id: str | None = None, sender_id=None):
+        message_type, content, components = classify_onebot(data.get("message"))
+        if not content.strip():
+            return None
+        sender = data.get("sender") or {}
+        sender_id = str(sender.get("user_id") or data.get("user_id") or sender_id or "")
+        # 转发节点需要数字 QQ 号，无法确定发送者的消息视为获取失败
+        if not sender_id.isdigit():
+            return None
+        sender_name = sender.get("card") or sender.get("nickname") or sender_id
+        return CachedMessage(
+            content,
+            sender_id,
+            sender_name,
+            str(data.get("group_id") or group_id or ""),
+            int(data.get("time") or 0),
+            message_type,
+            self.compress_threshold,
+            components,
+        )
+
+
+def _onebot_id(message_id: str):
+    """OneBot 的消息 ID 通常是整数，撤回事件中的 ID 已统一转为字符串"""
+    return int(message_id) if message_id.lstrip("-").isdigit() else message_id
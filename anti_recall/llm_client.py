@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from .ttl_cache import TTLCache
+
+
+class LLMUnavailableError(Exception):
+    """没有可用的 LLM 提供商（未配置或熔断中）"""
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却期内直接失败；冷却结束后放行一次试探请求"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = self.CLOSED
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED or self.failure_threshold <= 0:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            return True
+        # 半开状态下已有试探请求在进行，其余请求继续快速失败
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.failure_threshold > 0 and self.failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """违规检测与锐评共用的 LLM 调用层
+
+    - 按 unified_msg_origin 缓存当前会话的提供商 ID，避免每次调用都重新查询
+    - 每次调用有超时时间，超时视为失败
+    - 每个提供商一个熔断器，连续失败后直接失败，不再等待上游超时
+    - 主提供商不可用时尝试备用提供商
+    """
+
+    def __init__(
+        self,
+        context,
+        fixed_provider: str = "",
+        fallback_provider: str = "",
+        timeout: float = 30,
+        provider_cache_ttl: float = 300,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60,
+    ):
+        self.context = context
+        self.fixed_provider = fixed_provider
+        self.fallback_provider = fallback_provider
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._providers = TTLCache(1000, provider_cache_ttl)
+        self.breakers: dict = {}
+
+    async def resolve_provider(self, umo: str):
+        """获取会话使用的提供商 ID，固定提供商优先"""
+        if self.fixed_provider:
+            return self.fixed_provider
+        provider_id = self._providers.get(umo)
+        if provider_id is None:
+            provider_id = await self.context.get_current_chat_provider_id(umo=umo)
+            if provider_id:
+                self._providers.set(umo, provider_id)
+        return provider_id
+
+    async def generate(self, umo: str, prompt: str, timeout: float | None = None):
+        """依次尝试主提供商和备用提供商，返回 (提供商 ID, LLM 响应)"""
+        # 0 表示不限时，wait_for 的超时为 0 会让每次调用立即超时
+        timeout = timeout or self.timeout or None
+        candidates = []
+        primary = await self.resolve_provider(umo)
+        if primary:
+            candidates.append(primary)
+        if self.fallback_provider and self.fallback_provider not in candidates:
+            candidates.append(self.fallback_provider)
+        if not candidates:
+            raise LLMUnavailableError("未获取到聊天模型 ID")
+
+        last_error = None
+        for provider_id in candidates:
+            breaker = self._breaker(provider_id)
+            if not breaker.allow():
+                last_error = LLMUnavailableError(f"提供商 {provider_id} 熔断中")
+                continue
+            try:
+                llm_resp = await asyncio.wait_for(
+                    self.context.llm_generate(
+                        chat_provider_id=provider_id, prompt=prompt
+                    ),
+                    timeout,
+                )
+            except asyncio.CancelledError:
+                # 调用方主动取消不算提供商故障；半开状态下需要释放试探名额
+                if breaker.state == CircuitBreaker.HALF_OPEN:
+                    breaker.state = CircuitBreaker.OPEN
+                raise
+            except TimeoutError:
+                breaker.record_failure()
+                last_error = TimeoutError(f"提供商 {provider_id} 调用超时 ({timeout}s)")
+                continue
+            # 提供商插件可能抛出任意异常，都计为失败并尝试下一个提供商
+            except Exception as e:  # noqa: BLE001
+                breaker.record_failure()
+                last_error = e
+                continue
+            breaker.record_success()
+            return provider_id, llm_resp
+        raise last_error
+
+    def breaker_states(self) -> dict:
+        return {provider_id: b.state for provider_id, b in self.breakers.items()}
+
+    def _breaker(self, provider_id: str) -> CircuitBreaker:
+        breaker = self.breakers.get(provider_id)
+        if breaker is None:
+            breaker = self.breakers[provider_id] = CircuitBreaker(
+                self.failure_threshold, self.reset_timeout
+            )
+        return breaker
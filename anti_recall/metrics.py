@@ -0,0 +1,162 @@
+import os
+import tempfile
+
+# 默认的耗时分桶（秒），覆盖发送消息到慢速 LLM 的范围
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    """只增不减的计数器，可按标签区分；也可以用 fn 从现有对象读取当前值"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, fn=None):
+        self.name = name
+        self.help = help_text
+        self._fn = fn
+        self._values: dict = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        if self._fn is not None:
+            return self._fn()
+        return self._values.get(_label_key(labels), 0)
+
+    def total(self) -> float:
+        if self._fn is not None:
+            return self._fn()
+        return sum(self._values.values())
+
+    def samples(self):
+        if self._fn is not None:
+            yield self.name, (), self._fn()
+            return
+        for key, value in self._values.items():
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """分桶统计的直方图，记录次数、总和与各桶的累计次数"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶次数..., +Inf 次数, 总和]
+        self._values: dict = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+                break
+        else:
+            data[len(self.buckets)] += 1
+        data[-1] += value
+
+    def count(self, **labels) -> int:
+        data = self._values.get(_label_key(labels))
+        return sum(data[:-1]) if data else 0
+
+    def mean(self, **labels) -> float:
+        data = self._values.get(_label_key(labels))
+        if not data:
+            return 0.0
+        count = sum(data[:-1])
+        return data[-1] / count if count else 0.0
+
+    def samples(self):
+        for key, data in self._values.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets, data):
+                cumulative += hits
+                yield f"{self.name}_bucket", key + (("le", bound),), cumulative
+            cumulative += data[len(self.buckets)]
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), cumulative
+            yield f"{self.name}_sum", key, data[-1]
+            yield f"{self.name}_count", key, cumulative
+
+
+class MetricsRegistry:
+    """插件指标注册表，可导出为 Prometheus 文本格式"""
+
+    def __init__(self, prefix: str = "anti_recall"):
+        self.prefix = prefix
+        self._metrics: dict = {}
+
+    def counter(self, name: str, help_text: str, fn=None) -> Counter:
+        return self._register(Counter, name, help_text, fn)
+
+    def gauge(self, name: str, help_text: str, fn=None) -> Gauge:
+        return self._register(Gauge, name, help_text, fn)
+
+    def histogram(
+        self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        full_name = f"{self.prefix}_{name}"
+        if full_name not in self._metrics:
+            self._metrics[full_name] = Histogram(full_name, help_text, buckets)
+        return self._metrics[full_name]
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, text: str):
+        """原子地写入 render_prometheus 生成的文本，供 node_exporter textfile 等采集
+
+        指标随消息处理不断变化，只能在事件循环中渲染；写文件不读取指标，可以放到线程中执行。
+        """
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _register(self, cls, name: str, help_text: str, fn):
+        full_name = f"{self.prefix}_{name}"
+        if full_name not in self._metrics:
+            self._metrics[full_name] = cls(full_name, help_text, fn)
+        return self._metrics[full_name]
@@ -0,0 +1,119 @@
+_BOOLEAN_VALUES = {
+    "true": True,
+    "1": True,
+    "on": True,
+    "是": True,
+    "开": True,
+    "false": False,
+    "0": False,
+    "off": False,
+    "否": False,
+    "关": False,
+}
+
+
+class GroupPolicy:
+    """单个群组生效的设置：图片撤回、AI 锐评、违规检测、缓存条数上限（0 表示不单独限制）"""
+
+    __slots__ = ("ai_comment", "cache_quota", "image_recall", "moderation")
+
+    FIELDS = __slots__
+
+    def __init__(
+        self,
+        image_recall: bool = True,
+        ai_comment: bool = True,
+        moderation: bool = True,
+        cache_quota: int = 0,
+    ):
+        self.image_recall = image_recall
+        self.ai_comment = ai_comment
+        self.moderation = moderation
+        self.cache_quota = cache_quota
+
+    def replace(self, **changes) -> "GroupPolicy":
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(changes)
+        return GroupPolicy(**values)
+
+
+def parse_overrides(lines) -> tuple:
+    """解析群组单独设置，每行形如 "群号 image_recall=false cache_quota=200"
+
+    返回 ({群号: {字段: 值}}, 无效的行)。
+    """
+    overrides = {}
+    invalid = []
+    for line in lines:
+        parts = str(line).replace(",", " ").replace("，", " ").split()
+        if not parts:
+            continue
+        group_id, changes = parts[0], {}
+        try:
+            for part in parts[1:]:
+                field, _, value = part.partition("=")
+                if field == "cache_quota":
+                    changes[field] = max(int(value), 0)
+                elif field in GroupPolicy.FIELDS:
+                    changes[field] = _BOOLEAN_VALUES[value.strip().lower()]
+                else:
+                    raise KeyError(field)
+        except (KeyError, ValueError):
+            invalid.append(line)
+            continue
+        overrides.setdefault(group_id, {}).update(changes)
+    return overrides, invalid
+
+
+class PolicyTable:
+    """在加载时预先计算的群组策略表
+
+    get 只做一次字典查找：不处理的群组（黑名单、白名单之外、私聊的空群号）返回 None，
+    有单独设置的群组返回各自的 GroupPolicy，其余群组共享默认策略。
+    """
+
+    def __init__(
+        self,
+        default: GroupPolicy,
+        allowed_groups=(),
+        denied_groups=(),
+        overrides: dict | None = None,
+        enabled: bool = True,
+    ):
+        allowed = {str(gid) for gid in allowed_groups if str(gid)}
+        denied = {str(gid) for gid in denied_groups if str(gid)}
+        self.allowed = allowed
+        self.denied = denied
+        self.overrides = {}
+        self._policies: dict = {"": None}
+        # 配置了白名单时，名单之外的群组一律不处理
+        self._default = default if enabled and not allowed else None
+        if not enabled:
+            return
+        for group_id in allowed:
+            self._policies[group_id] = default
+        for group_id, changes in (overrides or {}).items():
+            if allowed and group_id not in allowed:
+                continue
+            policy = default.replace(**changes)
+            self.overrides[group_id] = policy
+            self._policies[group_id] = policy
+        for group_id in denied:
+            self._policies[group_id] = None
+
+    def get(self, group_id):
+        """返回群组的策略，不处理的群组返回 None"""
+        return self._policies.get(group_id, self._default)
+
+    def any(self, field: str) -> bool:
+        """是否有处理的群组开启了 field 对应的功能"""
+        policies = [self._default, *self._policies.values()]
+        return any(getattr(p, field) for p in policies if p is not None)
+
+    def cache_quotas(self) -> dict:
+        """设置了缓存条数上限的群组 {群号: 上限}"""
+        return {
+            group_id: policy.cache_quota
+            for group_id, policy in self.overrides.items()
+            if policy.cache_quota and group_id not in self.denied
+        }
@@ -0,0 +1,120 @@
+import re
+
+ALLOW = "allow"
+DENY = "deny"
+UNDECIDED = "undecided"
+
+URL_PATTERN = r"https?://[^\s]+|www\.[^\s]+"
+
+
+# 反向引用（\1、\g<1>、(?P=name)）和条件分组依赖分组编号或名称，合并后编号会变
+_GROUP_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\(?:[1-9]|g<)|\(\?P=|\(\?\(")
+
+
+def _mergeable(pattern: str, compiled) -> bool:
+    """能否作为分支并入合并后的正则
+
+    命名分组会与 url、keyword 分组或其他正则的同名分组冲突，全局内联标志（如 (?i)）
+    只能出现在整个表达式开头，反向引用合并后指向错误的分组，这些正则需要单独编译。
+    """
+    if compiled.groupindex or _GROUP_REFERENCE.search(pattern):
+        return False
+    try:
+        re.compile(f"x|(?:{pattern})")
+    except re.error:
+        return False
+    return True
+
+
+def _alternation(keywords, patterns, invalid: list, separate: list) -> str:
+    """把关键词（按字面匹配）和正则合并为一个分支表达式
+
+    无效的正则记入 invalid，无法合并的正则单独编译后放入 separate。
+    """
+    # 长关键词在前，避免被其前缀抢先匹配
+    branches = [
+        re.escape(keyword)
+        for keyword in sorted({k for k in keywords if k}, key=len, reverse=True)
+    ]
+    for pattern in patterns:
+        if not pattern:
+            continue
+        try:
+            compiled = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            invalid.append(pattern)
+            continue
+        if _mergeable(pattern, compiled):
+            branches.append(f"(?:{pattern})")
+        else:
+            separate.append(compiled)
+    return "|".join(branches)
+
+
+class LocalFilter:
+    """在请求 LLM 之前执行的本地审核
+
+    所有拦截规则（网址、关键词、正则）在构造时合并编译为一个正则，每条消息只扫描一次
+    （含命名分组、全局内联标志或反向引用的正则无法合并，单独编译后在合并正则之后匹配）：
+    - 命中拦截规则 -> DENY，直接判定违规
+    - 整条内容匹配放行规则 -> ALLOW，直接判定通过
+    - 其余 -> UNDECIDED，交给 LLM 判断
+    """
+
+    def __init__(
+        self,
+        blocked_keywords=(),
+        blocked_patterns=(),
+        allowed_keywords=(),
+        allowed_patterns=(),
+        block_urls: bool = True,
+    ):
+        self.invalid_patterns: list = []
+        # 无法并入合并正则的规则，合并正则未命中时逐条匹配
+        self._deny_separate: list = []
+        self._allow_separate: list = []
+
+        deny_branches = []
+        if block_urls:
+            deny_branches.append(f"(?P<url>{URL_PATTERN})")
+        keyword_branch = _alternation(
+            blocked_keywords,
+            blocked_patterns,
+            self.invalid_patterns,
+            self._deny_separate,
+        )
+        if keyword_branch:
+            deny_branches.append(f"(?P<keyword>{keyword_branch})")
+        self._deny = (
+            re.compile("|".join(deny_branches), re.IGNORECASE)
+            if deny_branches
+            else None
+        )
+
+        allow_branch = _alternation(
+            allowed_keywords,
+            allowed_patterns,
+            self.invalid_patterns,
+            self._allow_separate,
+        )
+        self._allow = re.compile(allow_branch, re.IGNORECASE) if allow_branch else None
+
+    def check(self, content: str):
+        """返回 (结果, 命中原因)；原因为 "url" 或 "keyword:<命中文本>"，未命中时为 None"""
+        if self._deny is not None:
+            match = self._deny.search(content)
+            if match:
+                if match.lastgroup == "url":
+                    return DENY, "url"
+                return DENY, f"keyword:{match.group()}"
+        for pattern in self._deny_separate:
+            match = pattern.search(content)
+            if match:
+                return DENY, f"keyword:{match.group()}"
+        stripped = content.strip()
+        if self._allow is not None and self._allow.fullmatch(stripped):
+            return ALLOW, None
+        for pattern in self._allow_separate:
+            if pattern.fullmatch(stripped):
+                return ALLOW, None
+        return UNDECIDED, None
@@ -0,0 +1,120 @@
+import re
+
+# 中日韩文字、全角标点大致每个字符一个 token，其余文字大致每 4 个字符一个 token
+_WIDE_CHARS = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+
+_CONTEXT_RULE = "─" * 30
+
+CONTEXT_HEADER = (
+    f"\n\n【撤回前的聊天上下文】\n{_CONTEXT_RULE}\n"
+    "以下是在撤回消息之前的聊天记录，可以帮助理解撤回的上下文和原因：\n"
+)
+CONTEXT_FOOTER = f"{_CONTEXT_RULE}\n"
+CONTENT_HEADER = "\n\n【撤回内容】\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖分词器的 token 数估算，宁多勿少"""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def truncate_middle(text: str, limit: int) -> str:
+    """超过 limit 个字符时保留开头和结尾，中间替换为省略说明"""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    marker = f"…（省略 {len(text) - limit} 字）…"
+    keep = max(limit - len(marker), 2)
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head) :]
+
+
+class PromptStats:
+    __slots__ = ("chars", "context_dropped", "context_used", "tokens", "truncated")
+
+    def __init__(self, tokens, chars, context_used, context_dropped, truncated):
+        self.tokens = tokens
+        self.chars = chars
+        self.context_used = context_used
+        self.context_dropped = context_dropped
+        self.truncated = truncated
+
+
+class PromptBuilder:
+    """在 token 预算内拼装锐评提示词
+
+    提示词依次为：固定前缀（风格提示，每次调用逐字节相同，便于提供商复用前缀缓存）、
+    上下文、撤回内容。超出预算时先截断过长的单条消息（保留首尾），
+    再从最旧的一条开始丢弃上下文，最后截断撤回内容本身。
+    max_tokens 为 0 表示不限制总长度，max_line_chars 为 0 表示不截断单条上下文。
+    """
+
+    def __init__(self, prefix: str, max_tokens: int = 0, max_line_chars: int = 0):
+        self.prefix = prefix
+        self.max_tokens = max_tokens
+        self.max_line_chars = max_line_chars
+        self._fixed_tokens = estimate_tokens(prefix) + estimate_tokens(CONTENT_HEADER)
+        self._context_tokens = estimate_tokens(CONTEXT_HEADER) + estimate_tokens(
+            CONTEXT_FOOTER
+        )
+
+    def build(self, content: str, context=()) -> tuple:
+        """context 为从旧到新的 [(发送者, 内容)]，返回 (提示词, PromptStats)"""
+        truncated = False
+        budget = self.max_tokens - self._fixed_tokens if self.max_tokens else None
+
+        if budget is not None:
+            # 撤回内容最多占一半预算，其余留给上下文
+            content_limit = max(budget // 2, 1)
+            if estimate_tokens(content) > content_limit:
+                content = _fit(content, content_limit)
+                truncated = True
+            budget -= estimate_tokens(content)
+
+        lines = []
+        if context:
+            if budget is not None:
+                budget -= self._context_tokens
+            # 从最新的一条往前取，预算不足时丢弃更旧的上下文
+            for sender_name, text in reversed(context):
+                if self.max_line_chars and len(text) > self.max_line_chars:
+                    text = truncate_middle(text, self.max_line_chars)
+                    truncated = True
+                line = f"{sender_name}: {text}"
+                if budget is not None:
+                    cost = estimate_tokens(line) + 2
+                    if cost > budget:
+                        break
+                    budget -= cost
+                lines.append(line)
+            lines.reverse()
+
+        parts = [self.prefix, "\n"]
+        if lines:
+            parts.append(CONTEXT_HEADER)
+            parts.extend(f"{i}. {line}\n" for i, line in enumerate(lines, 1))
+            parts.append(CONTEXT_FOOTER)
+        parts.append(CONTENT_HEADER)
+        parts.append(content)
+        prompt = "".join(parts)
+        return prompt, PromptStats(
+            estimate_tokens(prompt),
+            len(prompt),
+            len(lines),
+            len(context) - len(lines),
+            truncated,
+        )
+
+
+def _fit(text: str, max_tokens: int) -> str:
+    """按估算的 token 数截断文本（保留首尾）"""
+    # 先按每个 token 4 个字符截断，再逐步收紧，直到估算值不超过预算
+    limit = min(len(text), max_tokens * 4)
+    while limit > 1:
+        candidate = truncate_middle(text, limit)
+        if estimate_tokens(candidate) <= max_tokens:
+            return candidate
+        limit = limit * 3 // 4
+    return truncate_middle(text, 1)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """令牌桶：按 rate（个/秒）补充令牌，最多积累 capacity 个"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+    def level(self) -> float:
+        self._refill(time.monotonic())
+        return self.tokens
+
+    def wait_time(self, amount: float = 1) -> float:
+        """还需等待多少秒才能取到 amount 个令牌"""
+        self._refill(time.monotonic())
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, amount: float = 1):
+        self._refill(time.monotonic())
+        self.tokens -= min(amount, self.capacity)
+
+
+class RecallScheduler:
+    """按群组和全局两级令牌桶限制 LLM 调用与消息发送
+
+    limits 形如 {"llm": (每群每分钟, 全局每分钟), "send": (...)}，0 表示不限制。
+    只有群组桶和全局桶都有足够令牌时才会同时扣除，避免一侧被白白消耗。
+    """
+
+    def __init__(self, limits: dict):
+        self._limits = {
+            kind: (group_per_minute / 60, global_per_minute / 60)
+            for kind, (group_per_minute, global_per_minute) in limits.items()
+        }
+        self._global = {
+            kind: TokenBucket(global_rate, global_rate * 60)
+            for kind, (_, global_rate) in self._limits.items()
+            if global_rate > 0
+        }
+        self._groups: dict = {}
+
+    def enabled(self, kind: str) -> bool:
+        group_rate, global_rate = self._limits.get(kind, (0, 0))
+        return group_rate > 0 or global_rate > 0
+
+    def try_acquire(self, kind: str, group_id, amount: float = 1) -> bool:
+        """令牌足够时立即扣除并返回 True，否则不扣除并返回 False"""
+        buckets = self._buckets(kind, group_id)
+        if any(bucket.wait_time(amount) > 0 for bucket in buckets):
+            return False
+        for bucket in buckets:
+            bucket.consume(amount)
+        return True
+
+    async def acquire(
+        self, kind: str, group_id, amount: float = 1, timeout: float = 0
+    ) -> bool:
+        """等待令牌，最多等待 timeout 秒"""
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire(kind, group_id, amount):
+            buckets = self._buckets(kind, group_id)
+            wait = max(bucket.wait_time(amount) for bucket in buckets)
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+        return True
+
+    def levels(self, kind: str) -> dict:
+        """当前令牌余量 {"global": x, 群号: y, ...}，未限制的桶不列出"""
+        result = {}
+        if kind in self._global:
+            result["global"] = self._global[kind].level()
+        for (bucket_kind, group_id), bucket in self._groups.items():
+            if bucket_kind == kind:
+                result[group_id] = bucket.level()
+        return result
+
+    def _buckets(self, kind: str, group_id) -> list:
+        group_rate, _ = self._limits.get(kind, (0, 0))
+        buckets = []
+        if group_rate > 0:
+            key = (kind, str(group_id))
+            bucket = self._groups.get(key)
+            if bucket is None:
+                bucket = self._groups[key] = TokenBucket(group_rate, group_rate * 60)
+            buckets.append(bucket)
+        if kind in self._global:
+            buckets.append(self._global[kind])
+        return buckets
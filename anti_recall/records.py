@@ -0,0 +1,124 @@
+import json
+import sys
+import zlib
+
+
+class CachedMessage:
+    """紧凑的缓存消息记录
+
+    使用 __slots__ 避免每条消息一个 dict；发送者、群组、类型等重复出现的字符串统一驻留，
+    超过阈值的消息内容以 zlib 压缩后保存，读取 content 时透明解压。
+    包含图片、提及等组件的消息额外保存结构化组件（见 components.classify），用于原样重建。
+    """
+
+    __slots__ = (
+        "_content",
+        "_size",
+        "components",
+        "group_id",
+        "message_type",
+        "sender_id",
+        "sender_name",
+        "timestamp",
+    )
+
+    def __init__(
+        self,
+        content: str,
+        sender_id: str,
+        sender_name: str,
+        group_id: str,
+        timestamp: int,
+        message_type: str,
+        compress_threshold: int = 0,
+        components: tuple | None = None,
+    ):
+        self.sender_id = _intern(sender_id)
+        self.sender_name = _intern(sender_name)
+        self.group_id = _intern(group_id)
+        self.timestamp = timestamp
+        self.message_type = _intern(message_type)
+        self._content = _pack(content, compress_threshold)
+        self.components = components
+        self._size = 0
+
+    @property
+    def content(self) -> str:
+        content = self._content
+        if isinstance(content, bytes):
+            return zlib.decompress(content).decode("utf-8")
+        return content
+
+    @property
+    def is_compressed(self) -> bool:
+        return isinstance(self._content, bytes)
+
+    def memory_size(self) -> int:
+        """记录本身占用的字节数（不含驻留共享的发送者、群组、类型字符串），首次计算后缓存"""
+        if self._size:
+            return self._size
+        size = _RECORD_BYTES + sys.getsizeof(self._content)
+        components = self.components
+        if components:
+            size += sys.getsizeof(components)
+            for item in components:
+                size += sys.getsizeof(item)
+                for value in item[1:]:
+                    size += sys.getsizeof(value)
+        self._size = size
+        return size
+
+    def to_row(self) -> tuple:
+        """转换为持久化存储的行 (group_id, sender_id, sender_name, timestamp, message_type, content, components)
+
+        内容保持压缩形式，结构化组件编码为 JSON
+        """
+        return (
+            self.group_id,
+            self.sender_id,
+            self.sender_name,
+            self.timestamp,
+            self.message_type,
+            self._content,
+            json.dumps(self.components, ensure_ascii=False)
+            if self.components
+            else None,
+        )
+
+    @classmethod
+    def from_row(cls, row) -> "CachedMessage":
+        """从 to_row 的结果恢复记录"""
+        record = cls.__new__(cls)
+        group_id, sender_id, sender_name, timestamp, message_type, content = row[:6]
+        components = row[6] if len(row) > 6 else None
+        record.group_id = _intern(group_id)
+        record.sender_id = _intern(sender_id)
+        record.sender_name = _intern(sender_name)
+        record.timestamp = timestamp
+        record.message_type = _intern(message_type)
+        record._content = content
+        record.components = (
+            tuple(tuple(item) for item in json.loads(components))
+            if components
+            else None
+        )
+        record._size = 0
+        return record
+
+
+_RECORD_BYTES = sys.getsizeof(CachedMessage.__new__(CachedMessage))
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _pack(content: str, compress_threshold: int):
+    """内容超过阈值（按 UTF-8 字节计）且压缩后更小时返回压缩数据，否则原样返回"""
+    if not compress_threshold or len(content) * 4 < compress_threshold:
+        return content
+    raw = content.encode("utf-8")
+    if len(raw) < compress_threshold:
+        return content
+    packed = zlib.compress(raw)
+    return packed if len(packed) < len(raw) else content
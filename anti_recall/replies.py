@@ -0,0 +1,44 @@
+import json
+import re
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+_TRUE_VALUES = {"true", "yes", "1", "是", "违规"}
+_FALSE_VALUES = {"false", "no", "0", "否", "不违规", ""}
+
+
+def parse_combined_reply(text: str):
+    """解析合并调用的 JSON 回复，返回 (是否违规, 锐评)，无法解析时返回 None
+
+    兼容模型常见的输出偏差：代码块包裹、JSON 前后的多余文字、字符串形式的布尔值。
+    """
+    if not text:
+        return None
+    text = _CODE_FENCE.sub("", text.strip())
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "blocked" not in data:
+        return None
+
+    blocked = data["blocked"]
+    if isinstance(blocked, str):
+        value = blocked.strip().lower()
+        if value in _TRUE_VALUES:
+            blocked = True
+        elif value in _FALSE_VALUES:
+            blocked = False
+        else:
+            return None
+    elif not isinstance(blocked, (bool, int)):
+        return None
+
+    comment = data.get("comment")
+    if comment is not None and not isinstance(comment, str):
+        comment = str(comment)
+    return bool(blocked), (comment or "").strip() or None
@@ -0,0 +1,136 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+FINGERPRINT_BITS = 64
+
+_SHINGLE_SIZE = 2
+
+
+def _normalize(text: str) -> str:
+    """只保留字母、数字和文字，忽略大小写、空白、标点和表情"""
+    return "".join(ch for ch in text.lower() if ch.isalnum())
+
+
+def simhash(text: str, min_chars: int = 10):
+    """计算 64 位 SimHash 指纹，归一化后少于 min_chars 个字符时返回 None
+
+    特征为归一化文本中相邻两个字符组成的片段，标点、空白和表情在归一化时被去掉，
+    改动一个字符只影响两个片段，因此轻微改写后的文本指纹只相差少数几位。
+    """
+    normalized = _normalize(text)
+    if len(normalized) < max(min_chars, _SHINGLE_SIZE):
+        return None
+    bits = [
+        format(
+            int.from_bytes(
+                hashlib.blake2b(
+                    normalized[i : i + _SHINGLE_SIZE].encode("utf-8"), digest_size=8
+                ).digest(),
+                "big",
+            ),
+            "064b",
+        )
+        for i in range(len(normalized) - _SHINGLE_SIZE + 1)
+    ]
+    # 按位统计各片段哈希中 1 的个数，超过半数的位置为 1
+    half = len(bits) / 2
+    column_bits = "".join(
+        "1" if column.count("1") > half else "0" for column in zip(*bits)
+    )
+    return int(column_bits, 2)
+
+
+class SimHashIndex:
+    """近期判定内容的 SimHash 指纹索引，按海明距离查找近似重复
+
+    64 位指纹切分为 max_distance + 1 段，两个指纹的海明距离不超过 max_distance 时
+    至少有一段完全相同（抽屉原理），因此只需比较与查询指纹某一段相同的候选。
+    条目数超过 max_size 或超过 ttl 秒时淘汰最旧的条目。
+    """
+
+    def __init__(
+        self, max_distance: int = 6, max_size: int = 10000, ttl: float = 86400
+    ):
+        self.max_distance = max_distance
+        self.max_size = max_size
+        self.ttl = ttl
+        self._bands = max_distance + 1
+        width = FINGERPRINT_BITS // self._bands
+        # 每段的 (位移, 掩码)，最后一段包含余下的位
+        self._slices = [
+            (
+                i * width,
+                (1 << (width if i < self._bands - 1 else FINGERPRINT_BITS - i * width))
+                - 1,
+            )
+            for i in range(self._bands)
+        ]
+        # 指纹 -> (过期时间, 判定)，按写入顺序排列
+        self._entries: OrderedDict = OrderedDict()
+        # 每段一个字典：段值 -> 指纹集合
+        self._buckets = [{} for _ in range(self._bands)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, fingerprint: int):
+        """返回 (判定, 海明距离)，距离阈值内没有未过期的条目时返回 None
+
+        扫描到的过期候选跳过并在扫描结束后删除，不会挡住距离稍远但仍有效的条目。
+        """
+        now = time.monotonic()
+        best = None
+        expired = set()
+        for (shift, mask), buckets in zip(self._slices, self._buckets):
+            for candidate in buckets.get((fingerprint >> shift) & mask, ()):
+                distance = (candidate ^ fingerprint).bit_count()
+                if distance > self.max_distance or (
+                    best is not None and distance >= best[2]
+                ):
+                    continue
+                expires_at, verdict = self._entries[candidate]
+                if expires_at <= now:
+                    expired.add(candidate)
+                    continue
+                best = (candidate, verdict, distance)
+        for candidate in expired:
+            self._remove(candidate)
+        if best is None:
+            return None
+        return best[1], best[2]
+
+    def add(self, fingerprint: int, verdict):
+        if fingerprint in self._entries:
+            self._remove(fingerprint)
+        self._entries[fingerprint] = (time.monotonic() + self.ttl, verdict)
+        for (shift, mask), buckets in zip(self._slices, self._buckets):
+            band = (fingerprint >> shift) & mask
+            bucket = buckets.get(band)
+            if bucket is None:
+                bucket = buckets[band] = set()
+            bucket.add(fingerprint)
+        self._shrink()
+
+    def clear(self):
+        self._entries.clear()
+        for buckets in self._buckets:
+            buckets.clear()
+
+    def _shrink(self):
+        now = time.monotonic()
+        entries = self._entries
+        while entries:
+            oldest = next(iter(entries))
+            if len(entries) <= self.max_size and entries[oldest][0] > now:
+                break
+            self._remove(oldest)
+
+    def _remove(self, fingerprint: int):
+        del self._entries[fingerprint]
+        for (shift, mask), buckets in zip(self._slices, self._buckets):
+            band = (fingerprint >> shift) & mask
+            bucket = buckets[band]
+            bucket.discard(fingerprint)
+            if not bucket:
+                del buckets[band]
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from .records import CachedMessage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    group_id TEXT,
+    sender_id TEXT,
+    sender_name TEXT,
+    timestamp INTEGER,
+    message_type TEXT,
+    content BLOB,
+    components TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_group_time ON messages (group_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_time ON messages (timestamp);
+"""
+
+
+class MessageStore:
+    """基于 SQLite（WAL 模式）的持久化消息存储
+
+    写入先进入内存中的待写队列，由后台任务批量提交，消息处理流程不会等待磁盘。
+    数据库操作都在线程池中执行，并用锁串行化对同一连接的访问。
+    提交失败（磁盘已满、数据库被锁）时批次放回待写队列，后台任务退避后重试；
+    待写队列超过 max_pending 条时丢弃最旧的条目。错误通过 on_error 回调报告。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        on_error=None,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_error = on_error
+        self._conn = None
+        self._lock = threading.Lock()
+        # message_id -> CachedMessage（待写入）或 None（待删除）
+        self._pending: OrderedDict = OrderedDict()
+        # 正在提交中的批次，提交完成前查询仍需能看到
+        self._inflight: OrderedDict = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._writer_task = None
+        self.written = 0
+        self.write_errors = 0
+        self.dropped = 0
+
+    async def start(self):
+        """打开数据库并启动后台写入任务"""
+        await asyncio.to_thread(self._open)
+        self._writer_task = asyncio.create_task(self._run_writer())
+
+    async def close(self):
+        """停止后台写入任务，提交剩余数据并关闭数据库"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        if self._conn is not None:
+            try:
+                await self.flush()
+            except (sqlite3.Error, ValueError) as e:
+                self.write_errors += 1
+                if self.on_error:
+                    self.on_error(e)
+            finally:
+                await asyncio.to_thread(self._close)
+
+    def add(self, message_id: str, record: CachedMessage):
+        """加入待写队列，不阻塞调用方"""
+        self._pending[message_id] = record
+        self._pending.move_to_end(message_id)
+        self._trim_pending()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def delete(self, message_id: str):
+        """标记删除，随下一批写入一起提交"""
+        self._pending[message_id] = None
+        self._pending.move_to_end(message_id)
+        self._trim_pending()
+
+    async def get(self, message_id: str):
+        """查询消息，优先返回尚未写入磁盘的数据"""
+        for batch in (self._pending, self._inflight):
+            if message_id in batch:
+                return batch[message_id]
+        if self._conn is None:
+            return None
+        row = await asyncio.to_thread(self._select, message_id)
+        return CachedMessage.from_row(row) if row else None
+
+    async def prune(self, before_timestamp: int) -> int:
+        """删除时间戳早于 before_timestamp 的消息，返回删除的行数"""
+        if self._conn is None:
+            return 0
+        return await asyncio.to_thread(self._delete_before, before_timestamp)
+
+    async def flush(self):
+        """立即提交待写队列，失败时批次放回队列并抛出异常"""
+        async with self._flush_lock:
+            if not self._pending or self._conn is None:
+                return
+            self._inflight = self._pending
+            self._pending = OrderedDict()
+            try:
+                await asyncio.to_thread(self._write_batch, self._inflight)
+            except BaseException:
+                # 提交期间新加入的条目比失败批次中的同一消息更新，保留新的
+                self._inflight.update(self._pending)
+                self._pending = self._inflight
+                self._trim_pending()
+                raise
+            finally:
+                self._inflight = OrderedDict()
+
+    async def _run_writer(self):
+        failures = 0
+        while True:
+            if failures:
+                # 连续失败时按 2、4……倍间隔退避（最多 32 倍），不因队列积压提前重试
+                await asyncio.sleep(self.flush_interval * (1 << min(failures, 5)))
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except TimeoutError:
+                    pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except (sqlite3.Error, ValueError) as e:
+                failures += 1
+                self.write_errors += 1
+                if self.on_error:
+                    self.on_error(e)
+            else:
+                failures = 0
+
+    def _trim_pending(self):
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        # 旧版本创建的表没有 components 列
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "components" not in columns:
+            conn.execute("ALTER TABLE messages ADD COLUMN components TEXT")
+        conn.commit()
+        self._conn = conn
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    def _write_batch(self, batch: OrderedDict):
+        inserts = []
+        deletes = []
+        for message_id, record in batch.items():
+            if record is None:
+                deletes.append((message_id,))
+            else:
+                inserts.append((message_id, *record.to_row()))
+        with self._lock, self._conn:
+            if inserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO messages (message_id, group_id, sender_id, sender_name, timestamp, message_type, content, components) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    inserts,
+                )
+            if deletes:
+                self._conn.executemany(
+                    "DELETE FROM messages WHERE message_id = ?", deletes
+                )
+        self.written += len(inserts)
+
+    def _select(self, message_id: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT group_id, sender_id, sender_name, timestamp, message_type, content, components FROM messages WHERE message_id = ?",
+                (message_id,),
+            ).fetchone()
+
+    def _delete_before(self, before_timestamp: int) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM messages WHERE timestamp < ?", (before_timestamp,)
+            )
+            return cursor.rowcount
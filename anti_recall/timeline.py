@@ -0,0 +1,87 @@
+from bisect import bisect_left, bisect_right
+
+# 可作为上下文的消息类型（_get_message_type 返回的中文类型）
+CONTEXT_TYPES = frozenset({"文本", "提及", "引用"})
+
+
+class GroupTimeline:
+    """单个群组内按时间戳排序的消息索引
+
+    删除时只留下墓碑，读取时跳过，墓碑过多时再整体压缩，
+    因此淘汰（通常删除最旧的消息）和撤回删除都是均摊 O(log n)。
+    """
+
+    __slots__ = ("_dead", "_head", "_ids", "_timestamps")
+
+    def __init__(self):
+        self._timestamps: list = []
+        self._ids: list = []
+        self._head = 0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._ids) - self._head - self._dead
+
+    def add(self, timestamp: int, message_id: str):
+        timestamps = self._timestamps
+        if len(timestamps) == self._head or timestamp >= timestamps[-1]:
+            timestamps.append(timestamp)
+            self._ids.append(message_id)
+            return
+        # 乱序到达的消息按时间戳插入到对应位置
+        index = bisect_right(timestamps, timestamp, self._head)
+        timestamps.insert(index, timestamp)
+        self._ids.insert(index, message_id)
+
+    def remove(self, timestamp: int, message_id: str) -> bool:
+        timestamps, ids = self._timestamps, self._ids
+        index = bisect_left(timestamps, timestamp, self._head)
+        while index < len(ids) and timestamps[index] == timestamp:
+            if ids[index] == message_id:
+                ids[index] = None
+                self._dead += 1
+                self._advance_head()
+                self._maybe_compact()
+                return True
+            index += 1
+        return False
+
+    def recent_before(self, timestamp: int, count: int) -> list:
+        """返回时间戳早于 timestamp 的最后 count 条消息 ID，从旧到新"""
+        if count <= 0:
+            return []
+        ids = self._ids
+        index = bisect_left(self._timestamps, timestamp, self._head)
+        result = []
+        while index > self._head and len(result) < count:
+            index -= 1
+            message_id = ids[index]
+            if message_id is not None:
+                result.append(message_id)
+        result.reverse()
+        return result
+
+    def _advance_head(self):
+        ids = self._ids
+        while self._head < len(ids) and ids[self._head] is None:
+            self._head += 1
+            self._dead -= 1
+
+    def _maybe_compact(self):
+        live = len(self)
+        if self._head > 1024 and self._head > live:
+            del self._timestamps[: self._head]
+            del self._ids[: self._head]
+            self._head = 0
+        if self._dead > 64 and self._dead > live:
+            pairs = [
+                (ts, mid)
+                for ts, mid in zip(
+                    self._timestamps[self._head :], self._ids[self._head :]
+                )
+                if mid is not None
+            ]
+            self._timestamps = [ts for ts, _ in pairs]
+            self._ids = [mid for _, mid in pairs]
+            self._head = 0
+            self._dead = 0
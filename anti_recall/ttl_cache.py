@@ -0,0 +1,69 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+_MISSING = object()
+
+
+def content_key(content: str, *parts) -> str:
+    """按归一化后的内容（去除首尾空白、合并空白、忽略大小写）和附加参数计算缓存键"""
+    normalized = _WHITESPACE.sub(" ", content.strip()).casefold()
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    digest.update(normalized.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """有容量上限和过期时间的 LRU 缓存，并统计命中率"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """查看未过期的值，不计入命中率，也不更新使用顺序"""
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def hit_rate(self) -> str:
+        total = self.hits + self.misses
+        if total == 0:
+            return "0%"
+        return f"{(self.hits / total * 100):.1f}%"
@@ -0,0 +1,82 @@
+"""消息缓存插入/淘汰基准测试
+
+在缓存已满（每次插入都会触发淘汰）的稳态下测量单次插入耗时，
+缓存规模从 1k 到 1M，用于确认插入成本不随缓存规模增长。
+
+用法: python benchmarks/bench_cache.py [--inserts N] [--legacy]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anti_recall import CachedMessage, MessageCache
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def make_record(i: int) -> CachedMessage:
+    return CachedMessage(
+        f"消息内容 {i}",
+        str(10000 + i % 500),
+        f"用户{i % 500}",
+        str(100 + i % 50),
+        1_700_000_000 + i,
+        "文本",
+    )
+
+
+def bench_ring_cache(size: int, inserts: int) -> float:
+    cache = MessageCache(size)
+    for i in range(size):
+        cache.put(str(i), make_record(i))
+
+    records = [make_record(size + i) for i in range(inserts)]
+    start = time.perf_counter()
+    for i, record in enumerate(records):
+        cache.put(str(size + i), record)
+    elapsed = time.perf_counter() - start
+    return elapsed / inserts * 1e9
+
+
+def bench_legacy_sort(size: int, inserts: int) -> float:
+    """旧实现：每次插入后按时间戳排序整个缓存再删除最旧的消息"""
+    cache = {}
+    for i in range(size):
+        cache[str(i)] = make_record(i)
+
+    records = [make_record(size + i) for i in range(inserts)]
+    start = time.perf_counter()
+    for i, record in enumerate(records):
+        cache[str(size + i)] = record
+        if len(cache) > size:
+            sorted_messages = sorted(cache.items(), key=lambda x: x[1].timestamp)
+            for j in range(len(cache) - size):
+                del cache[sorted_messages[j][0]]
+    elapsed = time.perf_counter() - start
+    return elapsed / inserts * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inserts", type=int, default=100_000)
+    parser.add_argument(
+        "--legacy", action="store_true", help="同时测量旧的排序淘汰实现（仅 ≤10k）"
+    )
+    args = parser.parse_args()
+
+    print(f"{'缓存规模':>10} {'插入耗时(ns)':>14} {'旧实现(ns)':>14}")
+    for size in SIZES:
+        ring_ns = bench_ring_cache(size, args.inserts)
+        legacy = "-"
+        if args.legacy and size <= 10_000:
+            legacy_inserts = max(1, min(args.inserts, 200_000 // size))
+            legacy = f"{bench_legacy_sort(size, legacy_inserts):.0f}"
+        print(f"{size:>10} {ring_ns:>14.0f} {legacy:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""消息组件解析基准测试
+
+测量每条消息解析出类型、文本内容和结构化组件的耗时，
+并与旧实现（_extract_message_content 与 _get_message_type 各遍历一次消息链、
+每次循环重建类型映射表）对比。
+
+用法: python benchmarks/bench_classify.py [--messages N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from enum import Enum
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anti_recall import classify
+
+
+class ComponentType(str, Enum):
+    Plain = "Plain"
+    Image = "Image"
+    At = "At"
+    Face = "Face"
+    Reply = "Reply"
+
+
+class Plain:
+    type = ComponentType.Plain
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Image:
+    type = ComponentType.Image
+
+    def __init__(self, url):
+        self.url = url
+        self.file = url
+
+
+class At:
+    type = ComponentType.At
+
+    def __init__(self, qq, name):
+        self.qq = qq
+        self.name = name
+
+
+class Face:
+    type = ComponentType.Face
+
+    def __init__(self, face_id):
+        self.id = face_id
+
+
+class Reply:
+    type = ComponentType.Reply
+
+    def __init__(self, reply_id):
+        self.id = reply_id
+
+
+def make_chains(count: int, seed: int = 0) -> list:
+    """约 70% 纯文本，其余混合图片、提及、表情和引用"""
+    rng = random.Random(seed)
+    chains = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.7:
+            chain = [Plain(f"普通聊天消息 {i}")]
+        elif roll < 0.8:
+            chain = [Image(f"https://multimedia.nt.qq.com.cn/download?id={i}")]
+        elif roll < 0.9:
+            chain = [At(10000 + i % 100, "群友"), Plain(" 在吗"), Face(14)]
+        else:
+            chain = [Reply(i - 1), At(10000, "群主"), Plain("收到"), Image(f"{i}.jpg")]
+        chains.append(chain)
+    return chains
+
+
+def legacy_extract(chain) -> tuple:
+    """旧实现：提取内容和类型分别遍历消息链"""
+    content_parts = []
+    for component in chain:
+        if hasattr(component, "text"):
+            content_parts.append(component.text)
+        elif hasattr(component, "url"):
+            content_parts.append(f"[图片: {component.url}]")
+        elif hasattr(component, "file"):
+            content_parts.append(f"[图片: {component.file}]")
+        elif hasattr(component, "type"):
+            content_parts.append(f"[{component.type}]")
+    content = "".join(content_parts)
+
+    message_type = "未知"
+    for component in chain:
+        if hasattr(component, "type"):
+            component_type = str(component.type)
+            type_map = {
+                "plain": "文本",
+                "image": "图片",
+                "record": "语音",
+                "video": "视频",
+                "file": "文件",
+                "at": "提及",
+                "face": "表情",
+                "poke": "戳一戳",
+                "reply": "引用",
+            }
+            if component_type in type_map:
+                message_type = type_map[component_type]
+                break
+    return message_type, content
+
+
+def bench(fn, chains: list) -> float:
+    start = time.perf_counter()
+    for chain in chains:
+        fn(chain)
+    return (time.perf_counter() - start) / len(chains) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    chains = make_chains(args.messages)
+    print(f"{'实现':>10} {'每条耗时(ns)':>14}")
+    print(f"{'单次遍历':>10} {bench(classify, chains):>14.0f}")
+    print(f"{'旧实现':>10} {bench(legacy_extract, chains):>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""缓存记录内存占用基准测试
+
+比较旧的 6 键 dict 记录与 CachedMessage 紧凑记录每条消息的平均字节数。
+模拟真实流量：发送者、群组、类型字符串每条消息都是新构造的对象，少量长消息。
+
+用法: python benchmarks/bench_memory.py [--count N] [--long-ratio R]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anti_recall import CachedMessage
+
+LONG_TEXT = "这是一段比较长的复制粘贴内容，经常在群里刷屏出现。" * 60
+
+
+def fresh(value: str) -> str:
+    """构造新的字符串对象，模拟每个事件都重新解码出的字段"""
+    return "".join(list(value))
+
+
+def make_fields(i: int, rng: random.Random, long_ratio: float):
+    content = LONG_TEXT if rng.random() < long_ratio else f"普通消息 {i} 哈哈哈"
+    return (
+        fresh(content),
+        fresh(str(10000 + i % 500)),
+        fresh(f"群友{i % 500}号"),
+        fresh(str(100000 + i % 50)),
+        1_700_000_000 + i,
+        fresh("文本"),
+    )
+
+
+def measure(build, count: int, long_ratio: float) -> float:
+    rng = random.Random(42)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = {}
+    for i in range(count):
+        store[str(i)] = build(*make_fields(i, rng, long_ratio))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    return (after - before) / count
+
+
+def build_dict(content, sender_id, sender_name, group_id, timestamp, message_type):
+    return {
+        "content": content,
+        "sender_id": sender_id,
+        "sender_name": sender_name,
+        "group_id": group_id,
+        "timestamp": timestamp,
+        "message_type": message_type,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200_000)
+    parser.add_argument("--long-ratio", type=float, default=0.02)
+    parser.add_argument("--compress-threshold", type=int, default=1024)
+    args = parser.parse_args()
+
+    def build_compact(*fields):
+        return CachedMessage(*fields, compress_threshold=args.compress_threshold)
+
+    dict_bytes = measure(build_dict, args.count, args.long_ratio)
+    compact_bytes = measure(build_compact, args.count, args.long_ratio)
+
+    print(f"消息数: {args.count}, 长消息比例: {args.long_ratio}")
+    print(f"dict 记录:          {dict_bytes:8.1f} 字节/条")
+    print(f"CachedMessage 记录: {compact_bytes:8.1f} 字节/条")
+    print(f"节省:               {(1 - compact_bytes / dict_bytes) * 100:8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""插件热路径微基准测试
+
+用模拟的事件和 Context 驱动插件，在 1k 到 1M 的缓存规模下分别测量：
+on_message（缓存已满，含淘汰）、MessageCache.put（淘汰路径）、_extract_context_messages、
+_classify_message（取代旧的 _extract_message_content/_get_message_type）以及状态命令。
+结果以 JSON 输出（吞吐量、延迟分位数、峰值内存），便于比较不同版本。需要已安装 AstrBot。
+
+用法: python benchmarks/bench_plugin.py [--sizes 1000,10000] [--ops N] [--output result.json]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import ROOT, FakeContext, Traffic, load_plugin_module, percentiles
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def summarize(name: str, size: int, samples: list, elapsed: float, **extra) -> dict:
+    result = {
+        "benchmark": name,
+        "cache_size": size,
+        "ops": len(samples),
+        "throughput_per_sec": len(samples) / elapsed if elapsed else None,
+        "latency_ns": percentiles(samples),
+    }
+    result.update(extra)
+    return result
+
+
+async def time_async(fn, args_list: list) -> tuple:
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for args in args_list:
+        t0 = clock()
+        await fn(*args)
+        samples.append(clock() - t0)
+    return samples, time.perf_counter() - start
+
+
+def time_sync(fn, args_list: list) -> tuple:
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for args in args_list:
+        t0 = clock()
+        fn(*args)
+        samples.append(clock() - t0)
+    return samples, time.perf_counter() - start
+
+
+async def drain(generator):
+    async for _ in generator:
+        pass
+
+
+async def bench_size(main, comp, size: int, ops: int, measure_memory: bool) -> list:
+    plugin = main.AntiRecallPlugin(
+        FakeContext(),
+        {
+            "max_cache_size": size,
+            "recall_ttl": 0,
+            "context_ttl": 0,
+            "enable_recall_fallback": False,
+        },
+    )
+    traffic = Traffic(comp)
+    results = []
+
+    # 填满缓存，同时记录峰值内存
+    warmup = traffic.messages(size)
+    gc.collect()
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for event in warmup:
+        await plugin.on_message(event)
+    fill_elapsed = time.perf_counter() - start
+    peak = None
+    if measure_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    del warmup
+    results.append(
+        {
+            "benchmark": "fill",
+            "cache_size": size,
+            "ops": size,
+            "throughput_per_sec": size / fill_elapsed,
+            "peak_memory_bytes": peak,
+        }
+    )
+
+    # on_message：缓存已满，每条消息都会触发淘汰
+    events = traffic.messages(ops)
+    samples, elapsed = await time_async(plugin.on_message, [(e,) for e in events])
+    results.append(summarize("on_message", size, samples, elapsed))
+
+    # 淘汰路径：直接写入已满的 MessageCache
+    cache = plugin.message_cache
+    records = [
+        (str(-i), cache.get(e.message_obj.message_id)) for i, e in enumerate(events, 1)
+    ]
+    records = [(key, record) for key, record in records if record is not None]
+    samples, elapsed = time_sync(cache.put, records)
+    results.append(summarize("cache_put_evict", size, samples, elapsed))
+
+    # 上下文提取：随机群组、随机时间点
+    rng = random.Random(1)
+    groups = list(cache.group_counts())
+    queries = [
+        (rng.choice(groups), rng.randint(traffic.start_ts, traffic.latest_ts))
+        for _ in range(ops)
+    ]
+    samples, elapsed = time_sync(plugin._extract_context_messages, queries)
+    results.append(summarize("extract_context", size, samples, elapsed))
+
+    # 消息解析
+    samples, elapsed = time_sync(plugin._classify_message, [(e,) for e in events])
+    results.append(summarize("classify_message", size, samples, elapsed))
+
+    # 状态命令（规模越大越慢，次数较少）
+    status_event = events[0]
+    command_ops = max(10, min(200, ops // 100))
+    for name, command in (
+        ("status_command", plugin.anti_recall_status),
+        ("cache_details_command", plugin.show_cache_details),
+    ):
+        samples, elapsed = await time_async(
+            lambda command=command: drain(command(status_event)),
+            [()] * command_ops,
+        )
+        results.append(summarize(name, size, samples, elapsed))
+
+    await plugin.terminate()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+async def run(args) -> dict:
+    main, comp = load_plugin_module()
+    main.logger.setLevel(logging.ERROR)
+    results = []
+    for size in args.sizes:
+        results.extend(await bench_size(main, comp, size, args.ops, not args.no_memory))
+        print(f"cache_size={size} 完成", file=sys.stderr)
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "ops": args.ops,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=SIZES,
+        help="逗号分隔的缓存规模",
+    )
+    parser.add_argument("--ops", type=int, default=20_000, help="每项测量的操作次数")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="不统计峰值内存（填充更快）"
+    )
+    parser.add_argument("--output", help="结果写入文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
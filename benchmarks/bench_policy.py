@@ -0,0 +1,74 @@
+"""群组策略提前过滤基准测试
+
+测量不处理的群组（黑名单、白名单之外）的消息和事件在 on_message / on_recall 中被拒绝的单次耗时，
+并与正常缓存一条消息的耗时、单独查一次策略表的耗时对比。需要已安装 AstrBot。
+
+用法: python benchmarks/bench_policy.py [--events N] [--groups N]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeContext, Traffic, load_plugin_module
+
+
+async def per_event_ns(handler, events: list) -> float:
+    start = time.perf_counter()
+    for event in events:
+        await handler(event)
+    return (time.perf_counter() - start) / len(events) * 1e9
+
+
+def lookup_ns(table, group_ids: list) -> float:
+    get = table.get
+    start = time.perf_counter()
+    for group_id in group_ids:
+        get(group_id)
+    return (time.perf_counter() - start) / len(group_ids) * 1e9
+
+
+async def run(args):
+    main, comp = load_plugin_module()
+    main.logger.setLevel(logging.ERROR)
+    traffic = Traffic(comp, groups=args.groups)
+    events = traffic.messages(args.events)
+    all_groups = sorted({event.get_group_id() for event in events})
+    allowed = all_groups[: len(all_groups) // 2]
+
+    base = {"enable_recall_fallback": False, "max_cache_size": args.events}
+    cases = [
+        ("全部处理", {}),
+        ("黑名单（全部群组）", {"group_blacklist": all_groups}),
+        ("白名单（不含任何群组）", {"group_whitelist": ["0"]}),
+        ("白名单（一半群组）", {"group_whitelist": allowed}),
+    ]
+
+    print(f"{'配置':<16} {'on_message(ns)':>16} {'on_recall(ns)':>15} {'查表(ns)':>10}")
+    for name, overrides in cases:
+        plugin = main.AntiRecallPlugin(FakeContext(), {**base, **overrides})
+        message_ns = await per_event_ns(plugin.on_message, events)
+        # on_recall 注册在所有事件上，普通消息同样会进入该处理函数
+        recall_ns = await per_event_ns(plugin.on_recall, events)
+        table_ns = lookup_ns(
+            plugin.group_policies, [event.get_group_id() for event in events]
+        )
+        print(f"{name:<16} {message_ns:>16.0f} {recall_ns:>15.0f} {table_ns:>10.0f}")
+        await plugin.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--groups", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
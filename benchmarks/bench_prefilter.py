@@ -0,0 +1,96 @@
+"""本地审核吞吐量基准测试
+
+测量 LocalFilter 在不同规则数量下每秒可判定的消息数，
+并与逐条关键词 `in` 检查的朴素实现对比。
+
+用法: python benchmarks/bench_prefilter.py [--messages N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anti_recall import DENY, LocalFilter
+
+RULE_COUNTS = [10, 100, 1_000, 10_000]
+
+WORDS = ["今天", "吃饭", "哈哈", "群主", "什么", "上班", "好的", "明天", "游戏", "图片"]
+
+
+def make_keywords(count: int) -> list:
+    return [f"违规词{i:05d}" for i in range(count)]
+
+
+def make_messages(count: int, keywords: list, seed: int = 0) -> list:
+    """约 5% 命中关键词、5% 包含网址、5% 为纯笑声，其余为普通聊天"""
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        text = "".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+        roll = rng.random()
+        if roll < 0.05:
+            text += rng.choice(keywords)
+        elif roll < 0.10:
+            text += f" https://example.com/?id={i}"
+        elif roll < 0.15:
+            text = "哈" * rng.randint(2, 8)
+        messages.append(text)
+    return messages
+
+
+def bench_local_filter(keywords: list, messages: list):
+    local_filter = LocalFilter(
+        blocked_keywords=keywords, allowed_patterns=[r"[哈呵草6。.!？?]+"]
+    )
+    denied = 0
+    start = time.perf_counter()
+    for message in messages:
+        if local_filter.check(message)[0] == DENY:
+            denied += 1
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed, denied
+
+
+def bench_naive(keywords: list, messages: list):
+    """朴素实现：逐个关键词做子串检查"""
+    lowered = [keyword.lower() for keyword in keywords]
+    denied = 0
+    start = time.perf_counter()
+    for message in messages:
+        text = message.lower()
+        if (
+            "http://" in text
+            or "https://" in text
+            or "www." in text
+            or any(keyword in text for keyword in lowered)
+        ):
+            denied += 1
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed, denied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(
+        f"{'规则数':>8} {'本地审核(条/秒)':>16} {'朴素实现(条/秒)':>16} {'拦截数':>8}"
+    )
+    for count in RULE_COUNTS:
+        keywords = make_keywords(count)
+        messages = make_messages(args.messages, keywords)
+        rate, denied = bench_local_filter(keywords, messages)
+        # 朴素实现在规则较多时很慢，只取部分消息测量
+        naive_rate, _ = bench_naive(
+            keywords, messages[: max(1_000, args.messages * 10 // count)]
+        )
+        print(f"{count:>8} {rate:>16,.0f} {naive_rate:>16,.0f} {denied:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""基准测试与压测共用的模拟对象
+
+- load_plugin_module: 以包的形式导入插件的 main.py（需要已安装 AstrBot）
+- FakeEvent / FakeContext: 只实现插件用到的 AstrMessageEvent / Context 接口
+- Traffic: 生成多群组的合成消息流
+"""
+
+import asyncio
+import importlib
+import os
+import random
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "astrbot_plugin_anti_recall"
+
+
+def load_plugin_module():
+    """导入插件主模块，返回 (main 模块, message_components 模块)"""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ROOT]
+        sys.modules[PACKAGE] = package
+    main = importlib.import_module(f"{PACKAGE}.main")
+    return main, main.Comp
+
+
+class FakeMessageObj:
+    __slots__ = ("message", "message_id", "raw_message", "timestamp")
+
+    def __init__(self, message_id, message, timestamp, raw_message=None):
+        self.message_id = message_id
+        self.message = message
+        self.timestamp = timestamp
+        self.raw_message = raw_message
+
+
+class FakeEvent:
+    """模拟 aiocqhttp 群消息 / 撤回通知事件"""
+
+    __slots__ = ("_group_id", "_sender_id", "_sender_name", "bot", "message_obj")
+
+    self_id = "10000"
+
+    def __init__(self, message_obj, group_id, sender_id, sender_name="", bot=None):
+        self.message_obj = message_obj
+        self._group_id = group_id
+        self._sender_id = sender_id
+        self._sender_name = sender_name
+        self.bot = bot
+
+    @property
+    def unified_msg_origin(self) -> str:
+        return f"aiocqhttp:GroupMessage:{self._group_id}"
+
+    def get_group_id(self):
+        return self._group_id
+
+    def get_sender_id(self):
+        return self._sender_id
+
+    def get_sender_name(self):
+        return self._sender_name
+
+    def get_self_id(self):
+        return self.self_id
+
+    def get_platform_name(self):
+        return "aiocqhttp"
+
+    def plain_result(self, text):
+        return text
+
+
+class FakeResponse:
+    __slots__ = ("completion_text",)
+
+    def __init__(self, completion_text):
+        self.completion_text = completion_text
+
+
+class FakeContext:
+    """模拟 AstrBot Context：LLM 调用有固定延迟和错误率，发送消息只做记录"""
+
+    def __init__(
+        self,
+        llm_latency: float = 0.0,
+        llm_error_rate: float = 0.0,
+        send_latency: float = 0.0,
+        seed: int = 0,
+    ):
+        self.llm_latency = llm_latency
+        self.llm_error_rate = llm_error_rate
+        self.send_latency = send_latency
+        self._rng = random.Random(seed)
+        self.llm_calls = 0
+        self.llm_in_flight = 0
+        self.llm_peak_in_flight = 0
+        self.sent = []
+
+    async def get_current_chat_provider_id(self, umo=None):
+        return "fake-provider"
+
+    async def llm_generate(self, chat_provider_id=None, prompt="", **kwargs):
+        self.llm_calls += 1
+        self.llm_in_flight += 1
+        self.llm_peak_in_flight = max(self.llm_peak_in_flight, self.llm_in_flight)
+        try:
+            if self.llm_latency:
+                await asyncio.sleep(self.llm_latency)
+            if self._rng.random() < self.llm_error_rate:
+                raise RuntimeError("模拟的 LLM 调用失败")
+            if "审核" in prompt and "JSON" not in prompt and "评论家" not in prompt:
+                return FakeResponse("否")
+            if "JSON" in prompt:
+                return FakeResponse('{"blocked": false, "comment": "模拟锐评"}')
+            return FakeResponse("模拟锐评")
+        finally:
+            self.llm_in_flight -= 1
+
+    async def send_message(self, session, message_chain):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent.append((time.perf_counter(), session, message_chain))
+        return True
+
+
+class Traffic:
+    """多群组合成消息流：群组和发送者按幂律分布，约 80% 纯文本、10% 提及、10% 图片"""
+
+    def __init__(self, comp, groups: int = 200, senders: int = 2000, seed: int = 0):
+        self.comp = comp
+        self.groups = [str(100000 + i) for i in range(groups)]
+        self.senders = [str(200000 + i) for i in range(senders)]
+        self._rng = random.Random(seed)
+        self._next_id = 1
+        self.start_ts = int(time.time()) - 86400
+
+    def _pick(self, items: list) -> str:
+        # 少数活跃群组/用户产生大部分消息
+        return items[min(int(self._rng.paretovariate(1.2)) - 1, len(items) - 1)]
+
+    def message(self) -> FakeEvent:
+        comp = self.comp
+        message_id = self._next_id
+        self._next_id += 1
+        group_id = self._pick(self.groups)
+        sender_id = self._pick(self.senders)
+        roll = self._rng.random()
+        if roll < 0.8:
+            chain = [comp.Plain(f"群聊消息 {message_id} 今天吃什么")]
+        elif roll < 0.9:
+            chain = [comp.At(qq=sender_id, name="群友"), comp.Plain(" 在吗")]
+        else:
+            chain = [comp.Image.fromURL(f"https://example.invalid/{message_id}.jpg")]
+        message_obj = FakeMessageObj(
+            str(message_id), chain, self.start_ts + message_id // 10
+        )
+        return FakeEvent(message_obj, group_id, sender_id, f"群友{sender_id[-3:]}")
+
+    @property
+    def latest_ts(self) -> int:
+        """最近生成的消息的时间戳"""
+        return self.start_ts + (self._next_id - 1) // 10
+
+    def messages(self, count: int) -> list:
+        return [self.message() for _ in range(count)]
+
+    @staticmethod
+    def recall(message: FakeEvent, bot=None) -> FakeEvent:
+        """构造与消息对应的 group_recall 通知"""
+        raw = {
+            "post_type": "notice",
+            "notice_type": "group_recall",
+            "message_id": int(message.message_obj.message_id),
+            "user_id": int(message.get_sender_id()),
+            "group_id": int(message.get_group_id()),
+            "operator_id": int(message.get_sender_id()),
+        }
+        message_obj = FakeMessageObj("0", [], int(time.time()), raw)
+        return FakeEvent(
+            message_obj, message.get_group_id(), message.get_sender_id(), bot=bot
+        )
+
+
+def percentiles(samples: list, points=(50, 90, 99)) -> dict:
+    """返回 {"p50": x, ...}，samples 为空时返回空字典"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    result = {f"p{p}": ordered[min(last, round(last * p / 100))] for p in points}
+    result["max"] = ordered[-1]
+    return result
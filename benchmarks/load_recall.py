@@ -0,0 +1,271 @@
+"""撤回端到端压测
+
+把消息和 group_recall 通知事件按时间回放给 on_message / on_recall，
+LLM 调用和消息发送由模拟的 Context 完成（可配置延迟和错误率）。
+报告从撤回到发出转发消息的端到端延迟，以及运行过程中的并发数、队列深度和内存占用。
+需要已安装 AstrBot。
+
+事件流可以是合成的（默认：每个群先发若干消息，再在同一时刻各撤回一条），
+也可以是录制的 JSONL 文件，每行一个事件：
+  {"at": 0.0, "kind": "message", "message_id": "1", "group_id": "100", "sender_id": "200", "text": "..."}
+  {"at": 1.0, "kind": "recall", "message_id": "1", "group_id": "100", "sender_id": "200"}
+
+用法: python benchmarks/load_recall.py [--groups 200] [--llm-latency 3] [--llm-error-rate 0.05]
+      [--input events.jsonl] [--config '{"recall_coalesce_window": 1.5}'] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import (
+    FakeContext,
+    FakeEvent,
+    FakeMessageObj,
+    Traffic,
+    load_plugin_module,
+    percentiles,
+)
+
+COMMENT_NODE_NAME = "AI 锐评助手"
+
+
+def synthetic_events(groups: int, messages_per_group: int, recall_at: float) -> list:
+    """每个群发送 messages_per_group 条消息，recall_at 秒时每个群撤回最后一条"""
+    events = []
+    message_id = 1
+    for g in range(groups):
+        group_id = str(100000 + g)
+        for i in range(messages_per_group):
+            events.append(
+                {
+                    "at": 0.0,
+                    "kind": "message",
+                    "message_id": str(message_id),
+                    "group_id": group_id,
+                    "sender_id": str(200000 + i % 20),
+                    "text": f"群 {group_id} 的第 {i} 条消息",
+                }
+            )
+            message_id += 1
+        last = events[-1]
+        events.append(
+            {
+                "at": recall_at,
+                "kind": "recall",
+                "message_id": last["message_id"],
+                "group_id": group_id,
+                "sender_id": last["sender_id"],
+            }
+        )
+    return events
+
+
+def load_events(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda e: e.get("at", 0))
+    return events
+
+
+class Harness:
+    def __init__(self, main, comp, context: FakeContext, config: dict):
+        self.comp = comp
+        self.context = context
+        self.plugin = main.AntiRecallPlugin(context, config)
+        self.handlers: set = set()
+        # 群会话 -> 尚未发出的撤回开始时间（按撤回顺序）
+        self.pending = defaultdict(deque)
+        self.latencies: list = []
+        self.recalls = 0
+        self.samples: list = []
+        self._start = 0.0
+        self._sent_seen = 0
+
+    def _message_event(self, event: dict) -> FakeEvent:
+        message_obj = FakeMessageObj(
+            event["message_id"],
+            [self.comp.Plain(event.get("text", ""))],
+            int(time.time()),
+        )
+        return FakeEvent(
+            message_obj,
+            event["group_id"],
+            event["sender_id"],
+            event.get("sender_name", f"群友{event['sender_id'][-3:]}"),
+        )
+
+    async def replay(self, events: list, speed: float):
+        self._start = time.perf_counter()
+        for event in events:
+            delay = self._start + event.get("at", 0) / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if event["kind"] == "message":
+                await self.plugin.on_message(self._message_event(event))
+            elif event["kind"] == "recall":
+                recall = Traffic.recall(self._message_event(event))
+                self.pending[recall.unified_msg_origin].append(time.perf_counter())
+                self.recalls += 1
+                # 框架为每个事件单独调度处理函数
+                task = asyncio.create_task(self.plugin.on_recall(recall))
+                self.handlers.add(task)
+                task.add_done_callback(self.handlers.discard)
+
+    def _match_sends(self):
+        """把新发出的转发消息与撤回对应起来，计算端到端延迟"""
+        sent = self.context.sent
+        for sent_at, session, message_chain in sent[self._sent_seen :]:
+            nodes = [
+                node
+                for node in getattr(message_chain, "chain", [])
+                if getattr(node, "name", None) != COMMENT_NODE_NAME
+            ]
+            if not nodes:
+                # 两段式发送中单独补发的锐评
+                continue
+            queue = self.pending[session]
+            for _ in range(len(nodes)):
+                if not queue:
+                    break
+                self.latencies.append(sent_at - queue.popleft())
+        self._sent_seen = len(sent)
+
+    def idle(self) -> bool:
+        plugin = self.plugin
+        return (
+            not self.handlers
+            and not plugin._background_tasks
+            and not plugin._recall_batches
+        )
+
+    async def sample(self, interval: float):
+        while True:
+            self._match_sends()
+            current, _ = tracemalloc.get_traced_memory()
+            self.samples.append(
+                {
+                    "t": round(time.perf_counter() - self._start, 3),
+                    "recall_handlers": len(self.handlers),
+                    "background_tasks": len(self.plugin._background_tasks),
+                    "coalesce_pending": len(self.plugin._recall_batches),
+                    "llm_in_flight": self.context.llm_in_flight,
+                    "awaiting_send": sum(len(q) for q in self.pending.values()),
+                    "sent": len(self.context.sent),
+                    "memory_bytes": current,
+                }
+            )
+            await asyncio.sleep(interval)
+
+
+async def run(args) -> dict:
+    main, comp = load_plugin_module()
+    main.logger.setLevel(logging.ERROR)
+    events = (
+        load_events(args.input)
+        if args.input
+        else synthetic_events(args.groups, args.messages_per_group, args.recall_at)
+    )
+    # 默认缓存能容纳全部回放消息，避免撤回因缓存淘汰而找不到
+    config = {
+        "enable_recall_fallback": False,
+        "max_cache_size": max(1000, len(events)),
+    }
+    config.update(json.loads(args.config))
+    context = FakeContext(
+        llm_latency=args.llm_latency,
+        llm_error_rate=args.llm_error_rate,
+        send_latency=args.send_latency,
+    )
+
+    tracemalloc.start()
+    harness = Harness(main, comp, context, config)
+    await harness.plugin.initialize()
+    sampler = asyncio.create_task(harness.sample(args.sample_interval))
+    await harness.replay(events, args.speed)
+
+    deadline = time.perf_counter() + args.timeout
+    while not harness.idle() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    sampler.cancel()
+    harness._match_sends()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await harness.plugin.terminate()
+
+    samples = harness.samples
+    return {
+        "config": {
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "send_latency": args.send_latency,
+            "plugin": config,
+            "events": len(events),
+        },
+        "recalls": harness.recalls,
+        "sent": len(context.sent),
+        "unsent_recalls": sum(len(q) for q in harness.pending.values()),
+        "timed_out": not harness.idle(),
+        "llm_calls": context.llm_calls,
+        "latency_ms": {
+            key: round(value * 1000, 1)
+            for key, value in percentiles(harness.latencies).items()
+        },
+        "peak": {
+            "llm_in_flight": context.llm_peak_in_flight,
+            "recall_handlers": max((s["recall_handlers"] for s in samples), default=0),
+            "background_tasks": max(
+                (s["background_tasks"] for s in samples), default=0
+            ),
+            "coalesce_pending": max(
+                (s["coalesce_pending"] for s in samples), default=0
+            ),
+            "memory_bytes": peak_memory,
+        },
+        "timeline": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--messages-per-group", type=int, default=50)
+    parser.add_argument(
+        "--recall-at", type=float, default=1.0, help="合成事件中撤回发生的时刻（秒）"
+    )
+    parser.add_argument("--input", help="录制的 JSONL 事件流，代替合成事件")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍率")
+    parser.add_argument("--llm-latency", type=float, default=3.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--send-latency", type=float, default=0.05)
+    parser.add_argument("--config", default="{}", help="插件配置覆盖（JSON）")
+    parser.add_argument("--sample-interval", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="报告写入文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(
+        f"撤回 {report['recalls']} 条, 发送 {report['sent']} 条, 未发送 {report['unsent_recalls']} 条, "
+        f"LLM 调用 {report['llm_calls']} 次 (峰值并发 {report['peak']['llm_in_flight']}), "
+        f"端到端延迟 {report['latency_ms']}",
+        file=sys.stderr,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
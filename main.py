@@ -1,4 +1,11 @@
 
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import time
+
 import astrbot.api.message_components as Comp
 from astrbot.api import AstrBotConfig, logger
 from astrbot.api.event import AstrMessageEvent, filter
@@ -8,6 +15,57 @@ from astrbot.core.platform.message_type import MessageType
 from astrbot.core.star.filter.event_message_type import EventMessageType
 from astrbot.core.star.filter.platform_adapter_type import PlatformAdapterType
 
+from .anti_recall import (
+    ALLOW,
+    DENY,
+    CachedMessage,
+    GroupPolicy,
+    ImageBlobStore,
+    LLMClient,
+    LLMUnavailableError,
+    LocalCoordinator,
+    LocalFilter,
+    MessageCache,
+    MessageStore,
+    MetricsRegistry,
+    PolicyTable,
+    PromptBuilder,
+    RecallArchive,
+    RecallFallback,
+    RecallScheduler,
+    SimHashIndex,
+    SQLiteCoordinator,
+    TTLCache,
+    classify,
+    content_key,
+    parse_combined_reply,
+    parse_overrides,
+    simhash,
+)
+
+# 内置提示词模板版本，修改提示词模板时递增，使已缓存的判定和锐评失效
+PROMPT_VERSION = 1
+
+# 锐评风格提示，作为锐评提示词的固定前缀
+STYLE_PROMPTS = {
+    "幽默风趣": "你是一个幽默风趣的评论家，请对以下撤回的内容进行锐评，语气要轻松幽默，不要太严肃。如果有撤回前的聊天上下文，请结合上下文分析撤回的原因。",
+    "严肃认真": "你是一个严肃认真的评论家，请对以下撤回的内容进行客观分析。如果有撤回前的聊天上下文，请结合上下文分析撤回的原因。",
+    "毒舌吐槽": "你是一个毒舌的评论家，请对以下撤回的内容进行犀利吐槽。如果有撤回前的聊天上下文，请结合上下文吐槽。",
+    "温和友善": "你是一个温和友善的评论家，请对以下撤回的内容进行温和点评。如果有撤回前的聊天上下文，请结合上下文点评。",
+}
+
+# 合并违规检测与锐评的提示词，要求模型只返回一个 JSON 对象
+COMBINED_PROMPT_TEMPLATE = """你需要同时完成内容审核和锐评两项任务，只输出一个 JSON 对象，不要输出任何其他文字。
+格式: {{"blocked": true 或 false, "comment": "锐评内容"}}
+blocked: 按以下审核要求判断撤回内容是否违规（忽略审核要求中对回答格式的限制）。
+comment: 按以下锐评要求生成锐评；内容违规时 comment 留空。
+
+【审核要求】
+{filter_prompt}
+
+【锐评要求】
+{comment_prompt}"""
+
 
 @register(
     "astrbot_plugin_anti_recall",
@@ -42,6 +100,126 @@ class AntiRecallPlugin(Star):
 
             self.fixed_llm_provider = config.get("fixed_llm_provider", "")
 
+            # 本地审核：命中拦截规则直接判定违规，整条匹配放行规则直接通过，其余交给 LLM
+
+            self.local_filter = LocalFilter(
+                blocked_keywords=config.get("blocked_keywords", []),
+                blocked_patterns=config.get("blocked_patterns", []),
+                allowed_keywords=config.get("allowed_keywords", []),
+                allowed_patterns=config.get("allowed_patterns", []),
+                block_urls=config.get("block_urls", True),
+            )
+
+            for pattern in self.local_filter.invalid_patterns:
+                logger.warning(f"[防撤回插件] 忽略无效的审核正则: {pattern}")
+
+            # LLM 调用层：会话提供商缓存、调用超时、熔断与备用提供商
+
+            self.fallback_llm_provider = config.get("fallback_llm_provider", "")
+
+            self.llm = LLMClient(
+                context,
+                fixed_provider=self.fixed_llm_provider,
+                fallback_provider=self.fallback_llm_provider,
+                timeout=config.get("llm_timeout", 30),
+                provider_cache_ttl=config.get("provider_cache_ttl", 300),
+                failure_threshold=config.get("circuit_failure_threshold", 5),
+                reset_timeout=config.get("circuit_reset_timeout", 60),
+            )
+
+            # 一次 LLM 调用同时返回违规判定和锐评，解析失败时回退到分两次调用
+
+            self.enable_combined_llm_call = config.get(
+                "enable_combined_llm_call", False
+            )
+
+            # 按内容缓存违规判定和锐评，相同内容再次撤回时不再请求 LLM
+
+            self.verdict_cache = TTLCache(
+                config.get("verdict_cache_size", 10000),
+                config.get("verdict_cache_ttl", 86400),
+            )
+
+            # 近似重复检测：与已判定内容的 SimHash 指纹海明距离不超过阈值时直接继承判定，
+            # 按 near_duplicate_audit_rate 的比例抽查，仍请求 LLM 并与继承的判定比对
+
+            self.near_duplicates = None
+
+            if config.get("enable_near_duplicate", False):
+                self.near_duplicates = SimHashIndex(
+                    min(max(config.get("near_duplicate_distance", 6), 0), 10),
+                    config.get("verdict_cache_size", 10000),
+                    config.get("verdict_cache_ttl", 86400),
+                )
+
+            self.near_duplicate_min_chars = config.get("near_duplicate_min_chars", 10)
+
+            self.near_duplicate_audit_rate = config.get(
+                "near_duplicate_audit_rate", 0.05
+            )
+
+            self.enable_comment_reuse = config.get("enable_comment_reuse", False)
+
+            # 允许复用锐评的群组，留空表示所有群组
+
+            self.comment_reuse_groups = {
+                str(gid) for gid in config.get("comment_reuse_groups", [])
+            }
+
+            self.comment_cache = TTLCache(
+                config.get("verdict_cache_size", 10000),
+                config.get("verdict_cache_ttl", 86400),
+            )
+
+            # 连续撤回合并窗口（秒），窗口内同一用户的撤回合并为一条转发消息，0 表示不合并
+
+            self.recall_coalesce_window = config.get("recall_coalesce_window", 0)
+
+            self._recall_batches = {}
+
+            self._background_tasks = set()
+
+            # LLM 调用与消息发送限流（每分钟次数，按群组和全局两级，0 表示不限制）
+
+            self.scheduler = RecallScheduler(
+                {
+                    "llm": (
+                        config.get("llm_rate_per_group", 0),
+                        config.get("llm_rate_global", 0),
+                    ),
+                    "send": (
+                        config.get("send_rate_per_group", 0),
+                        config.get("send_rate_global", 0),
+                    ),
+                }
+            )
+
+            # 额度不足时的处理方式：no_comment（不附锐评）、queue（排队等待）、drop（丢弃）
+
+            self.rate_limit_mode = config.get("rate_limit_mode", "no_comment")
+
+            self.rate_limit_max_wait = config.get("rate_limit_max_wait", 30)
+
+            # 违规检测的同时提前生成锐评，检测判定违规时取消锐评
+
+            self.enable_speculative_comment = config.get(
+                "enable_speculative_comment", False
+            )
+
+            # 两段式发送：锐评超过 comment_deadline 秒未生成时先发送撤回内容，
+            # 锐评在 comment_cutoff 秒内生成时单独补发，否则放弃（均从开始处理撤回时计时，0 表示不启用/不限制）
+
+            self.comment_deadline = config.get("comment_deadline", 0)
+
+            self.comment_cutoff = config.get("comment_cutoff", 60)
+
+            # 合并调用要等锐评和判定一起返回才能发送，无法在期限内先发撤回内容，两者同时开启时按两段式处理
+            if self.comment_deadline > 0 and self.enable_combined_llm_call:
+                logger.warning(
+                    "[防撤回插件] 已设置 comment_deadline，合并调用不生效，违规检测与锐评分两次调用"
+                )
+                self.enable_combined_llm_call = False
+
             self.enable_context_analysis = config.get("enable_context_analysis", True)
 
             self.context_count = min(config.get("context_count", 10), 10)  # 最多10条
@@ -56,26 +234,379 @@ class AntiRecallPlugin(Star):
 
             self.comment_style = config.get("comment_style", "幽默风趣")
 
+            # 锐评提示词的 token 预算和单条上下文的最大字符数，0 表示不限制
+
+            self.prompt_builder = PromptBuilder(
+                STYLE_PROMPTS.get(self.comment_style, STYLE_PROMPTS["幽默风趣"]),
+                config.get("prompt_max_tokens", 2000),
+                config.get("prompt_max_line_chars", 300),
+            )
+
+            # 群组策略表：白名单、黑名单和单个群组的设置在加载时预先计算，处理事件时只查一次表
+
+            group_overrides, invalid_overrides = parse_overrides(
+                config.get("group_policy_overrides", [])
+            )
+
+            for line in invalid_overrides:
+                logger.warning(f"[防撤回插件] 忽略无效的群组设置: {line}")
+
+            self.group_policies = PolicyTable(
+                GroupPolicy(
+                    image_recall=self.enable_image_recall,
+                    ai_comment=self.enable_ai_analysis,
+                    moderation=self.enable_content_filter,
+                ),
+                allowed_groups=config.get("group_whitelist", []),
+                denied_groups=config.get("group_blacklist", []),
+                overrides=group_overrides,
+                enabled=self.enable_group_chat,
+            )
+
             self.max_cache_size = config.get("max_cache_size", 1000)
 
+            # 超过该字节数的消息内容压缩后缓存，0 表示不压缩
+
+            self.compress_threshold = config.get("compress_threshold", 1024)
+
+            # QQ 只允许撤回约 2 分钟内的消息，超过撤回时限的消息只作为上下文保留
+
+            self.recall_ttl = config.get("recall_ttl", 180)
+
+            self.context_ttl = config.get("context_ttl", 1800)
+
+            self.sweep_interval = max(config.get("sweep_interval", 30), 1)
+
+            # 按字节计的缓存上限，0 表示只按条数限制；每个群组至少保留的最新消息数
+
+            self.max_cache_bytes = int(config.get("max_cache_mb", 0) * 1024 * 1024)
+
+            self.min_group_messages = config.get("min_group_messages", 0)
+
             # 消息缓存，用于存储消息内容以便撤回时获取
 
-            self.message_cache = {}
+            self.message_cache = MessageCache(
+                self.max_cache_size,
+                self.recall_ttl,
+                self.context_ttl,
+                self.max_cache_bytes,
+                self.min_group_messages,
+                self.group_policies.cache_quotas(),
+            )
+
+            # 持久化存储，重启后仍可找到重启前缓存的消息
+
+            self.enable_persistent_store = config.get("enable_persistent_store", False)
+
+            self.message_store = None
+
+            if self.enable_persistent_store:
+                store_path = config.get("persistent_store_path", "") or os.path.join(
+                    "data", "plugin_data", "astrbot_plugin_anti_recall", "messages.db"
+                )
+                self.message_store = MessageStore(
+                    store_path,
+                    on_error=lambda e: logger.error(
+                        f"[防撤回插件] 写入持久化存储失败，稍后重试: {e}"
+                    ),
+                )
+
+            # 多个账号在同一群时，每条撤回只由一个账号处理（none / local 进程内 / sqlite 跨进程）
+
+            self.recall_coordinator = None
+
+            dedup_backend = config.get("recall_dedup_backend", "local")
+
+            dedup_lease = config.get("recall_dedup_lease", 30)
+
+            if dedup_backend == "local":
+                self.recall_coordinator = LocalCoordinator(dedup_lease)
+            elif dedup_backend == "sqlite":
+                dedup_path = config.get("recall_dedup_path", "") or os.path.join(
+                    "data", "plugin_data", "astrbot_plugin_anti_recall", "leases.db"
+                )
+                self.recall_coordinator = SQLiteCoordinator(dedup_path, dedup_lease)
+
+            # 撤回消息档案：已处理的撤回按群组、发送者、时间和关键词建立索引，可通过命令查询
+
+            self.recall_archive = None
+
+            if config.get("enable_recall_archive", True):
+                archive_path = None
+                if config.get("enable_recall_archive_file", False):
+                    archive_path = config.get(
+                        "recall_archive_path", ""
+                    ) or os.path.join(
+                        "data",
+                        "plugin_data",
+                        "astrbot_plugin_anti_recall",
+                        "recalls.jsonl",
+                    )
+                self.recall_archive = RecallArchive(
+                    config.get("recall_archive_size", 10000),
+                    archive_path,
+                    on_error=lambda e: logger.error(
+                        f"[防撤回插件] 写入撤回档案文件失败，稍后重试: {e}"
+                    ),
+                )
+
+            # 缓存未命中时通过 OneBot get_msg 接口获取原消息
+
+            self.recall_fallback = None
+
+            if config.get("enable_recall_fallback", True):
+                self.recall_fallback = RecallFallback(
+                    timeout=config.get("recall_fallback_timeout", 3),
+                    negative_ttl=config.get("recall_fallback_negative_ttl", 600),
+                    compress_threshold=self.compress_threshold,
+                )
+
+            # 图片本地缓存：收到图片时后台下载，撤回时从本地文件发送，避免图片地址过期
+
+            self.enable_image_cache = config.get("enable_image_cache", False)
+
+            self.image_store = None
+
+            # 全局关闭图片撤回时，单独开启图片撤回的群组仍需要图片缓存
+            if self.enable_image_cache and self.group_policies.any("image_recall"):
+                image_cache_path = config.get("image_cache_path", "") or os.path.join(
+                    "data", "plugin_data", "astrbot_plugin_anti_recall", "images"
+                )
+                self.image_store = ImageBlobStore(
+                    image_cache_path,
+                    max_bytes=int(config.get("image_cache_max_mb", 256) * 1024 * 1024),
+                    workers=config.get("image_prefetch_workers", 4),
+                )
+
+            # 后台维护任务（过期清理、指标导出），在 initialize 中启动
+
+            self._maintenance_task = None
 
-            # 缓存统计
+            # 指标统计，可导出为 Prometheus 文本格式
 
-            self.cache_hits = 0
+            self.metrics_file = config.get("metrics_file", "")
 
-            self.cache_misses = 0
+            self._init_metrics()
 
             logger.info(
-                f"[防撤回插件] 插件已加载，启用状态: {self.enabled}, AI分析: {self.enable_ai_analysis}, 违规检测: {self.enable_content_filter}, 最大缓存: {self.max_cache_size}, 固定LLM提供商: {self.fixed_llm_provider or '使用当前会话'}, 图片撤回检测: {self.enable_image_recall}, 上下文分析: {self.enable_context_analysis}, 上下文数量: {self.context_count}"
+                f"[防撤回插件] 插件已加载，启用状态: {self.enabled}, AI分析: {self.enable_ai_analysis}, 违规检测: {self.enable_content_filter}, 最大缓存: {self.max_cache_size}, 撤回保留: {self.recall_ttl}s, 上下文保留: {self.context_ttl}s, 固定LLM提供商: {self.fixed_llm_provider or '使用当前会话'}, 图片撤回检测: {self.enable_image_recall}, 上下文分析: {self.enable_context_analysis}, 上下文数量: {self.context_count}"
             )
 
         except Exception as e:
             logger.error(f"[防撤回插件] 初始化失败: {e}")
             raise
 
+    async def initialize(self):
+        """插件加载完成后启动后台任务"""
+        if self.message_store:
+            try:
+                await self.message_store.start()
+                logger.info(f"[防撤回插件] 持久化存储已启用: {self.message_store.path}")
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"[防撤回插件] 打开持久化存储失败: {e}")
+                self.message_store = None
+        if self.recall_coordinator is not None:
+            try:
+                await self.recall_coordinator.start()
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"[防撤回插件] 打开撤回去重存储失败: {e}")
+                self.recall_coordinator = None
+        if self.recall_archive is not None:
+            try:
+                await self.recall_archive.start()
+            except (OSError, ValueError) as e:
+                logger.error(f"[防撤回插件] 加载撤回档案失败: {e}")
+        if self.image_store is not None:
+            try:
+                await self.image_store.start()
+                logger.info(
+                    f"[防撤回插件] 图片本地缓存已启用: {self.image_store.directory} ({len(self.image_store)} 张)"
+                )
+            except OSError as e:
+                logger.error(f"[防撤回插件] 打开图片本地缓存失败: {e}")
+                self.image_store = None
+        if self.recall_ttl or self.context_ttl or self.metrics_file:
+            self._maintenance_task = asyncio.create_task(self._run_maintenance())
+
+    def _init_metrics(self):
+        """注册插件指标"""
+        metrics = self.metrics = MetricsRegistry()
+        self.m_messages_cached = metrics.counter(
+            "messages_cached_total", "已缓存的消息数"
+        )
+        metrics.gauge("cache_size", "当前缓存消息数", lambda: len(self.message_cache))
+        metrics.gauge(
+            "cache_bytes",
+            "当前缓存占用字节数（估算）",
+            lambda: self.message_cache.total_bytes,
+        )
+        metrics.counter(
+            "cache_evictions_total",
+            "因超出容量被淘汰的消息数",
+            lambda: self.message_cache.evictions,
+        )
+        metrics.counter(
+            "cache_expirations_total",
+            "因超过保留时间被清理的消息数",
+            lambda: self.message_cache.expirations,
+        )
+        self.m_recall_lookups = metrics.counter(
+            "recall_lookups_total",
+            "撤回消息查找结果（hit/store_hit/fallback_hit/miss）",
+        )
+        self.m_moderation = metrics.counter(
+            "moderation_verdicts_total",
+            "违规检测结果（blocked/passed/url/local_deny/local_allow/error）",
+        )
+        self.m_coalesced_recalls = metrics.counter(
+            "coalesced_recalls_total", "被合并到同一条转发消息中的额外撤回数"
+        )
+        self.m_rate_limited = metrics.counter(
+            "rate_limited_total",
+            "限流处理次数（kind=llm/send, action=queued/no_comment/drop）",
+        )
+        self.m_recalls_sent = metrics.counter(
+            "recalls_sent_total", "已发送的撤回消息数"
+        )
+        self.m_near_duplicates = metrics.counter(
+            "near_duplicate_lookups_total",
+            "近似重复查找结果（inherited 继承判定, audited 抽查, miss 未命中, too_short 内容过短）",
+        )
+        self.m_near_duplicate_audits = metrics.counter(
+            "near_duplicate_audits_total",
+            "近似重复抽查结果（agree 与 LLM 判定一致, mismatch 误匹配）",
+        )
+        metrics.gauge(
+            "near_duplicate_index_size",
+            "近似重复索引中的指纹数",
+            lambda: (
+                len(self.near_duplicates) if self.near_duplicates is not None else 0
+            ),
+        )
+        self.m_recall_claims = metrics.counter(
+            "recall_claims_total",
+            "多账号撤回去重的租约申请结果（won 由本账号处理, lost 已由其他账号处理, error 协调失败）",
+        )
+        self.m_comment_delivery = metrics.counter(
+            "comment_delivery_total",
+            "两段式发送中锐评的发送方式（inline 随撤回发送, followup 单独补发, dropped 超时放弃）",
+        )
+        self.m_llm_requests = metrics.counter(
+            "llm_requests_total",
+            "LLM 调用次数（purpose=comment/moderation/combined, status=ok/empty/error/cancelled）",
+        )
+        self.m_combined_replies = metrics.counter(
+            "combined_replies_total", "合并调用结果（ok/parse_error/error）"
+        )
+        metrics.counter(
+            "verdict_cache_hits_total",
+            "违规判定缓存命中次数",
+            lambda: self.verdict_cache.hits,
+        )
+        metrics.counter(
+            "verdict_cache_misses_total",
+            "违规判定缓存未命中次数",
+            lambda: self.verdict_cache.misses,
+        )
+        metrics.counter(
+            "comment_cache_hits_total",
+            "锐评缓存命中次数",
+            lambda: self.comment_cache.hits,
+        )
+        metrics.counter(
+            "recall_fallback_timeouts_total",
+            "get_msg 回退查询超时次数",
+            lambda: self.recall_fallback.timeouts if self.recall_fallback else 0,
+        )
+        metrics.counter(
+            "recall_fallback_negative_hits_total",
+            "命中负缓存而跳过的 get_msg 回退查询次数",
+            lambda: self.recall_fallback.skipped if self.recall_fallback else 0,
+        )
+        metrics.gauge(
+            "image_cache_bytes",
+            "图片本地缓存占用字节数",
+            lambda: self.image_store.total_bytes if self.image_store is not None else 0,
+        )
+        metrics.counter(
+            "image_downloads_total",
+            "下载到本地的图片数（不含内容重复的图片）",
+            lambda: self.image_store.downloaded if self.image_store is not None else 0,
+        )
+        metrics.counter(
+            "image_download_failures_total",
+            "图片下载失败次数",
+            lambda: self.image_store.failed if self.image_store is not None else 0,
+        )
+        metrics.counter(
+            "image_prefetch_dropped_total",
+            "下载队列已满而放弃的图片数",
+            lambda: self.image_store.dropped if self.image_store is not None else 0,
+        )
+        metrics.counter(
+            "store_write_errors_total",
+            "持久化存储批量写入失败次数",
+            lambda: self.message_store.write_errors if self.message_store else 0,
+        )
+        metrics.counter(
+            "store_dropped_total",
+            "持久化存储待写队列超出上限而丢弃的条目数",
+            lambda: self.message_store.dropped if self.message_store else 0,
+        )
+        metrics.counter(
+            "recall_archive_write_errors_total",
+            "撤回档案文件写入失败次数",
+            lambda: (
+                self.recall_archive.write_errors
+                if self.recall_archive is not None
+                else 0
+            ),
+        )
+        self.m_llm_latency = metrics.histogram(
+            "llm_latency_seconds", "LLM 调用耗时（purpose=comment/moderation）"
+        )
+        self.m_send_latency = metrics.histogram(
+            "send_latency_seconds", "发送撤回消息耗时"
+        )
+        self.m_prompt_tokens = metrics.histogram(
+            "prompt_tokens",
+            "锐评提示词的估算 token 数（purpose=comment/combined）",
+            (128, 256, 512, 1024, 2048, 4096, 8192),
+        )
+        self.m_prompt_trimmed = metrics.counter(
+            "prompt_trimmed_total",
+            "提示词超出预算的处理次数（kind=truncated 截断内容, context_dropped 丢弃的上下文条数）",
+        )
+
+    async def _run_maintenance(self):
+        """定期清理超过保留时间的缓存消息并导出指标"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                if self.recall_ttl or self.context_ttl:
+                    now = time.time()
+                    expired = self.message_cache.expire(now)
+                    if self.message_store:
+                        await self.message_store.prune(
+                            now - max(self.recall_ttl, self.context_ttl)
+                        )
+                    if expired:
+                        logger.debug(
+                            "[防撤回插件] 已清理 %d 条过期消息 (剩余缓存: %d)",
+                            expired,
+                            len(self.message_cache),
+                        )
+            except sqlite3.Error as e:
+                logger.error(f"[防撤回插件] 清理过期消息失败: {e}")
+            if self.metrics_file:
+                try:
+                    text = self.metrics.render_prometheus()
+                    await asyncio.to_thread(
+                        self.metrics.write_prometheus, self.metrics_file, text
+                    )
+                except OSError as e:
+                    logger.error(f"[防撤回插件] 导出指标失败: {e}")
+
     @filter.event_message_type(EventMessageType.ALL)
     @filter.platform_adapter_type(PlatformAdapterType.AIOCQHTTP)
     async def on_message(self, event: AstrMessageEvent):
@@ -83,12 +614,9 @@ class AntiRecallPlugin(Star):
         if not self.enabled:
             return
 
-        # 只缓存群聊消息
-        if not event.get_group_id():
-            return
-
-        # 只在群聊中启用时才缓存
-        if not self.enable_group_chat:
+        # 私聊、未启用群聊、黑名单或白名单之外的群组，在解析消息之前直接跳过
+        policy = self.group_policies.get(event.get_group_id())
+        if policy is None:
             return
 
         # 检查是否是机器人自己发送的消息
@@ -97,7 +625,7 @@ class AntiRecallPlugin(Star):
 
         try:
             message_id = str(event.message_obj.message_id)  # 转换为字符串以确保类型一致
-            message_content = self._extract_message_content(event)
+            message_type, message_content, components = self._classify_message(event)
             sender_id = event.get_sender_id()
             sender_name = event.get_sender_name()
             group_id = event.get_group_id()
@@ -107,31 +635,38 @@ class AntiRecallPlugin(Star):
                 logger.debug(f"[防撤回插件] 跳过空消息: message_id={message_id}")
                 return
 
-            # 缓存消息
-            self.message_cache[message_id] = {
-                "content": message_content,
-                "sender_id": sender_id,
-                "sender_name": sender_name,
-                "group_id": group_id,
-                "timestamp": event.message_obj.timestamp,
-                "message_type": self._get_message_type(event),
-            }
+            # 该群组不处理图片撤回时，图片消息无需缓存
+            if message_type == "图片" and not policy.image_recall:
+                return
 
-            logger.info(
-                f"[防撤回插件] 缓存消息: message_id={message_id} (type={type(message_id).__name__}), 发送者={sender_name}, 内容={message_content[:50]}, 群组={group_id}, 当前缓存数={len(self.message_cache)}"
+            # 缓存消息，超过限制时自动淘汰最早缓存的消息
+            record = CachedMessage(
+                message_content,
+                sender_id,
+                sender_name,
+                group_id,
+                event.message_obj.timestamp,
+                message_type,
+                self.compress_threshold,
+                components,
             )
-
-            # 检查缓存大小，超过限制时清理最旧的消息
-            if len(self.message_cache) > self.max_cache_size:
-                # 按时间戳排序，删除最旧的消息
-                sorted_messages = sorted(
-                    self.message_cache.items(), key=lambda x: x[1]["timestamp"]
-                )
-                messages_to_remove = len(self.message_cache) - self.max_cache_size
-                for i in range(messages_to_remove):
-                    del self.message_cache[sorted_messages[i][0]]
-                logger.info(
-                    f"[防撤回插件] 缓存超过限制，已清理 {messages_to_remove} 条旧消息"
+            evicted = self.message_cache.put(message_id, record)
+            if components and self.image_store is not None:
+                self._prefetch_images(components)
+            if self.message_store:
+                self.message_store.add(message_id, record)
+            self.m_messages_cached.inc()
+
+            # 热路径只在 DEBUG 级别延迟格式化日志
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "[防撤回插件] 缓存消息: message_id=%s, 发送者=%s, 内容=%s, 群组=%s, 当前缓存数=%d, 淘汰=%d",
+                    message_id,
+                    sender_name,
+                    message_content[:50],
+                    group_id,
+                    len(self.message_cache),
+                    evicted,
                 )
 
         except Exception as e:
@@ -144,12 +679,15 @@ class AntiRecallPlugin(Star):
         if not self.enabled:
             return
 
+        # 不处理的群组在读取原始事件之前直接跳过（好友撤回没有群号，不在此处过滤）
+        group_id = event.get_group_id()
+        if group_id and self.group_policies.get(group_id) is None:
+            return
+
         try:
             # 获取原始消息
             raw_message = getattr(event.message_obj, "raw_message", None)
 
-            logger.debug(f"[防撤回插件] 收到事件: raw_message={raw_message}")
-
             if not raw_message or not isinstance(raw_message, dict):
                 return
 
@@ -158,8 +696,9 @@ class AntiRecallPlugin(Star):
                 return
 
             notice_type = raw_message.get("notice_type")
+            if notice_type not in ("group_recall", "friend_recall"):
+                return
 
-            # 添加调试日志
             logger.info(
                 f"[防撤回插件] 收到撤回事件: notice_type={notice_type}, message_id={raw_message.get('message_id')}, user_id={raw_message.get('user_id')}"
             )
@@ -194,66 +733,431 @@ class AntiRecallPlugin(Star):
                 )
                 return
 
-            # 获取缓存的撤回消息
-            recalled_message = self.message_cache.get(message_id)
+            # 检查是否是机器人自己撤回的消息（机器人的消息不会被缓存，无需查找）
+            if str(user_id) == str(event.get_self_id()):
+                logger.debug("[防撤回插件] 机器人自己撤回的消息，不处理")
+                return
+
+            # 同一进程内的其他账号已在处理这条撤回时，无需查找
+            owner = f"{event.get_self_id()}@{os.getpid()}"
+            if self.recall_coordinator is not None:
+                holder = self.recall_coordinator.holder(str(group_id), message_id)
+                if holder is not None and holder != owner:
+                    self.m_recall_claims.inc(result="lost")
+                    self._log_recall_skipped(message_id, group_id)
+                    return
+
+            recalled_message = await self._lookup_recalled_message(
+                event, message_id, str(group_id), user_id
+            )
 
             if not recalled_message:
-                self.cache_misses += 1
                 logger.warning(
                     f"[防撤回插件] 未找到撤回消息的缓存: {message_id} (缓存总数: {len(self.message_cache)}, 命中率: {self._get_cache_hit_rate()})"
                 )
-                logger.debug(
-                    f"[防撤回插件] 当前缓存的消息ID: {list(self.message_cache.keys())}"
-                )
                 return
 
-            self.cache_hits += 1
+            # 找到消息后才申请租约：找不到消息的账号（刚重启、已淘汰）不会抢走租约，
+            # 申请失败说明其他账号已在处理，本账号直接跳过
+            if not await self._claim_recall(str(group_id), message_id, owner):
+                self._log_recall_skipped(message_id, group_id)
+                return
+
             logger.info(
                 f"[防撤回插件] 找到撤回消息缓存: {message_id} (缓存总数: {len(self.message_cache)}, 命中率: {self._get_cache_hit_rate()})"
             )
 
-            # 清理缓存
-            del self.message_cache[message_id]
+            logger.info(
+                f"[防撤回插件] 检测到撤回事件: 消息ID={message_id}, 发送者={recalled_message.sender_name}, 群组={group_id}"
+            )
 
-            # 检查是否是机器人自己撤回的消息
-            if user_id == event.get_self_id():
-                logger.debug("[防撤回插件] 机器人自己撤回的消息，不处理")
+            # 检查是否是图片消息，如果该群组禁用了图片撤回检测则跳过
+            policy = self.group_policies.get(str(group_id))
+            if policy is None:
                 return
+            if not policy.image_recall and recalled_message.message_type == "图片":
+                logger.info("[防撤回插件] 图片撤回检测已禁用，跳过处理")
+                return
+
+            # 短时间内同一用户的连续撤回合并为一条转发消息处理
+            if self.recall_coalesce_window > 0:
+                self._enqueue_recall(
+                    event, group_id, user_id, operator_id, message_id, recalled_message
+                )
+                return
+
+            await self._process_group_recalls(
+                event, group_id, operator_id, [(message_id, recalled_message)]
+            )
 
+        except Exception as e:
+            logger.error(f"[防撤回插件] 处理群消息撤回失败: {e}")
+
+    async def _claim_recall(self, group_id: str, message_id, owner: str):
+        """申请处理这条撤回的租约；未启用去重或协调失败时都由本账号处理"""
+        if self.recall_coordinator is None:
+            return True
+        try:
+            claimed = await self.recall_coordinator.claim(group_id, message_id, owner)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"[防撤回插件] 撤回去重协调失败，按本账号处理: {e}")
+            self.m_recall_claims.inc(result="error")
+            return True
+        self.m_recall_claims.inc(result="won" if claimed else "lost")
+        return claimed
+
+    @staticmethod
+    def _log_recall_skipped(message_id, group_id):
+        logger.info(
+            f"[防撤回插件] 撤回已由其他账号处理，跳过: message_id={message_id}, group_id={group_id}"
+        )
+
+    async def _lookup_recalled_message(
+        self,
+        event: AstrMessageEvent,
+        message_id: str,
+        group_id: str | None = None,
+        sender_id=None,
+    ):
+        """依次从内存缓存、持久化存储和 OneBot get_msg 接口查找撤回的消息"""
+        recalled_message = self.message_cache.pop(message_id)
+        if recalled_message:
+            self.m_recall_lookups.inc(result="hit")
+
+        if not recalled_message and self.message_store:
+            recalled_message = await self.message_store.get(message_id)
+            if recalled_message:
+                self.m_recall_lookups.inc(result="store_hit")
+                logger.info(f"[防撤回插件] 从持久化存储中找到撤回消息: {message_id}")
+
+        if self.message_store:
+            self.message_store.delete(message_id)
+
+        if not recalled_message and self.recall_fallback:
+            call_action = self._get_call_action(event)
+            if call_action:
+                recalled_message = await self.recall_fallback.fetch(
+                    call_action, message_id, group_id, sender_id
+                )
+                if recalled_message:
+                    self.m_recall_lookups.inc(result="fallback_hit")
+                    logger.info(
+                        f"[防撤回插件] 通过 get_msg 接口获取到撤回消息: {message_id}"
+                    )
+
+        if not recalled_message:
+            self.m_recall_lookups.inc(result="miss")
+        return recalled_message
+
+    @staticmethod
+    def _get_call_action(event: AstrMessageEvent):
+        """获取 aiocqhttp 适配器的 call_action，其他适配器返回 None"""
+        bot = getattr(event, "bot", None)
+        api = getattr(bot, "api", None)
+        return getattr(api, "call_action", None)
+
+    def _enqueue_recall(
+        self,
+        event: AstrMessageEvent,
+        group_id,
+        user_id,
+        operator_id,
+        message_id: str,
+        recalled_message: CachedMessage,
+    ):
+        """将撤回加入 (群组, 用户) 的合并窗口，窗口结束时统一处理"""
+        key = (str(group_id), str(user_id))
+        batch = self._recall_batches.get(key)
+        if batch is not None:
+            batch.append((message_id, recalled_message))
+            return
+        self._recall_batches[key] = [(message_id, recalled_message)]
+        self._spawn(
+            self._flush_recall_batch(key, event, group_id, operator_id), "处理合并撤回"
+        )
+
+    def _spawn(self, coro, description: str) -> asyncio.Task:
+        """创建后台任务，插件卸载时统一取消，任务抛出的异常在结束时记录"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+
+        def done(task: asyncio.Task):
+            self._background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"[防撤回插件] {description}失败: {task.exception()}")
+
+        task.add_done_callback(done)
+        return task
+
+    async def _flush_recall_batch(
+        self, key: tuple, event: AstrMessageEvent, group_id, operator_id
+    ):
+        """合并窗口结束后处理收集到的撤回"""
+        await asyncio.sleep(self.recall_coalesce_window)
+        recalls = self._recall_batches.pop(key, [])
+        if not recalls:
+            return
+        if len(recalls) > 1:
+            self.m_coalesced_recalls.inc(len(recalls) - 1)
             logger.info(
-                f"[防撤回插件] 检测到撤回事件: 消息ID={message_id}, 发送者={recalled_message['sender_name']}, 群组={group_id}"
+                f"[防撤回插件] 合并 {len(recalls)} 条连续撤回: 群组={group_id}, 用户={key[1]}"
             )
+        await self._process_group_recalls(event, group_id, operator_id, recalls)
 
-            # 检查是否是图片消息，如果禁用了图片撤回检测则跳过
-            if (
-                not self.enable_image_recall
-                and recalled_message["message_type"] == "图片"
-            ):
-                logger.info("[防撤回插件] 图片撤回检测已禁用，跳过处理")
+    async def _process_group_recalls(
+        self, event: AstrMessageEvent, group_id, operator_id, recalls: list
+    ):
+        """对一条或一组撤回消息 [(消息 ID, CachedMessage)] 进行违规检测、生成锐评并发送到群聊"""
+        recalls.sort(key=lambda item: item[1].timestamp)
+        records = [record for _, record in recalls]
+        content = self._join_recall_contents(records)
+        context_group_id = records[0].group_id
+        context_timestamp = records[0].timestamp
+        policy = self.group_policies.get(str(group_id))
+        if policy is None:
+            return
+        moderation = policy.moderation
+        started = time.monotonic()
+
+        # LLM 额度不足时按配置降级：不附锐评、排队等待或丢弃
+        with_comment = await self._reserve_llm_budget(
+            group_id, content, policy.ai_comment and bool(content), moderation
+        )
+        if with_comment is None:
+            logger.info(f"[防撤回插件] LLM 调用额度不足，丢弃撤回: 群组={group_id}")
+            return
+
+        # 合并模式：一次调用同时得到违规判定和锐评
+        if self.enable_combined_llm_call and moderation and with_comment:
+            combined = await self._moderate_and_comment(
+                content, event, context_group_id, context_timestamp
+            )
+            if combined is not None:
+                is_blocked, ai_comment = combined
+                if is_blocked:
+                    logger.info("[防撤回插件] 撤回的内容被AI判定为违规，不发送")
+                    return
+                self._archive_recalls(recalls, operator_id)
+                message_chain = await self._build_recall_message(
+                    records,
+                    operator_id,
+                    event,
+                    ai_comment=ai_comment,
+                    with_comment=with_comment,
+                )
+                await self._deliver_group_recall(event, group_id, message_chain)
                 return
+            # 合并调用已用掉预留的额度，回退的两次调用需要重新扣除
+            with_comment = await self._reserve_llm_budget(
+                group_id, content, with_comment, moderation, combined=False
+            )
+            if with_comment is None:
+                logger.info(f"[防撤回插件] LLM 调用额度不足，丢弃撤回: 群组={group_id}")
+                return
+
+        # 违规检测与锐评生成并行，检测判定违规时取消锐评
+        comment_task = None
+        if (
+            self.enable_speculative_comment
+            and moderation
+            and with_comment
+            and self.local_filter.check(content)[0] != DENY
+        ):
+            comment_task = asyncio.create_task(
+                self._generate_ai_comment(
+                    content, event, context_group_id, context_timestamp
+                )
+            )
 
+        try:
             # 检查内容是否违规
-            if self.enable_content_filter and await self._is_content_blocked(
-                recalled_message["content"], event
-            ):
+            if moderation and await self._is_content_blocked(content, event):
                 logger.info("[防撤回插件] 撤回的内容被AI判定为违规，不发送")
                 return
+            self._archive_recalls(recalls, operator_id)
+
+            # 两段式发送：锐评未在期限内生成时先发送撤回内容，锐评稍后单独补发
+            if self.comment_deadline > 0 and with_comment:
+                if comment_task is None:
+                    comment_task = asyncio.create_task(
+                        self._generate_ai_comment(
+                            content, event, context_group_id, context_timestamp
+                        )
+                    )
+                remaining = self.comment_deadline - (time.monotonic() - started)
+                if remaining > 0:
+                    await asyncio.wait({comment_task}, timeout=remaining)
+                if not comment_task.done():
+                    message_chain = await self._build_recall_message(
+                        records, operator_id, event, with_comment=False
+                    )
+                    if await self._deliver_group_recall(event, group_id, message_chain):
+                        self._spawn(
+                            self._deliver_late_comment(
+                                event, group_id, comment_task, started
+                            ),
+                            "补发 AI 锐评",
+                        )
+                        # 锐评任务交给补发任务，不在此处取消
+                        comment_task = None
+                    return
+                self.m_comment_delivery.inc(mode="inline")
 
             # 生成消息内容
             message_chain = await self._build_recall_message(
-                recalled_message, operator_id, event
+                records, operator_id, event, comment_task, with_comment=with_comment
             )
+        finally:
+            if comment_task and not comment_task.done():
+                comment_task.cancel()
+                logger.debug("[防撤回插件] 已取消提前生成的 AI 锐评")
 
-            if message_chain:
-                # 发送到群聊（合并转发消息）
-                session_id = event.unified_msg_origin
-                await self.context.send_message(
-                    session_id, MessageChain(chain=message_chain)
+        await self._deliver_group_recall(event, group_id, message_chain)
+
+    def _archive_recalls(self, recalls: list, operator_id):
+        """通过群组策略和违规检测的撤回才记入撤回档案，被拦截的内容不会经查询命令泄露"""
+        if self.recall_archive is None:
+            return
+        for message_id, record in recalls:
+            self.recall_archive.add(message_id, record, operator_id=operator_id)
+
+    async def _deliver_late_comment(
+        self, event: AstrMessageEvent, group_id, comment_task: asyncio.Task, started
+    ):
+        """等待超过期限的锐评，在硬性截止时间前生成时作为单独的消息补发，否则放弃"""
+        try:
+            timeout = None
+            if self.comment_cutoff > 0:
+                timeout = max(self.comment_cutoff - (time.monotonic() - started), 0)
+            done, _ = await asyncio.wait({comment_task}, timeout=timeout)
+            if not done:
+                self.m_comment_delivery.inc(mode="dropped")
+                logger.info(
+                    f"[防撤回插件] AI 锐评超过截止时间，放弃补发: 群组={group_id}"
                 )
-                logger.info(f"[防撤回插件] 已发送撤回消息到群聊: {group_id}")
+                return
+            ai_comment = comment_task.result()
+            if not ai_comment:
+                return
+            if await self._deliver_group_recall(
+                event, group_id, [self._build_comment_node(ai_comment, event)]
+            ):
+                self.m_comment_delivery.inc(mode="followup")
+        finally:
+            if not comment_task.done():
+                comment_task.cancel()
 
-        except Exception as e:
-            logger.error(f"[防撤回插件] 处理群消息撤回失败: {e}")
+    async def _reserve_llm_budget(
+        self,
+        group_id,
+        content: str,
+        with_comment: bool,
+        moderation: bool,
+        combined: bool = True,
+    ):
+        """按本次撤回预计的 LLM 调用次数扣除额度
+
+        combined 为 False 时即使开启了合并调用也按分两次调用计算（合并调用失败后的回退）。
+        返回是否附带锐评；额度不足且无法降级时返回 None，表示丢弃本次撤回。
+        """
+        if not content or not self.scheduler.enabled("llm"):
+            return with_comment
+
+        # 本地规则或已有判定（缓存、近似重复）能判定的内容不需要审核调用；
+        # 判定违规的内容也不会生成锐评
+        moderation_calls = int(moderation)
+        if moderation_calls:
+            outcome, _ = self.local_filter.check(content)
+            if outcome == DENY:
+                return with_comment
+            if outcome == ALLOW:
+                moderation_calls = 0
+            else:
+                known_verdict = self._peek_verdict(content)
+                if known_verdict:
+                    return with_comment
+                if known_verdict is not None:
+                    moderation_calls = 0
+        # 可复用的锐评不需要生成调用
+        comment_calls = int(with_comment)
+        if (
+            comment_calls
+            and self._comment_reuse_enabled(group_id)
+            and self.comment_cache.peek(self._comment_key(content)) is not None
+        ):
+            comment_calls = 0
+        if (
+            combined
+            and self.enable_combined_llm_call
+            and moderation_calls
+            and comment_calls
+        ):
+            calls = 1
+        else:
+            calls = moderation_calls + comment_calls
+        if calls == 0 or self.scheduler.try_acquire("llm", group_id, calls):
+            return with_comment
+
+        if self.rate_limit_mode == "queue":
+            if await self.scheduler.acquire(
+                "llm", group_id, calls, self.rate_limit_max_wait
+            ):
+                self.m_rate_limited.inc(kind="llm", action="queued")
+                return with_comment
+        # 违规检测不能跳过，只省掉锐评的调用
+        elif (
+            self.rate_limit_mode == "no_comment"
+            and comment_calls
+            and (
+                not moderation_calls
+                or self.scheduler.try_acquire("llm", group_id, moderation_calls)
+            )
+        ):
+            self.m_rate_limited.inc(kind="llm", action="no_comment")
+            return False
+
+        self.m_rate_limited.inc(kind="llm", action="drop")
+        return None
+
+    def _peek_verdict(self, content: str):
+        """不计入统计地查看已有判定（判定缓存、近似重复），没有时返回 None"""
+        verdict = self.verdict_cache.peek(self._verdict_key(content))
+        if verdict is None and self.near_duplicates is not None:
+            fingerprint = simhash(content, self.near_duplicate_min_chars)
+            if fingerprint is not None:
+                match = self.near_duplicates.lookup(fingerprint)
+                if match is not None:
+                    verdict = match[0]
+        return verdict
+
+    async def _deliver_group_recall(
+        self, event: AstrMessageEvent, group_id, message_chain: list
+    ):
+        """在发送额度内将撤回消息发送到群聊（合并转发消息），返回是否已发送"""
+        if not message_chain:
+            return False
+        if self.scheduler.enabled("send") and not self.scheduler.try_acquire(
+            "send", group_id
+        ):
+            if self.rate_limit_mode != "queue" or not await self.scheduler.acquire(
+                "send", group_id, 1, self.rate_limit_max_wait
+            ):
+                self.m_rate_limited.inc(kind="send", action="drop")
+                logger.info(f"[防撤回插件] 发送额度不足，丢弃撤回: 群组={group_id}")
+                return False
+            self.m_rate_limited.inc(kind="send", action="queued")
+
+        await self._send_recall(event.unified_msg_origin, message_chain)
+        logger.info(f"[防撤回插件] 已发送撤回消息到群聊: {group_id}")
+        return True
+
+    @staticmethod
+    def _join_recall_contents(records: list) -> str:
+        """合并多条撤回消息的内容，用于一次性审核和锐评"""
+        if len(records) == 1:
+            return records[0].content
+        contents = [record.content for record in records if record.content]
+        return "\n".join(f"{i}. {content}" for i, content in enumerate(contents, 1))
 
     async def _handle_friend_recall(self, event: AstrMessageEvent, raw_message: dict):
         """处理好友消息撤回"""
@@ -267,123 +1171,94 @@ class AntiRecallPlugin(Star):
                 f"[防撤回插件] 处理好友消息撤回: message_id={message_id} (type={type(message_id).__name__}), user_id={user_id}"
             )
 
-            # 获取缓存的撤回消息
-            recalled_message = self.message_cache.get(message_id)
+            # 检查是否是机器人自己撤回的消息（机器人的消息不会被缓存，无需查找）
+            if str(user_id) == str(event.get_self_id()):
+                logger.debug("[防撤回插件] 机器人自己撤回的消息，不处理")
+                return
+
+            recalled_message = await self._lookup_recalled_message(
+                event, message_id, sender_id=user_id
+            )
 
             if not recalled_message:
-                self.cache_misses += 1
                 logger.warning(
                     f"[防撤回插件] 未找到撤回消息的缓存: {message_id} (缓存总数: {len(self.message_cache)}, 命中率: {self._get_cache_hit_rate()})"
                 )
-                logger.debug(
-                    f"[防撤回插件] 当前缓存的消息ID: {list(self.message_cache.keys())}"
-                )
                 return
 
-            self.cache_hits += 1
             logger.info(
                 f"[防撤回插件] 找到撤回消息缓存: {message_id} (缓存总数: {len(self.message_cache)}, 命中率: {self._get_cache_hit_rate()})"
             )
 
-            # 清理缓存
-            del self.message_cache[message_id]
-
-            # 检查是否是机器人自己撤回的消息
-            if user_id == event.get_self_id():
-                logger.debug("[防撤回插件] 机器人自己撤回的消息，不处理")
-                return
-
             logger.info(
-                f"[防撤回插件] 检测到好友消息撤回: 消息ID={message_id}, 发送者={recalled_message['sender_name']}"
+                f"[防撤回插件] 检测到好友消息撤回: 消息ID={message_id}, 发送者={recalled_message.sender_name}"
             )
 
             # 检查内容是否违规
             if self.enable_content_filter and await self._is_content_blocked(
-                recalled_message["content"], event
+                recalled_message.content, event
             ):
                 logger.info("[防撤回插件] 撤回的内容被AI判定为违规，不发送")
                 return
 
             # 生成消息内容
             message_chain = await self._build_recall_message(
-                recalled_message, user_id, event
+                [recalled_message], user_id, event
             )
 
             if message_chain:
                 # 发送到私聊
                 # 构建私聊的 session_id
                 session_id = f"aiocqhttp:{MessageType.FRIEND_MESSAGE.value}:{user_id}"
-                await self.context.send_message(
-                    session_id, MessageChain(chain=message_chain)
-                )
+                await self._send_recall(session_id, message_chain)
                 logger.info(f"[防撤回插件] 已发送撤回消息到私聊: {user_id}")
 
         except Exception as e:
             logger.error(f"[防撤回插件] 处理好友消息撤回失败: {e}")
 
+    async def _send_recall(self, session_id: str, message_chain: list):
+        """发送撤回消息并记录发送耗时"""
+        start = time.perf_counter()
+        await self.context.send_message(session_id, MessageChain(chain=message_chain))
+        self.m_send_latency.observe(time.perf_counter() - start)
+        self.m_recalls_sent.inc()
+
     async def _build_recall_message(
-        self, recalled_message: dict, operator_id: str, event: AstrMessageEvent
+        self,
+        recalled_messages: list,
+        operator_id: str,
+        event: AstrMessageEvent,
+        comment_task: asyncio.Task | None = None,
+        ai_comment: str | None = None,
+        with_comment: bool | None = None,
     ):
-        """构建撤回消息（合并转发格式）"""
+        """构建撤回消息（合并转发格式），每条撤回消息一个节点，最后附上一条 AI 锐评
+
+        comment_task 为已提前开始生成的锐评，ai_comment 为已生成好的锐评，都未提供时现场生成。
+        with_comment 为 False 时不附锐评，未指定时按 enable_ai_analysis 配置（仅用于私聊，
+        群聊按群组策略的 ai_comment 传入）。
+        """
+        if with_comment is None:
+            with_comment = self.enable_ai_analysis
         try:
-            nodes = []
-
-            # 获取发送者信息
-            sender_id = recalled_message["sender_id"]
-            sender_name = recalled_message["sender_name"]
-            message_type = recalled_message["message_type"]
-            content = recalled_message["content"]
-            group_id = recalled_message["group_id"]
-
-            # 第一个节点：撤回内容
-            recall_chain = []
-            recall_chain.append(Comp.Plain("🚫 检测到撤回消息！\n"))
-
-            if self.show_sender_info:
-                recall_chain.append(Comp.Plain(f"👤 发送者: {sender_name}\n"))
-
-            recall_chain.append(Comp.Plain(f"📝 消息类型: {message_type}\n"))
-            recall_chain.append(Comp.Plain("\n📄 撤回内容:\n"))
-            recall_chain.append(Comp.Plain("─" * 30 + "\n"))
-
-            if content:
-                # 如果是图片，添加图片
-                if message_type == "图片":
-                    if content.startswith("http"):
-                        recall_chain.append(Comp.Image.fromURL(content))
-                    else:
-                        recall_chain.append(Comp.Image.fromFileSystem(content))
-                else:
-                    recall_chain.append(Comp.Plain(content))
-            else:
-                recall_chain.append(Comp.Plain("[无法获取内容]"))
-
-            recall_chain.append(Comp.Plain("\n" + "─" * 30))
-
-            # 创建撤回内容节点
-            recall_node = Comp.Node(
-                uin=int(sender_id), name=sender_name, content=recall_chain
-            )
-            nodes.append(recall_node)
-
-            # 第二个节点：AI 锐评
-            if self.enable_ai_analysis and content:
-                ai_comment = await self._generate_ai_comment(
-                    content, event, group_id, recalled_message["timestamp"]
-                )
-                if ai_comment:
-                    comment_chain = []
-                    comment_chain.append(Comp.Plain("💬 AI 锐评:\n"))
-                    comment_chain.append(Comp.Plain("─" * 30 + "\n"))
-                    comment_chain.append(Comp.Plain(ai_comment))
-                    comment_chain.append(Comp.Plain("\n" + "─" * 30))
-
-                    # 创建 AI 锐评节点（使用机器人的 QQ 号）
-                    bot_id = event.get_self_id()
-                    comment_node = Comp.Node(
-                        uin=int(bot_id), name="AI 锐评助手", content=comment_chain
+            nodes = [
+                self._build_recall_node(recalled_message, i, len(recalled_messages))
+                for i, recalled_message in enumerate(recalled_messages, 1)
+            ]
+
+            content = self._join_recall_contents(recalled_messages)
+            first_message = recalled_messages[0]
+
+            # 最后一个节点：AI 锐评
+            if with_comment and content:
+                if ai_comment is None and comment_task is not None:
+                    ai_comment = await comment_task
+                elif ai_comment is None:
+                    ai_comment = await self._generate_ai_comment(
+                        content, event, first_message.group_id, first_message.timestamp
                     )
-                    nodes.append(comment_node)
+                if ai_comment:
+                    nodes.append(self._build_comment_node(ai_comment, event))
 
             return nodes
 
@@ -391,77 +1266,125 @@ class AntiRecallPlugin(Star):
             logger.error(f"[防撤回插件] 构建撤回消息失败: {e}")
             return None
 
-    def _extract_context_messages(self, group_id: str, recalled_timestamp: int) -> list:
-        """提取撤回消息前的上下文消息（用于理解撤回的上下文）"""
-        try:
-            context_messages = []
-            logger.info(
-                f"[防撤回插件] 开始提取上下文消息: group_id={group_id}, recalled_timestamp={recalled_timestamp}, 缓存总数={len(self.message_cache)}"
-            )
+    def _build_comment_node(self, ai_comment: str, event: AstrMessageEvent):
+        """构建 AI 锐评的转发节点（使用机器人的 QQ 号）"""
+        comment_chain = [
+            Comp.Plain("💬 AI 锐评:\n"),
+            Comp.Plain("─" * 30 + "\n"),
+            Comp.Plain(ai_comment),
+            Comp.Plain("\n" + "─" * 30),
+        ]
+        return Comp.Node(
+            uin=int(event.get_self_id()), name="AI 锐评助手", content=comment_chain
+        )
 
-            # 打印缓存中该群组的所有消息（用于调试）
-            group_messages = []
-            for message_id, msg_data in self.message_cache.items():
-                if msg_data["group_id"] == group_id:
-                    group_messages.append(msg_data)
+    def _build_recall_node(
+        self, recalled_message: CachedMessage, index: int, total: int
+    ):
+        """构建单条撤回消息的转发节点"""
+        # 获取发送者信息
+        sender_id = recalled_message.sender_id
+        sender_name = recalled_message.sender_name
+        message_type = recalled_message.message_type
+        content = recalled_message.content
+
+        recall_chain = []
+        if total > 1:
+            recall_chain.append(Comp.Plain(f"🚫 检测到连续撤回 ({index}/{total})！\n"))
+        else:
+            recall_chain.append(Comp.Plain("🚫 检测到撤回消息！\n"))
 
-            logger.info(f"[防撤回插件] 缓存中该群组共有 {len(group_messages)} 条消息")
-            for i, msg in enumerate(group_messages, 1):
-                logger.info(
-                    f"[防撤回插件] 缓存消息 {i}: 类型={msg['message_type']}, 时间戳={msg['timestamp']}, 内容={msg['content'][:30]}"
+        if self.show_sender_info:
+            recall_chain.append(Comp.Plain(f"👤 发送者: {sender_name}\n"))
+
+        recall_chain.append(Comp.Plain(f"📝 消息类型: {message_type}\n"))
+        recall_chain.append(Comp.Plain("\n📄 撤回内容:\n"))
+        recall_chain.append(Comp.Plain("─" * 30 + "\n"))
+
+        if recalled_message.components:
+            # 包含图片、提及等组件的消息按原样重建
+            recall_chain.extend(self._rebuild_components(recalled_message.components))
+        elif content:
+            recall_chain.append(Comp.Plain(content))
+        else:
+            recall_chain.append(Comp.Plain("[无法获取内容]"))
+
+        recall_chain.append(Comp.Plain("\n" + "─" * 30))
+
+        # 创建撤回内容节点
+        return Comp.Node(uin=int(sender_id), name=sender_name, content=recall_chain)
+
+    def _prefetch_images(self, components: tuple):
+        """把消息中的网络图片加入后台下载队列，不等待下载完成"""
+        for kind, value, *_ in components:
+            if kind == "image" and value.startswith(("http://", "https://")):
+                self.image_store.prefetch(value)
+
+    def _rebuild_components(self, components: tuple) -> list:
+        """把结构化组件还原为消息组件"""
+        chain = []
+        for kind, value, *extra in components:
+            if kind == "image":
+                local_path = (
+                    self.image_store.path_for(value)
+                    if self.image_store is not None
+                    else None
                 )
-
-            # 遍历缓存中的所有消息
-            for message_id, msg_data in self.message_cache.items():
-                # 只处理同一群组的消息
-                if msg_data["group_id"] != group_id:
-                    logger.debug(
-                        f"[防撤回插件] 跳过不同群组的消息: {msg_data['group_id']} != {group_id}"
-                    )
-                    continue
-
-                # 只处理文字消息或包含文字的消息（不包括纯图片、纯语音等）
-                # _get_message_type 方法返回的是中文类型：'文本'、'提及'、'引用'
-                if msg_data["message_type"] not in ["文本", "提及", "引用"]:
-                    logger.debug(
-                        f"[防撤回插件] 跳过非文本消息: {msg_data['message_type']}"
+                if local_path:
+                    chain.append(Comp.Image.fromFileSystem(local_path))
+                elif value.startswith(("http://", "https://")):
+                    chain.append(Comp.Image.fromURL(value))
+                elif value.startswith("base64://"):
+                    chain.append(Comp.Image.fromBase64(value[len("base64://") :]))
+                elif value:
+                    chain.append(
+                        Comp.Image.fromFileSystem(value.removeprefix("file://"))
                     )
-                    continue
-
-                # 只处理撤回消息之前的消息（用于理解撤回的上下文）
-                if msg_data["timestamp"] >= recalled_timestamp:
-                    logger.debug(
-                        f"[防撤回插件] 跳过撤回消息之后或同时的消息: {msg_data['timestamp']} >= {recalled_timestamp}"
-                    )
-                    continue
-
-                # 添加到上下文列表
-                context_messages.append(
-                    {
-                        "sender_name": msg_data["sender_name"],
-                        "content": msg_data["content"],
-                        "timestamp": msg_data["timestamp"],
-                    }
-                )
-                logger.debug(
-                    f"[防撤回插件] 添加上下文消息: {msg_data['sender_name']} - {msg_data['content'][:30]}"
+                else:
+                    chain.append(Comp.Plain("[图片]"))
+            elif kind == "at":
+                chain.append(Comp.At(qq=value, name=extra[0] if extra else ""))
+            elif kind == "face":
+                chain.append(
+                    Comp.Face(id=int(value))
+                    if value.isdigit()
+                    else Comp.Plain("[表情]")
                 )
+            elif kind == "reply":
+                chain.append(Comp.Plain("[引用]"))
+            elif kind == "text":
+                chain.append(Comp.Plain(value))
+            else:
+                chain.append(Comp.Plain(f"[{kind}]"))
+        return chain
 
-            # 按时间戳排序（从旧到新）
-            context_messages.sort(key=lambda x: x["timestamp"])
+    def _extract_context_messages(self, group_id: str, recalled_timestamp: int) -> list:
+        """提取撤回消息前的上下文消息（用于理解撤回的上下文）"""
+        try:
+            # 群组时间索引中只包含文本、提及、引用类型的消息，二分定位即可取到最后 N 条
+            context_messages = [
+                {
+                    "sender_name": msg_data.sender_name,
+                    "content": msg_data.content,
+                    "timestamp": msg_data.timestamp,
+                }
+                for _, msg_data in self.message_cache.recent_in_group(
+                    group_id, recalled_timestamp, self.context_count
+                )
+            ]
 
-            # 只取最后 N 条消息（撤回消息之前的 N 条消息）
-            context_messages = (
-                context_messages[-self.context_count :] if context_messages else []
+            logger.info(
+                f"[防撤回插件] 提取到 {len(context_messages)} 条上下文消息: group_id={group_id}, recalled_timestamp={recalled_timestamp}"
             )
 
-            logger.info(f"[防撤回插件] 提取到 {len(context_messages)} 条上下文消息")
-
             # 打印上下文内容用于调试
             if context_messages:
                 for i, ctx in enumerate(context_messages, 1):
-                    logger.info(
-                        f"[防撤回插件] 上下文 {i}: {ctx['sender_name']} - {ctx['content']}"
+                    logger.debug(
+                        "[防撤回插件] 上下文 %d: %s - %s",
+                        i,
+                        ctx["sender_name"],
+                        ctx["content"],
                     )
             else:
                 logger.warning("[防撤回插件] 未提取到上下文消息，可能原因：")
@@ -476,79 +1399,97 @@ class AntiRecallPlugin(Star):
             logger.error(f"[防撤回插件] 提取上下文消息失败: {e}")
             return []
 
+    async def _llm_generate(self, event: AstrMessageEvent, prompt: str, purpose: str):
+        """通过 LLM 调用层请求模型，并按用途记录调用次数与耗时"""
+        start = time.perf_counter()
+        try:
+            provider_id, llm_resp = await self.llm.generate(
+                event.unified_msg_origin, prompt
+            )
+        except asyncio.CancelledError:
+            self.m_llm_requests.inc(purpose=purpose, status="cancelled")
+            raise
+        except LLMUnavailableError:
+            self.m_llm_requests.inc(purpose=purpose, status="unavailable")
+            raise
+        except TimeoutError:
+            self.m_llm_requests.inc(purpose=purpose, status="timeout")
+            raise
+        except Exception:
+            self.m_llm_requests.inc(purpose=purpose, status="error")
+            raise
+        self.m_llm_latency.observe(time.perf_counter() - start, purpose=purpose)
+        status = "ok" if llm_resp and llm_resp.completion_text else "empty"
+        self.m_llm_requests.inc(purpose=purpose, status=status)
+        logger.debug("[防撤回插件] %s 使用 LLM 提供商: %s", purpose, provider_id)
+        return llm_resp
+
+    def _build_comment_prompt(
+        self,
+        content: str,
+        group_id: str | None = None,
+        recalled_timestamp: int | None = None,
+        purpose: str = "comment",
+    ) -> str:
+        """构建锐评提示词（固定的风格提示 + 上下文 + 撤回内容），并记录提示词大小"""
+        context = ()
+        if self.enable_context_analysis and group_id and recalled_timestamp:
+            context = [
+                (ctx["sender_name"], ctx["content"])
+                for ctx in self._extract_context_messages(group_id, recalled_timestamp)
+            ]
+            if not context:
+                logger.warning("[防撤回插件] 未提取到上下文消息")
+        else:
+            logger.debug(
+                "[防撤回插件] 上下文分析未启用或参数缺失: enable=%s, group_id=%s, timestamp=%s",
+                self.enable_context_analysis,
+                group_id,
+                recalled_timestamp,
+            )
+
+        prompt, stats = self.prompt_builder.build(content, context)
+        self.m_prompt_tokens.observe(stats.tokens, purpose=purpose)
+        if stats.truncated:
+            self.m_prompt_trimmed.inc(kind="truncated")
+        if stats.context_dropped:
+            self.m_prompt_trimmed.inc(stats.context_dropped, kind="context_dropped")
+        if stats.context_used:
+            logger.info(
+                f"[防撤回插件] 已添加 {stats.context_used} 条上下文消息到提示词 (约 {stats.tokens} tokens, 超出预算丢弃 {stats.context_dropped} 条)"
+            )
+        return prompt
+
     async def _generate_ai_comment(
         self,
         content: str,
         event: AstrMessageEvent,
-        group_id: str = None,
-        recalled_timestamp: int = None,
+        group_id: str | None = None,
+        recalled_timestamp: int | None = None,
     ):
         """生成 AI 锐评"""
         try:
-            # 获取聊天模型 ID
-            if self.fixed_llm_provider:
-                provider_id = self.fixed_llm_provider
-                logger.info(f"[防撤回插件] 使用固定的 LLM 提供商: {provider_id}")
-            else:
-                umo = event.unified_msg_origin
-                provider_id = await self.context.get_current_chat_provider_id(umo=umo)
-                logger.info(f"[防撤回插件] 使用当前会话的 LLM 提供商: {provider_id}")
+            cached_comment = self._get_cached_comment(content, group_id)
+            if cached_comment:
+                logger.info("[防撤回插件] 复用已缓存的 AI 锐评")
+                return cached_comment
 
-            if not provider_id:
-                logger.warning("[防撤回插件] 未获取到聊天模型 ID")
-                return None
-
-            # 提取上下文消息
-            context_text = ""
-            logger.info(
-                f"[防撤回插件] 上下文分析参数: enable={self.enable_context_analysis}, group_id={group_id}, timestamp={recalled_timestamp}"
-            )
-
-            if self.enable_context_analysis and group_id and recalled_timestamp:
-                context_messages = self._extract_context_messages(
-                    group_id, recalled_timestamp
-                )
-                if context_messages:
-                    context_text = "\n\n【撤回前的聊天上下文】\n"
-                    context_text += "─" * 30 + "\n"
-                    context_text += "以下是在撤回消息之前的聊天记录，可以帮助理解撤回的上下文和原因：\n"
-                    for i, ctx in enumerate(context_messages, 1):
-                        context_text += f"{i}. {ctx['sender_name']}: {ctx['content']}\n"
-                    context_text += "─" * 30 + "\n"
-                    logger.info(
-                        f"[防撤回插件] 已添加 {len(context_messages)} 条上下文消息到提示词"
-                    )
-                else:
-                    logger.warning("[防撤回插件] 未提取到上下文消息")
-            else:
-                logger.info("[防撤回插件] 上下文分析未启用或参数缺失")
-
-            # 构建提示词
-            style_prompts = {
-                "幽默风趣": "你是一个幽默风趣的评论家，请对以下撤回的内容进行锐评，语气要轻松幽默，不要太严肃。如果有撤回前的聊天上下文，请结合上下文分析撤回的原因。",
-                "严肃认真": "你是一个严肃认真的评论家，请对以下撤回的内容进行客观分析。如果有撤回前的聊天上下文，请结合上下文分析撤回的原因。",
-                "毒舌吐槽": "你是一个毒舌的评论家，请对以下撤回的内容进行犀利吐槽。如果有撤回前的聊天上下文，请结合上下文吐槽。",
-                "温和友善": "你是一个温和友善的评论家，请对以下撤回的内容进行温和点评。如果有撤回前的聊天上下文，请结合上下文点评。",
-            }
-
-            style_prompt = style_prompts.get(
-                self.comment_style, style_prompts["幽默风趣"]
-            )
-            prompt = f"{style_prompt}\n{context_text}\n\n【撤回内容】\n{content}"
+            prompt = self._build_comment_prompt(content, group_id, recalled_timestamp)
 
             logger.info(f"[防撤回插件] 开始生成 AI 锐评，内容: {content[:50]}...")
-            logger.debug(f"[防撤回插件] 完整提示词: {prompt[:200]}...")
+            logger.debug("[防撤回插件] 完整提示词: %s...", prompt[:200])
 
             # 调用 LLM 生成锐评
-            llm_resp = await self.context.llm_generate(
-                chat_provider_id=provider_id,
-                prompt=prompt,
-            )
+            llm_resp = await self._llm_generate(event, prompt, "comment")
 
             if llm_resp and llm_resp.completion_text:
                 logger.info(
                     f"[防撤回插件] AI 锐评生成成功: {llm_resp.completion_text[:50]}..."
                 )
+                if self.enable_comment_reuse:
+                    self.comment_cache.set(
+                        self._comment_key(content), llm_resp.completion_text
+                    )
                 return llm_resp.completion_text
             else:
                 logger.warning("[防撤回插件] AI 锐评生成失败: 无返回内容")
@@ -558,130 +1499,195 @@ class AntiRecallPlugin(Star):
             logger.error(f"[防撤回插件] 生成 AI 锐评失败: {e}")
             return None
 
-    def _extract_message_content(self, event: AstrMessageEvent) -> str:
-        """提取消息内容"""
-        try:
-            message_chain = event.message_obj.message
-            content_parts = []
-
-            for component in message_chain:
-                # 处理文本消息
-                if hasattr(component, "text"):
-                    content_parts.append(component.text)
-                # 处理图片消息
-                elif hasattr(component, "url"):
-                    content_parts.append(f"[图片: {component.url}]")
-                elif hasattr(component, "file"):
-                    content_parts.append(f"[图片: {component.file}]")
-                # 处理其他类型
-                elif hasattr(component, "type"):
-                    content_parts.append(f"[{component.type}]")
-
-            return "".join(content_parts)
-
-        except Exception as e:
-            logger.error(f"[防撤回插件] 提取消息内容失败: {e}")
-            return ""
+    async def _moderate_and_comment(
+        self,
+        content: str,
+        event: AstrMessageEvent,
+        group_id: str | None = None,
+        recalled_timestamp: int | None = None,
+    ):
+        """一次 LLM 调用同时完成违规检测和锐评
+
+        返回 (是否违规, 锐评)；无法解析回复或调用失败时返回 None，由调用方回退到分两次调用。
+        """
+        local_verdict = self._local_verdict(content)
+        if local_verdict is not None:
+            if local_verdict:
+                return True, None
+            return False, self._get_cached_comment(content, group_id)
+
+        # 判定已缓存时不再请求 LLM，锐评缺失时由调用方单独生成
+        verdict_key = self._verdict_key(content)
+        cached_verdict = self.verdict_cache.get(verdict_key)
+        if cached_verdict is None:
+            fingerprint, cached_verdict, audited = self._near_duplicate_verdict(content)
+            if cached_verdict is not None:
+                self.verdict_cache.set(verdict_key, cached_verdict)
+        else:
+            fingerprint = audited = None
+        if cached_verdict is not None:
+            self.m_moderation.inc(verdict="blocked" if cached_verdict else "passed")
+            if cached_verdict:
+                return True, None
+            return False, self._get_cached_comment(content, group_id)
 
-    def _get_message_type(self, event: AstrMessageEvent) -> str:
-        """获取消息类型"""
         try:
-            message_chain = event.message_obj.message
-
-            if not message_chain:
-                return "未知"
-
-            # 检查是否包含特定类型的组件
-            for component in message_chain:
-                if hasattr(component, "type"):
-                    # 将类型转换为字符串，确保匹配
-                    component_type = str(component.type)
-                    type_map = {
-                        "plain": "文本",
-                        "image": "图片",
-                        "record": "语音",
-                        "video": "视频",
-                        "file": "文件",
-                        "at": "提及",
-                        "face": "表情",
-                        "poke": "戳一戳",
-                        "reply": "引用",
-                    }
-                    # 如果组件类型在映射中，返回对应类型
-                    if component_type in type_map:
-                        return type_map[component_type]
-
-            # 如果没有找到已知类型，返回第一个组件的类型（转换为字符串）
-            first_component = message_chain[0]
-            if hasattr(first_component, "type"):
-                component_type = str(first_component.type)
-                # 再次尝试映射
-                type_map = {
-                    "plain": "文本",
-                    "image": "图片",
-                    "record": "语音",
-                    "video": "视频",
-                    "file": "文件",
-                    "at": "提及",
-                    "face": "表情",
-                    "poke": "戳一戳",
-                    "reply": "引用",
-                }
-                if component_type in type_map:
-                    return type_map[component_type]
-                return component_type
+            comment_prompt = self._build_comment_prompt(
+                content, group_id, recalled_timestamp, "combined"
+            )
+            prompt = COMBINED_PROMPT_TEMPLATE.format(
+                filter_prompt=self.ai_filter_prompt, comment_prompt=comment_prompt
+            )
+            llm_resp = await self._llm_generate(event, prompt, "combined")
+        # 提供商可能抛出任意异常，失败时由调用方回退到分两次调用
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"[防撤回插件] 合并审核与锐评调用失败: {e}")
+            self.m_combined_replies.inc(result="error")
+            return None
 
-            return "未知"
+        parsed = parse_combined_reply(llm_resp.completion_text if llm_resp else "")
+        if parsed is None:
+            logger.warning("[防撤回插件] 无法解析合并调用的回复，回退到分两次调用")
+            self.m_combined_replies.inc(result="parse_error")
+            return None
 
-        except Exception as e:
-            logger.error(f"[防撤回插件] 获取消息类型失败: {e}")
-            return "未知"
+        self.m_combined_replies.inc(result="ok")
+        is_blocked, comment = parsed
+        self.m_moderation.inc(verdict="blocked" if is_blocked else "passed")
+        self.verdict_cache.set(verdict_key, is_blocked)
+        self._remember_fingerprint(fingerprint, is_blocked, audited)
+        if comment and not is_blocked and self.enable_comment_reuse:
+            self.comment_cache.set(self._comment_key(content), comment)
+        return is_blocked, comment
+
+    def _verdict_key(self, content: str) -> str:
+        """违规判定缓存键：归一化内容 + 审核提示词 + 模板版本"""
+        return content_key(content, "verdict", PROMPT_VERSION, self.ai_filter_prompt)
+
+    def _comment_key(self, content: str) -> str:
+        """锐评缓存键：归一化内容 + 锐评风格 + 模板版本"""
+        return content_key(content, "comment", PROMPT_VERSION, self.comment_style)
+
+    def _comment_reuse_enabled(self, group_id) -> bool:
+        """该群组是否允许复用相同内容的锐评（复用时不考虑上下文）"""
+        if not self.enable_comment_reuse:
+            return False
+        return (
+            not self.comment_reuse_groups or str(group_id) in self.comment_reuse_groups
+        )
 
-    async def _is_content_blocked(self, content: str, event: AstrMessageEvent) -> bool:
-        """使用 AI 检查内容是否违规"""
-        try:
-            if not content:
-                return False
+    def _get_cached_comment(self, content: str, group_id) -> str:
+        """获取可复用的锐评，不允许复用或未缓存时返回 None"""
+        if not self._comment_reuse_enabled(group_id):
+            return None
+        return self.comment_cache.get(self._comment_key(content))
 
-            # 检查是否包含网址（防止危险参数导致封号）
-            url_pattern = r"https?://[^\s]+|www\.[^\s]+"
-            import re
+    def _classify_message(self, event: AstrMessageEvent) -> tuple:
+        """单次遍历消息链，返回 (消息类型, 文本内容, 结构化组件)"""
+        try:
+            return classify(event.message_obj.message)
+        except Exception as e:
+            logger.error(f"[防撤回插件] 解析消息内容失败: {e}")
+            return "未知", "", None
+
+    def _near_duplicate_verdict(self, content: str) -> tuple:
+        """在近似重复索引中查找判定，返回 (指纹, 继承的判定, 抽查时待比对的判定)
+
+        未启用、内容过短或没有近似重复时继承的判定为 None；被抽查时同样返回 None，
+        由调用方请求 LLM 后通过 _remember_fingerprint 比对。
+        """
+        if self.near_duplicates is None:
+            return None, None, None
+        fingerprint = simhash(content, self.near_duplicate_min_chars)
+        if fingerprint is None:
+            self.m_near_duplicates.inc(result="too_short")
+            return None, None, None
+        match = self.near_duplicates.lookup(fingerprint)
+        if match is None:
+            self.m_near_duplicates.inc(result="miss")
+            return fingerprint, None, None
+        verdict, distance = match
+        if random.random() < self.near_duplicate_audit_rate:
+            self.m_near_duplicates.inc(result="audited")
+            return fingerprint, None, verdict
+        self.m_near_duplicates.inc(result="inherited")
+        logger.info(
+            f"[防撤回插件] 撤回内容与已判定内容近似（海明距离 {distance}），继承判定: {'违规' if verdict else '通过'}"
+        )
+        return fingerprint, verdict, None
 
-            if re.search(url_pattern, content):
-                logger.info(
-                    f"[防撤回插件] 检测到撤回内容包含网址，已拦截: {content[:50]}..."
+    def _remember_fingerprint(self, fingerprint, is_blocked: bool, audited):
+        """记录 LLM 判定的指纹；被抽查时比对继承的判定是否与 LLM 一致"""
+        if fingerprint is None or self.near_duplicates is None:
+            return
+        if audited is not None:
+            agreed = audited == is_blocked
+            self.m_near_duplicate_audits.inc(result="agree" if agreed else "mismatch")
+            if not agreed:
+                logger.warning(
+                    f"[防撤回插件] 近似重复抽查不一致: 继承判定 {'违规' if audited else '通过'}, LLM 判定 {'违规' if is_blocked else '通过'}"
                 )
-                return True
+        self.near_duplicates.add(fingerprint, is_blocked)
 
-            # 获取聊天模型 ID
-            if self.fixed_llm_provider:
-                provider_id = self.fixed_llm_provider
+    def _local_verdict(self, content: str):
+        """本地规则判定：违规返回 True，放行返回 False，无法判定返回 None"""
+        outcome, reason = self.local_filter.check(content)
+        if outcome == DENY:
+            if reason == "url":
                 logger.info(
-                    f"[防撤回插件] 使用固定的 LLM 提供商进行违规检测: {provider_id}"
+                    f"[防撤回插件] 检测到撤回内容包含网址，已拦截: {content[:50]}..."
                 )
+                self.m_moderation.inc(verdict="url")
             else:
-                umo = event.unified_msg_origin
-                provider_id = await self.context.get_current_chat_provider_id(umo=umo)
                 logger.info(
-                    f"[防撤回插件] 使用当前会话的 LLM 提供商进行违规检测: {provider_id}"
+                    f"[防撤回插件] 撤回内容命中本地拦截规则 ({reason})，已拦截: {content[:50]}..."
                 )
+                self.m_moderation.inc(verdict="local_deny")
+            return True
+        if outcome == ALLOW:
+            logger.debug("[防撤回插件] 撤回内容命中本地放行规则: %s", content[:50])
+            self.m_moderation.inc(verdict="local_allow")
+            return False
+        return None
 
-            if not provider_id:
-                logger.warning("[防撤回插件] 未获取到聊天模型 ID，跳过违规检测")
+    async def _is_content_blocked(self, content: str, event: AstrMessageEvent) -> bool:
+        """使用 AI 检查内容是否违规"""
+        try:
+            if not content:
                 return False
 
+            # 本地规则能判定的内容不再请求 LLM（网址直接拦截，防止危险参数导致封号）
+            local_verdict = self._local_verdict(content)
+            if local_verdict is not None:
+                return local_verdict
+
+            # 相同内容已有判定时直接复用
+            verdict_key = self._verdict_key(content)
+            cached_verdict = self.verdict_cache.get(verdict_key)
+            if cached_verdict is not None:
+                logger.debug("[防撤回插件] 复用已缓存的违规判定: %s", cached_verdict)
+                self.m_moderation.inc(verdict="blocked" if cached_verdict else "passed")
+                return cached_verdict
+
+            # 近似重复的内容继承已有判定
+            fingerprint, inherited, audited = self._near_duplicate_verdict(content)
+            if inherited is not None:
+                self.m_moderation.inc(verdict="blocked" if inherited else "passed")
+                self.verdict_cache.set(verdict_key, inherited)
+                return inherited
+
             # 构建提示词
             prompt = f"{self.ai_filter_prompt}\n\n{content}"
 
             # 调用 LLM 进行违规检测
-            llm_resp = await self.context.llm_generate(
-                chat_provider_id=provider_id,
-                prompt=prompt,
-            )
+            llm_resp = await self._llm_generate(event, prompt, "moderation")
 
             # 检查返回结果
             result = llm_resp.completion_text.strip()
             is_blocked = "是" in result
+            self.m_moderation.inc(verdict="blocked" if is_blocked else "passed")
+            self.verdict_cache.set(verdict_key, is_blocked)
+            self._remember_fingerprint(fingerprint, is_blocked, audited)
 
             if is_blocked:
                 logger.info(
@@ -696,11 +1702,26 @@ class AntiRecallPlugin(Star):
 
         except Exception as e:
             logger.error(f"[防撤回插件] AI 违规检测失败: {e}")
+            self.m_moderation.inc(verdict="error")
             # 如果 AI 检测失败，默认不拦截
             return False
 
     async def terminate(self):
         """插件卸载时清理资源"""
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        for task in list(self._background_tasks):
+            task.cancel()
+        self._recall_batches.clear()
+        if self.message_store:
+            await self.message_store.close()
+        if self.image_store is not None:
+            await self.image_store.close()
+        if self.recall_archive is not None:
+            await self.recall_archive.close()
+        if self.recall_coordinator is not None:
+            await self.recall_coordinator.close()
         self.message_cache.clear()
         logger.info(
             f"[防撤回插件] 插件已卸载，缓存已清理 (缓存命中率: {self._get_cache_hit_rate()})"
@@ -708,10 +1729,122 @@ class AntiRecallPlugin(Star):
 
     def _get_cache_hit_rate(self) -> str:
         """计算缓存命中率"""
-        total = self.cache_hits + self.cache_misses
+        hits = self.m_recall_lookups.get(result="hit") + self.m_recall_lookups.get(
+            result="store_hit"
+        )
+        # 接口回退命中也属于缓存未命中
+        total = (
+            hits
+            + self.m_recall_lookups.get(result="fallback_hit")
+            + self.m_recall_lookups.get(result="miss")
+        )
         if total == 0:
             return "0%"
-        return f"{(self.cache_hits / total * 100):.1f}%"
+        return f"{(hits / total * 100):.1f}%"
+
+    def _format_metrics_summary(self) -> str:
+        """格式化状态命令中的指标摘要"""
+        lookups = self.m_recall_lookups
+        moderation = self.m_moderation
+        return "\n".join(
+            [
+                f"📥 累计缓存: {int(self.m_messages_cached.total())} 条",
+                f"🔍 撤回查找: 命中 {int(lookups.get(result='hit'))}, 存储命中 {int(lookups.get(result='store_hit'))}, 接口回退命中 {int(lookups.get(result='fallback_hit'))}, 未命中 {int(lookups.get(result='miss'))}",
+                f"🛡️ 审核结果: 拦截 {int(moderation.get(verdict='blocked'))}, 网址 {int(moderation.get(verdict='url'))}, 本地拦截 {int(moderation.get(verdict='local_deny'))}, 本地放行 {int(moderation.get(verdict='local_allow'))}, 通过 {int(moderation.get(verdict='passed'))}, 失败 {int(moderation.get(verdict='error'))}",
+                f"🧠 LLM调用: 锐评 {int(self.m_llm_requests.get(purpose='comment', status='ok'))} 成功/{int(self.m_llm_requests.get(purpose='comment', status='cancelled'))} 取消, 审核 {int(self.m_llm_requests.get(purpose='moderation', status='ok'))} 成功, 合并 {int(self.m_combined_replies.get(result='ok'))} 成功/{int(self.m_combined_replies.get(result='parse_error'))} 解析失败",
+                f"⏳ LLM耗时: 锐评 {self.m_llm_latency.mean(purpose='comment'):.2f}s ({self.m_llm_latency.count(purpose='comment')}次), 审核 {self.m_llm_latency.mean(purpose='moderation'):.2f}s ({self.m_llm_latency.count(purpose='moderation')}次)",
+                f"📏 提示词: 平均约 {self.m_prompt_tokens.mean(purpose='comment'):.0f} tokens ({self.m_prompt_tokens.count(purpose='comment')}次), 截断 {int(self.m_prompt_trimmed.get(kind='truncated'))} 次, 丢弃上下文 {int(self.m_prompt_trimmed.get(kind='context_dropped'))} 条",
+                f"🗃️ 判定缓存: {len(self.verdict_cache)} 条, 命中率 {self.verdict_cache.hit_rate()}; 锐评缓存: {len(self.comment_cache)} 条, 命中率 {self.comment_cache.hit_rate()} ({'复用已启用' if self.enable_comment_reuse else '复用未启用'})",
+                f"🚦 限流: {self._format_rate_limits()}",
+                self._format_image_cache(),
+                self._format_recall_archive(),
+                self._format_near_duplicates(),
+                self._format_recall_dedup(),
+                f"📤 已发送: {int(self.m_recalls_sent.total())} 条 (平均 {self.m_send_latency.mean():.2f}s, 合并连续撤回 {int(self.m_coalesced_recalls.total())} 条)",
+                self._format_comment_delivery(),
+            ]
+        )
+
+    def _format_comment_delivery(self) -> str:
+        if self.comment_deadline <= 0:
+            return "✉️ 两段式发送: 未启用"
+        delivery = self.m_comment_delivery
+        return f"✉️ 两段式发送: 期限 {self.comment_deadline}s, 锐评随撤回 {int(delivery.get(mode='inline'))}, 补发 {int(delivery.get(mode='followup'))}, 超时放弃 {int(delivery.get(mode='dropped'))}"
+
+    def _format_near_duplicates(self) -> str:
+        if self.near_duplicates is None:
+            return "🧬 近似重复: 未启用"
+        lookups = self.m_near_duplicates
+        inherited = int(lookups.get(result="inherited"))
+        audited = int(lookups.get(result="audited"))
+        checked = inherited + audited + int(lookups.get(result="miss"))
+        rate = f"{inherited / checked * 100:.1f}%" if checked else "0%"
+        audits = self.m_near_duplicate_audits
+        return f"🧬 近似重复: {len(self.near_duplicates)} 个指纹, 继承 {inherited} 次 (继承率 {rate}), 抽查 {audited} 次 (一致 {int(audits.get(result='agree'))}, 误匹配 {int(audits.get(result='mismatch'))})"
+
+    def _format_recall_dedup(self) -> str:
+        coordinator = self.recall_coordinator
+        if coordinator is None:
+            return "👥 多账号去重: 未启用"
+        claims = self.m_recall_claims
+        backend = "跨进程" if isinstance(coordinator, SQLiteCoordinator) else "进程内"
+        return f"👥 多账号去重: {backend}, 已处理 {int(claims.get(result='won'))}, 跳过重复 {int(claims.get(result='lost'))}, 协调失败 {int(claims.get(result='error'))}"
+
+    def _format_recall_archive(self) -> str:
+        archive = self.recall_archive
+        if archive is None:
+            return "📜 撤回档案: 未启用"
+        storage = archive.path or "仅内存"
+        return f"📜 撤回档案: {len(archive)}/{archive.max_entries} 条 (已淘汰 {archive.evicted} 条, {storage})"
+
+    def _format_image_cache(self) -> str:
+        store = self.image_store
+        if store is None:
+            return "🖼️ 图片缓存: 未启用"
+        return f"🖼️ 图片缓存: {len(store)} 张, {store.total_bytes / 1048576:.1f}/{store.max_bytes / 1048576:.0f} MB (下载 {store.downloaded}, 重复 {store.deduplicated}, 失败 {store.failed}, 丢弃 {store.dropped}, 淘汰 {store.evicted})"
+
+    def _format_rate_limits(self) -> str:
+        """格式化各令牌桶的当前余量"""
+        parts = []
+        for kind, label in (("llm", "LLM"), ("send", "发送")):
+            if not self.scheduler.enabled(kind):
+                parts.append(f"{label} 不限制")
+                continue
+            levels = self.scheduler.levels(kind)
+            text = ", ".join(
+                f"{'全局' if key == 'global' else '群' + key} {value:.1f}"
+                for key, value in levels.items()
+            )
+            parts.append(f"{label} [{text or '满'}]")
+        limited = int(self.m_rate_limited.total())
+        return f"{'; '.join(parts)} (模式 {self.rate_limit_mode}, 已限流 {limited} 次)"
+
+    def _format_breaker_states(self) -> str:
+        states = self.llm.breaker_states()
+        if not states:
+            return "暂无调用"
+        names = {"closed": "正常", "open": "熔断中", "half_open": "试探中"}
+        return ", ".join(
+            f"{provider_id} {names.get(state, state)}"
+            for provider_id, state in states.items()
+        )
+
+    def _format_group_policies(self) -> str:
+        table = self.group_policies
+        parts = []
+        if table.allowed:
+            parts.append(f"白名单 {len(table.allowed)} 个")
+        if table.denied:
+            parts.append(f"黑名单 {len(table.denied)} 个")
+        if table.overrides:
+            parts.append(f"单独设置 {len(table.overrides)} 个")
+        return ", ".join(parts) if parts else "所有群组"
+
+    def _format_cache_bytes(self) -> str:
+        used = f"{self.message_cache.total_bytes / 1024 / 1024:.2f} MB"
+        if not self.max_cache_bytes:
+            return used
+        return f"{used}/{self.max_cache_bytes / 1024 / 1024:.2f} MB"
 
     @filter.command("防撤回状态", alias={"防撤回测试", "anti_recall_status"})
     async def anti_recall_status(self, event: AstrMessageEvent):
@@ -720,16 +1853,17 @@ class AntiRecallPlugin(Star):
             provider_info = (
                 self.fixed_llm_provider if self.fixed_llm_provider else "使用当前会话"
             )
+            if self.fallback_llm_provider:
+                provider_info += f" (备用 {self.fallback_llm_provider})"
             # 统计各群组的缓存数量
-            group_stats = {}
-            for msg_id, msg_data in self.message_cache.items():
-                group_id = msg_data.get("group_id", "unknown")
-                if group_id not in group_stats:
-                    group_stats[group_id] = 0
-                group_stats[group_id] += 1
+            group_stats = self.message_cache.group_counts()
+            group_bytes = self.message_cache.group_bytes()
 
             group_info = "\n".join(
-                [f"  群组 {gid}: {count} 条" for gid, count in group_stats.items()]
+                [
+                    f"  群组 {gid}: {count} 条, {group_bytes.get(gid, 0) / 1024:.1f} KB"
+                    for gid, count in group_stats.items()
+                ]
             )
 
             status_text = f"""🚫 防撤回插件状态
@@ -741,11 +1875,15 @@ class AntiRecallPlugin(Star):
 📚 上下文分析: {"已启用" if self.enable_context_analysis else "已禁用"} ({self.context_count}条)
 📸 图片撤回: {"已启用" if self.enable_image_recall else "已禁用"}
 💬 群聊监听: {"已启用" if self.enable_group_chat else "已禁用"}
+🎯 群组策略: {self._format_group_policies()}
 👤 私聊监听: {"已启用" if self.enable_private_chat else "已禁用"}
 📝 显示发送者: {"已启用" if self.show_sender_info else "已禁用"}
 🎭 锐评风格: {self.comment_style}
-📊 缓存消息数: {len(self.message_cache)}
+📊 缓存消息数: {len(self.message_cache)}/{self.max_cache_size}, 占用 {self._format_cache_bytes()} (已淘汰 {self.message_cache.evictions} 条)
+⏱️ 过期清理: {self.message_cache.expirations} 条 (撤回保留 {self.recall_ttl}s, 上下文保留 {self.context_ttl}s)
 📈 缓存命中率: {self._get_cache_hit_rate()}
+🔌 熔断状态: {self._format_breaker_states()}
+{self._format_metrics_summary()}
 📁 群组分布:
 {group_info}
 ━━━━━━━━━━━━━━━━━━"""
@@ -759,8 +1897,7 @@ class AntiRecallPlugin(Star):
     async def clear_cache(self, event: AstrMessageEvent):
         """清空消息缓存"""
         try:
-            cache_size = len(self.message_cache)
-            self.message_cache.clear()
+            cache_size = self.message_cache.clear()
             yield event.plain_result(f"✅ 已清空 {cache_size} 条缓存消息")
             logger.info(f"[防撤回插件] 用户 {event.get_sender_name()} 清空了缓存")
         except Exception as e:
@@ -778,22 +1915,98 @@ class AntiRecallPlugin(Star):
             details = "📋 缓存详情 (最近20条):\n"
             details += "━━━━━━━━━━━━━━━━━━\n"
 
-            # 按时间戳排序，显示最新的20条
-            sorted_messages = sorted(
-                self.message_cache.items(),
-                key=lambda x: x[1]["timestamp"],
-                reverse=True,
-            )[:20]
-
-            for msg_id, msg_data in sorted_messages:
+            # 显示最新缓存的20条
+            for msg_id, msg_data in self.message_cache.latest(20):
                 details += f"ID: {msg_id}\n"
-                details += f"  发送者: {msg_data['sender_name']}\n"
-                details += f"  群组: {msg_data['group_id']}\n"
-                details += f"  内容: {msg_data['content'][:30]}...\n"
-                details += f"  时间: {msg_data['timestamp']}\n"
+                details += f"  发送者: {msg_data.sender_name}\n"
+                details += f"  群组: {msg_data.group_id}\n"
+                details += f"  内容: {msg_data.content[:30]}...\n"
+                details += f"  时间: {msg_data.timestamp}\n"
                 details += "─" * 30 + "\n"
 
             yield event.plain_result(details)
         except Exception as e:
             logger.error(f"[防撤回插件] 显示缓存详情失败: {e}")
             yield event.plain_result(f"显示缓存详情失败: {e}")
+
+    @filter.command("撤回记录", alias={"recall_history", "查撤回"})
+    async def show_recall_history(self, event: AstrMessageEvent):
+        """查询撤回档案
+
+        用法: /撤回记录 [@用户 或 用户:QQ号] [群:群号] [天:N] [页:N] [关键词...]
+        需要管理员权限；在群聊中只能查询本群，私聊中可用 群: 指定群组。
+        """
+        try:
+            if self.recall_archive is None:
+                yield event.plain_result("撤回档案未启用")
+                return
+
+            # 撤回的内容本就是发送者不想公开的，只允许管理员查询
+            if not getattr(event, "is_admin", lambda: False)():
+                yield event.plain_result("查询撤回记录需要管理员权限")
+                return
+
+            query = self._parse_history_query(event)
+            current_group = event.get_group_id()
+            if current_group:
+                query["group_id"] = current_group
+
+            page = query.pop("page")
+            page_size = 10
+            start = time.perf_counter()
+            entries, has_more = self.recall_archive.search(
+                offset=(page - 1) * page_size, limit=page_size, **query
+            )
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            if not entries:
+                yield event.plain_result("📜 没有符合条件的撤回记录")
+                return
+
+            details = f"📜 撤回记录 (第 {page} 页, 查询耗时 {elapsed_ms:.1f}ms):\n"
+            details += "━━━━━━━━━━━━━━━━━━\n"
+            for entry in entries:
+                record = entry.record
+                recalled_at = time.strftime(
+                    "%m-%d %H:%M", time.localtime(entry.recalled_at)
+                )
+                details += f"[{recalled_at}] {record.sender_name}({record.sender_id})"
+                if not current_group:
+                    details += f" 群 {record.group_id}"
+                details += f"\n  {record.message_type}: {record.content[:100]}\n"
+                details += "─" * 30 + "\n"
+            if has_more:
+                details += f"发送 /撤回记录 页:{page + 1} （及相同条件）查看下一页"
+
+            yield event.plain_result(details)
+        # 与其他命令一致，出错时把错误回复给查询者
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"[防撤回插件] 查询撤回记录失败: {e}")
+            yield event.plain_result(f"查询撤回记录失败: {e}")
+
+    @staticmethod
+    def _parse_history_query(event: AstrMessageEvent) -> dict:
+        """解析撤回记录命令的参数"""
+        query = {"sender_id": None, "group_id": None, "since": None, "page": 1}
+        keywords = []
+        parts = (getattr(event, "message_str", "") or "").split()
+        # 第一个词是命令本身
+        for part in parts[1:]:
+            key, sep, value = part.replace("：", ":").partition(":")
+            if sep and key in ("用户", "user") and value:
+                query["sender_id"] = value
+            elif sep and key in ("群", "group") and value:
+                query["group_id"] = value
+            elif sep and key in ("天", "days") and value.isdigit():
+                query["since"] = time.time() - int(value) * 86400
+            elif sep and key in ("页", "page") and value.isdigit():
+                query["page"] = max(int(value), 1)
+            elif not part.startswith("@"):
+                keywords.append(part)
+        # @用户 作为发送者条件
+        for component in getattr(event.message_obj, "message", None) or ():
+            qq = getattr(component, "qq", None)
+            if qq is not None and str(qq) != str(event.get_self_id()):
+                query["sender_id"] = str(qq)
+        query["keyword"] = " ".join(keywords)
+        return query
@@ -0,0 +1,140 @@
+"""撤回档案测试：分词、索引查询、翻页、淘汰和文件持久化"""
+
+import asyncio
+
+from anti_recall import CachedMessage, RecallArchive
+from anti_recall.archive import tokenize
+
+
+def _record(content, sender_id="1", group_id="100", timestamp=0):
+    return CachedMessage(content, sender_id, "群友", group_id, timestamp, "文本")
+
+
+def _ids(result):
+    entries, _ = result
+    return [entry.message_id for entry in entries]
+
+
+def test_tokenize_words_and_cjk_bigrams():
+    assert tokenize("Hello 今天吃什么 42") == {
+        "hello",
+        "42",
+        "今天",
+        "天吃",
+        "吃什",
+        "什么",
+    }
+    assert tokenize("好") == {"好"}
+
+
+def test_search_filters_newest_first():
+    archive = RecallArchive()
+    archive.add("1", _record("今天开黑", sender_id="a", group_id="100"), 10)
+    archive.add("2", _record("明天加班", sender_id="b", group_id="100"), 20)
+    archive.add("3", _record("今天加班", sender_id="a", group_id="200"), 30)
+
+    assert _ids(archive.search()) == ["3", "2", "1"]
+    assert _ids(archive.search(group_id="100")) == ["2", "1"]
+    assert _ids(archive.search(sender_id="a")) == ["3", "1"]
+    assert _ids(archive.search(group_id="100", sender_id="a")) == ["1"]
+    assert _ids(archive.search(keyword="加班")) == ["3", "2"]
+    assert _ids(archive.search(keyword="今天 加班")) == ["3"]
+    # 单个中文字符没有二元词项，逐条核对内容
+    assert _ids(archive.search(keyword="明")) == ["2"]
+    assert _ids(archive.search(since=15, until=25)) == ["2"]
+    assert _ids(archive.search(group_id="300")) == []
+
+
+def test_keyword_matches_whole_ascii_words():
+    archive = RecallArchive()
+    archive.add("1", _record("steam sale"), 1)
+    archive.add("2", _record("steamed buns"), 2)
+
+    assert _ids(archive.search(keyword="STEAM")) == ["1"]
+
+
+def test_paging():
+    archive = RecallArchive()
+    for i in range(25):
+        archive.add(str(i), _record(f"消息{i}"), i)
+
+    entries, has_more = archive.search(limit=10)
+    assert [e.message_id for e in entries] == [str(i) for i in range(24, 14, -1)]
+    assert has_more
+    entries, has_more = archive.search(offset=20, limit=10)
+    assert [e.message_id for e in entries] == [str(i) for i in range(4, -1, -1)]
+    assert not has_more
+
+
+def test_eviction_removes_oldest_from_every_index():
+    archive = RecallArchive(max_entries=3)
+    archive.add("1", _record("红包来了", sender_id="a", group_id="100"), 1)
+    archive.add("2", _record("普通消息", sender_id="b", group_id="200"), 2)
+    archive.add("3", _record("普通消息", sender_id="b", group_id="200"), 3)
+    archive.add("4", _record("普通消息", sender_id="b", group_id="200"), 4)
+
+    assert len(archive) == 3
+    assert archive.evicted == 1
+    assert _ids(archive.search(keyword="红包")) == []
+    assert _ids(archive.search(sender_id="a")) == []
+    assert archive.group_counts() == {"200": 3}
+
+
+def test_file_persistence_and_reload(tmp_path):
+    path = str(tmp_path / "recalls.jsonl")
+
+    async def write():
+        archive = RecallArchive(max_entries=2, path=path)
+        await archive.start()
+        for i in range(3):
+            archive.add(
+                str(i), _record(f"第{i}条撤回", timestamp=i), i, operator_id="9"
+            )
+        await archive.close()
+
+    async def reload():
+        archive = RecallArchive(max_entries=2, path=path)
+        await archive.start()
+        await archive.close()
+        return archive
+
+    asyncio.run(write())
+    archive = asyncio.run(reload())
+
+    entries, _ = archive.search()
+    assert [e.message_id for e in entries] == ["2", "1"]
+    assert entries[0].record.content == "第2条撤回"
+    assert entries[0].operator_id == "9"
+    assert _ids(archive.search(keyword="撤回")) == ["2", "1"]
+
+
+def test_failed_write_is_retried(tmp_path):
+    path = str(tmp_path / "recalls.jsonl")
+    errors = []
+
+    async def run():
+        archive = RecallArchive(path=path, on_error=errors.append)
+        append_lines = archive._append_lines
+        calls = []
+
+        def flaky(lines):
+            calls.append(len(lines))
+            if len(calls) == 1:
+                raise OSError("disk full")
+            append_lines(lines)
+
+        archive._append_lines = flaky
+        archive.add("1", _record("第一条"), 1)
+        try:
+            await archive.flush()
+        except OSError:
+            pass
+        archive.add("2", _record("第二条"), 2)
+        await archive.close()
+        return archive
+
+    archive = asyncio.run(run())
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert archive.write_errors == 0
+    assert not errors
@@ -0,0 +1,133 @@
+"""图片本地缓存测试，用本地 http.server 代替图片服务器"""
+
+import asyncio
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from anti_recall import ImageBlobStore
+
+IMAGES = {
+    "/a.png": b"A" * 4000,
+    "/a-copy.png": b"A" * 4000,
+    "/b.png": b"B" * 4000,
+    "/c.png": b"C" * 4000,
+    "/expired.png": b"<html>expired</html>",
+}
+
+
+class _ImageHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        data = IMAGES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        # 过期的图片地址返回 HTML 页面
+        content_type = "text/html" if self.path == "/expired.png" else "image/png"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+async def _prefetch_all(store: ImageBlobStore, urls):
+    await store.start()
+    try:
+        for url in urls:
+            store.prefetch(url)
+            # 逐张等待下载完成，淘汰顺序与请求顺序一致
+            await store._queue.join()
+    finally:
+        await store.close()
+
+
+def test_same_content_is_stored_once(tmp_path, server_url):
+    store = ImageBlobStore(str(tmp_path), workers=2)
+    urls = [f"{server_url}/a.png", f"{server_url}/a-copy.png"]
+    asyncio.run(_prefetch_all(store, urls))
+
+    assert store.downloaded == 1
+    assert store.deduplicated == 1
+    assert len(store) == 1
+    assert store.path_for(urls[0]) == store.path_for(urls[1])
+    digest = hashlib.sha256(IMAGES["/a.png"]).hexdigest()
+    assert sorted(os.listdir(tmp_path)) == [digest, "urls.jsonl"]
+
+
+def test_not_found_counts_as_failure(tmp_path, server_url):
+    store = ImageBlobStore(str(tmp_path))
+    url = f"{server_url}/missing.png"
+    asyncio.run(_prefetch_all(store, [url]))
+
+    assert store.failed == 1
+    assert store.downloaded == 0
+    assert store.path_for(url) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_non_image_response_is_rejected(tmp_path, server_url):
+    store = ImageBlobStore(str(tmp_path))
+    url = f"{server_url}/expired.png"
+    asyncio.run(_prefetch_all(store, [url]))
+
+    assert store.failed == 1
+    assert store.path_for(url) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_size_cap_evicts_oldest(tmp_path, server_url):
+    store = ImageBlobStore(str(tmp_path), max_bytes=9000)
+    urls = [f"{server_url}/{name}.png" for name in ("a", "b", "c")]
+    asyncio.run(_prefetch_all(store, urls))
+
+    assert store.evicted == 1
+    assert store.total_bytes == 8000
+    assert store.path_for(urls[0]) is None
+    assert store.path_for(urls[1]) is not None
+    assert store.path_for(urls[2]) is not None
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_url_index_survives_restart(tmp_path, server_url):
+    urls = [f"{server_url}/{name}.png" for name in ("a", "a-copy", "b", "c")]
+    asyncio.run(_prefetch_all(ImageBlobStore(str(tmp_path), max_bytes=9000), urls))
+
+    store = ImageBlobStore(str(tmp_path), max_bytes=9000)
+    asyncio.run(_prefetch_all(store, []))
+
+    assert store.path_for(urls[0]) is None
+    assert store.path_for(urls[1]) is None
+    assert store.path_for(urls[2]) is not None
+    assert store.path_for(urls[3]) is not None
+    assert store.total_bytes == 8000
+    # 压缩后的索引只保留仍有文件的地址
+    with open(tmp_path / "urls.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+
+def test_unreferenced_blobs_are_removed_on_load(tmp_path):
+    orphan = tmp_path / hashlib.sha256(b"orphan").hexdigest()
+    orphan.write_bytes(b"orphan")
+
+    store = ImageBlobStore(str(tmp_path))
+    asyncio.run(_prefetch_all(store, []))
+
+    assert len(store) == 0
+    assert not orphan.exists()
@@ -0,0 +1,201 @@
+"""消息缓存测试：淘汰顺序、群组保底与上限、上下文索引和过期清理"""
+
+import random
+
+import pytest
+
+from anti_recall import CachedMessage, MessageCache, TTLCache
+from anti_recall.cache import entry_size
+from anti_recall.timeline import GroupTimeline
+
+
+def _record(group_id="100", timestamp=0, message_type="文本", content="消息"):
+    return CachedMessage(content, "1", "群友", group_id, timestamp, message_type)
+
+
+def test_evicts_in_insertion_order():
+    cache = MessageCache(max_size=3)
+    for i in range(5):
+        cache.put(str(i), _record(timestamp=i))
+
+    assert cache.keys() == ["2", "3", "4"]
+    assert cache.evictions == 2
+    assert cache.get("0") is None
+
+
+def test_reinserting_moves_to_newest():
+    cache = MessageCache(max_size=3)
+    for i in range(3):
+        cache.put(str(i), _record(timestamp=i))
+    cache.put("0", _record(timestamp=3))
+    cache.put("3", _record(timestamp=4))
+
+    assert cache.keys() == ["2", "0", "3"]
+
+
+def test_byte_budget():
+    record_size = entry_size("0", _record())
+    cache = MessageCache(max_size=100, max_bytes=record_size * 3)
+    for i in range(5):
+        cache.put(str(i), _record(timestamp=i))
+
+    assert len(cache) == 3
+    assert cache.total_bytes == sum(cache.group_bytes().values())
+    assert cache.total_bytes <= record_size * 3
+
+
+def test_min_group_messages_keeps_quiet_groups():
+    cache = MessageCache(max_size=10, min_group_messages=2)
+    cache.put("quiet-1", _record(group_id="quiet", timestamp=0))
+    cache.put("quiet-2", _record(group_id="quiet", timestamp=1))
+    for i in range(20):
+        cache.put(f"flood-{i}", _record(group_id="flood", timestamp=2 + i))
+
+    assert cache.group_counts() == {"quiet": 2, "flood": 8}
+    assert "quiet-1" in cache
+    assert cache.keys()[2:] == [f"flood-{i}" for i in range(12, 20)]
+
+
+def test_group_limits():
+    cache = MessageCache(max_size=100, group_limits={"100": 2})
+    for i in range(4):
+        cache.put(f"a{i}", _record(group_id="100", timestamp=i))
+        cache.put(f"b{i}", _record(group_id="200", timestamp=i))
+
+    assert cache.group_counts() == {"100": 2, "200": 4}
+    assert "a2" in cache and "a3" in cache and "a1" not in cache
+
+
+def test_reused_message_id_in_other_group():
+    # 多账号共用缓存时，同一消息 ID 可能先后出现在不同群组
+    cache = MessageCache(max_size=100, group_limits={"A": 2})
+    cache.put("1", _record(group_id="A", timestamp=1))
+    cache.put("2", _record(group_id="A", timestamp=2))
+    cache.pop("2")
+    cache.put("2", _record(group_id="B", timestamp=3))
+    cache.put("3", _record(group_id="A", timestamp=4))
+    cache.put("4", _record(group_id="A", timestamp=5))
+    cache.put("5", _record(group_id="A", timestamp=6))
+
+    assert cache.group_counts() == {"A": 2, "B": 1}
+    assert cache.get("2").group_id == "B"
+    assert "4" in cache and "5" in cache
+
+
+def test_recent_in_group_skips_deleted_messages():
+    cache = MessageCache(max_size=100)
+    for i in range(10):
+        cache.put(str(i), _record(timestamp=i))
+    cache.put("img", _record(timestamp=5, message_type="图片"))
+    cache.pop("7")
+    cache.pop("8")
+
+    ids = [message_id for message_id, _ in cache.recent_in_group("100", 9, 3)]
+    assert ids == ["4", "5", "6"]
+    assert cache.recent_in_group("200", 9, 3) == []
+
+
+def test_timeline_out_of_order_and_compaction():
+    timeline = GroupTimeline()
+    for i in range(0, 400, 2):
+        timeline.add(i, str(i))
+    timeline.add(101, "late")
+    for i in range(0, 300, 2):
+        assert timeline.remove(i, str(i))
+
+    assert not timeline.remove(0, "0")
+    assert len(timeline) == 51
+    assert timeline.recent_before(305, 3) == ["300", "302", "304"]
+    assert timeline.recent_before(102, 5) == ["late"]
+
+
+def test_expire_uses_recall_and_context_ttl():
+    cache = MessageCache(max_size=100, recall_ttl=60, context_ttl=600)
+    cache.put("text", _record(timestamp=0))
+    cache.put("image", _record(timestamp=0, message_type="图片"))
+    cache.put("new", _record(timestamp=500))
+
+    assert cache.expire(100) == 1
+    assert "image" not in cache and "text" in cache
+    assert cache.expire(700) == 1
+    assert cache.keys() == ["new"]
+    assert cache.recent_in_group("100", 1000, 5) == [("new", cache.get("new"))]
+
+
+def test_ttl_cache(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("anti_recall.ttl_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    # 最近使用的 a 保留，b 被淘汰
+    assert cache.get("b") is None
+    assert cache.peek("a") == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.peek("c") is None
+
+
+class _CheckedCache(MessageCache):
+    """每次选择淘汰对象时与逐个群组扫描的结果比对"""
+
+    def _eviction_victim(self):
+        victim = super()._eviction_victim()
+        quota = self.min_group_messages
+        oldest = next(iter(self._entries))
+        over = {
+            group_id: self._group_bytes[group_id]
+            for group_id, count in self._group_counts.items()
+            if count > quota
+        }
+        if self._group_counts[self._entries[oldest].group_id] > quota or not over:
+            assert victim == oldest
+        else:
+            group_id = self._entries[victim].group_id
+            assert self._group_bytes[group_id] == max(over.values())
+            oldest_in_group = next(
+                message_id
+                for message_id, record in self._entries.items()
+                if record.group_id == group_id
+            )
+            assert victim == oldest_in_group
+        return victim
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_randomized_against_brute_force(seed):
+    rng = random.Random(seed)
+    groups = [str(i) for i in range(8)]
+    cache = _CheckedCache(
+        max_size=60,
+        max_bytes=12000,
+        min_group_messages=3,
+        group_limits={"0": 5, "1": 10},
+    )
+    for step in range(3000):
+        # 消息 ID 在群组之间重复使用，模拟多账号共用缓存
+        message_id = str(rng.randrange(200))
+        if rng.random() < 0.2:
+            cache.pop(message_id)
+        else:
+            group_id = groups[min(int(rng.paretovariate(1.0)) - 1, 7)]
+            content = "x" * rng.randint(1, 200)
+            message_type = rng.choice(("文本", "图片"))
+            cache.put(message_id, _record(group_id, step, message_type, content))
+
+        counts = {}
+        sizes = {}
+        for key, record in cache.items():
+            counts[record.group_id] = counts.get(record.group_id, 0) + 1
+            sizes[record.group_id] = sizes.get(record.group_id, 0) + entry_size(
+                key, record
+            )
+        assert cache.group_counts() == counts
+        assert cache.group_bytes() == sizes
+        assert cache.total_bytes == sum(sizes.values())
+        assert len(cache) <= 60
+        assert counts.get("0", 0) <= 5 and counts.get("1", 0) <= 10
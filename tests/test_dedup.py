@@ -0,0 +1,99 @@
+"""撤回去重测试：进程内租约和 SQLite 租约的竞争、续用与过期"""
+
+import asyncio
+
+import pytest
+
+from anti_recall import LocalCoordinator, RecallCoordinator, SQLiteCoordinator
+
+
+def test_coordinator_requires_claim():
+    with pytest.raises(TypeError):
+        RecallCoordinator()
+
+
+def test_local_claim_and_holder(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("anti_recall.dedup.time.monotonic", lambda: now[0])
+    coordinator = LocalCoordinator(lease=30)
+
+    async def run():
+        assert await coordinator.claim("100", "1", "bot-a")
+        # 持有者重复申请仍然成功，其他账号失败
+        assert await coordinator.claim("100", "1", "bot-a")
+        assert not await coordinator.claim("100", "1", "bot-b")
+        # 不同群的相同消息 ID 互不影响
+        assert await coordinator.claim("200", "1", "bot-b")
+
+    asyncio.run(run())
+    assert coordinator.holder("100", "1") == "bot-a"
+    assert coordinator.holder("100", "2") is None
+    assert len(coordinator) == 2
+
+
+def test_local_lease_expires(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("anti_recall.dedup.time.monotonic", lambda: now[0])
+    coordinator = LocalCoordinator(lease=30)
+
+    async def run():
+        assert await coordinator.claim("100", "1", "bot-a")
+        now[0] = 30
+        assert coordinator.holder("100", "1") is None
+        assert await coordinator.claim("100", "1", "bot-b")
+
+    asyncio.run(run())
+    assert coordinator.holder("100", "1") == "bot-b"
+    assert len(coordinator) == 1
+
+
+def test_sqlite_other_instance_wins(tmp_path):
+    path = str(tmp_path / "leases.db")
+
+    async def run():
+        first = SQLiteCoordinator(path, lease=30)
+        second = SQLiteCoordinator(path, lease=30)
+        await first.start()
+        await second.start()
+        try:
+            results = await asyncio.gather(
+                first.claim("100", "1", "bot-a"), second.claim("100", "1", "bot-b")
+            )
+            assert sorted(results) == [False, True]
+            winner = "bot-a" if results[0] else "bot-b"
+            # 获胜者在任一实例上重复申请都成功，失败者始终失败
+            for coordinator in (first, second):
+                assert await coordinator.claim("100", "1", winner)
+                assert not await coordinator.claim(
+                    "100", "1", "bot-b" if winner == "bot-a" else "bot-a"
+                )
+            assert await second.claim("200", "1", "bot-b")
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(run())
+
+
+def test_sqlite_expired_lease_can_be_reclaimed(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("anti_recall.dedup.time.time", lambda: now[0])
+    path = str(tmp_path / "leases.db")
+
+    async def run():
+        first = SQLiteCoordinator(path, lease=30)
+        second = SQLiteCoordinator(path, lease=30)
+        await first.start()
+        await second.start()
+        try:
+            assert await first.claim("100", "1", "bot-a")
+            now[0] += 29
+            assert not await second.claim("100", "1", "bot-b")
+            now[0] += 1
+            assert await second.claim("100", "1", "bot-b")
+            assert not await first.claim("100", "1", "bot-a")
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(run())
@@ -0,0 +1,85 @@
+"""get_msg 回退查询测试，用模拟的适配器 call_action 代替协议端"""
+
+import asyncio
+
+from anti_recall import RecallFallback
+
+
+class FakeAdapter:
+    """按消息 ID 返回预设结果的 call_action；delay 秒后才返回，用于模拟超时"""
+
+    def __init__(self, messages=None, delay: float = 0):
+        self.messages = messages or {}
+        self.delay = delay
+        self.calls = []
+
+    async def call_action(self, action, **params):
+        self.calls.append((action, params))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if params["message_id"] not in self.messages:
+            raise RuntimeError("消息不存在")
+        return self.messages[params["message_id"]]
+
+
+def _get_msg(text, **fields):
+    data = {"time": 1700000000, "message": [{"type": "text", "data": {"text": text}}]}
+    data.update(fields)
+    return data
+
+
+def test_fetch_hit():
+    adapter = FakeAdapter(
+        {123: _get_msg("被撤回的消息", sender={"user_id": 10001, "card": "群名片"})}
+    )
+    fallback = RecallFallback()
+
+    record = asyncio.run(fallback.fetch(adapter.call_action, "123", "456"))
+
+    assert adapter.calls == [("get_msg", {"message_id": 123})]
+    assert record.content == "被撤回的消息"
+    assert record.sender_id == "10001"
+    assert record.sender_name == "群名片"
+    assert record.group_id == "456"
+    assert record.timestamp == 1700000000
+    assert fallback.fetched == 1
+
+
+def test_fetch_uses_notice_sender_when_missing():
+    adapter = FakeAdapter({123: _get_msg("没有发送者信息")})
+    fallback = RecallFallback()
+
+    record = asyncio.run(fallback.fetch(adapter.call_action, "123", "456", 10001))
+    assert record.sender_id == "10001"
+
+    # 通知中也没有发送者时无法构建转发节点，视为获取失败
+    adapter.messages[124] = _get_msg("没有发送者信息")
+    assert asyncio.run(fallback.fetch(adapter.call_action, "124", "456")) is None
+    assert fallback.not_found == 1
+
+
+def test_negative_cache_skips_repeated_lookups():
+    adapter = FakeAdapter()
+    fallback = RecallFallback()
+
+    assert asyncio.run(fallback.fetch(adapter.call_action, "404")) is None
+    assert asyncio.run(fallback.fetch(adapter.call_action, "404")) is None
+
+    assert len(adapter.calls) == 1
+    assert fallback.not_found == 1
+    assert fallback.skipped == 1
+
+
+def test_timeout_is_not_negative_cached():
+    adapter = FakeAdapter({123: _get_msg("慢", user_id=10001)}, delay=0.2)
+    fallback = RecallFallback(timeout=0.05)
+
+    assert asyncio.run(fallback.fetch(adapter.call_action, "123")) is None
+    assert fallback.timeouts == 1
+
+    # 超时是暂时失败，协议端恢复后仍会再次请求
+    adapter.delay = 0
+    record = asyncio.run(fallback.fetch(adapter.call_action, "123"))
+    assert record.sender_id == "10001"
+    assert len(adapter.calls) == 2
+    assert fallback.skipped == 0
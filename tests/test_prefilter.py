@@ -0,0 +1,72 @@
+"""本地审核测试：网址、关键词与正则拦截，放行规则和无法合并的正则"""
+
+from anti_recall import ALLOW, DENY, UNDECIDED, LocalFilter
+
+
+def test_urls_are_denied_unless_disabled():
+    local_filter = LocalFilter()
+    assert local_filter.check("看这个 https://example.com/a") == (DENY, "url")
+    assert local_filter.check("www.example.com") == (DENY, "url")
+    assert local_filter.check("今天吃什么") == (UNDECIDED, None)
+    assert LocalFilter(block_urls=False).check("https://example.com") == (
+        UNDECIDED,
+        None,
+    )
+
+
+def test_keywords_match_literally_and_longest_first():
+    local_filter = LocalFilter(blocked_keywords=["代开", "代开发票", "a.b", ""])
+    assert local_filter.check("专业代开发票") == (DENY, "keyword:代开发票")
+    assert local_filter.check("可以代开吗") == (DENY, "keyword:代开")
+    # 关键词按字面匹配，"." 不是通配符
+    assert local_filter.check("a.b") == (DENY, "keyword:a.b")
+    assert local_filter.check("axb") == (UNDECIDED, None)
+
+
+def test_patterns_ignore_case():
+    local_filter = LocalFilter(blocked_patterns=[r"v\s*x\s*\d{5,}"])
+    assert local_filter.check("加 VX 123456") == (DENY, "keyword:VX 123456")
+    assert local_filter.check("vx 12") == (UNDECIDED, None)
+
+
+def test_allow_rules_match_whole_content():
+    local_filter = LocalFilter(
+        blocked_keywords=["广告"],
+        allowed_keywords=["好的", "收到"],
+        allowed_patterns=[r"[哈h]+"],
+    )
+    assert local_filter.check("  收到 ") == (ALLOW, None)
+    assert local_filter.check("哈哈哈hh") == (ALLOW, None)
+    assert local_filter.check("好的，我看看") == (UNDECIDED, None)
+    # 拦截优先于放行
+    assert local_filter.check("广告") == (DENY, "keyword:广告")
+
+
+def test_invalid_patterns_are_reported():
+    local_filter = LocalFilter(
+        blocked_patterns=["(未闭合", "有效"], allowed_patterns=["[坏"]
+    )
+    assert local_filter.invalid_patterns == ["(未闭合", "[坏"]
+    assert local_filter.check("有效内容") == (DENY, "keyword:有效")
+
+
+def test_unmergeable_patterns_are_compiled_separately():
+    local_filter = LocalFilter(
+        blocked_keywords=["广告"],
+        blocked_patterns=[
+            r"(?P<url>假网址)",
+            r"(?i)SPAM",
+            r"(\w)\1{4}",
+            r"(?P<word>刷)(?P=word)",
+        ],
+        allowed_patterns=[r"(?P<laugh>哈)+"],
+    )
+    assert len(local_filter._deny_separate) == 4
+    # 与 url 分组同名也不会被当成网址
+    assert local_filter.check("假网址") == (DENY, "keyword:假网址")
+    assert local_filter.check("spam") == (DENY, "keyword:spam")
+    assert local_filter.check("啊啊啊啊啊") == (DENY, "keyword:啊啊啊啊啊")
+    assert local_filter.check("刷刷") == (DENY, "keyword:刷刷")
+    assert local_filter.check("广告") == (DENY, "keyword:广告")
+    assert local_filter.check("哈哈") == (ALLOW, None)
+    assert local_filter.check("啊啊") == (UNDECIDED, None)
@@ -0,0 +1,84 @@
+"""限流测试：令牌桶补充、群组与全局两级额度和排队等待"""
+
+import asyncio
+
+import pytest
+
+from anti_recall import RecallScheduler, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("anti_recall.ratelimit.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refill(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    bucket.consume(3)
+    assert bucket.wait_time() == 1
+    clock[0] = 2
+    assert bucket.level() == 2
+    clock[0] = 100
+    assert bucket.level() == 3
+    # 超过容量的请求按容量计算，不会永远等不到
+    assert bucket.wait_time(10) == 0
+
+
+def test_limit_of_two_per_group(clock):
+    scheduler = RecallScheduler({"llm": (2, 0)})
+    assert scheduler.enabled("llm")
+    assert not scheduler.enabled("send")
+
+    # 每群每分钟 2 次：合并调用失败后的两次回退调用只剩 1 个令牌，不扣除
+    assert scheduler.try_acquire("llm", "100")
+    assert not scheduler.try_acquire("llm", "100", 2)
+    assert scheduler.try_acquire("llm", "100")
+    assert not scheduler.try_acquire("llm", "100")
+    # 其他群组有各自的额度
+    assert scheduler.try_acquire("llm", "200", 2)
+    clock[0] = 30
+    assert scheduler.try_acquire("llm", "100")
+    assert not scheduler.try_acquire("llm", "100")
+
+
+def test_group_and_global_limits_consume_together(clock):
+    scheduler = RecallScheduler({"llm": (2, 3)})
+    assert scheduler.try_acquire("llm", "100", 2)
+    # 全局桶还剩 1 个，群组桶已空，两边都不扣除
+    assert not scheduler.try_acquire("llm", "100")
+    assert scheduler.levels("llm") == {"global": 1, "100": 0}
+    assert scheduler.try_acquire("llm", "200")
+    assert not scheduler.try_acquire("llm", "300")
+    assert scheduler.levels("llm") == {
+        "global": 0,
+        "100": 0,
+        "200": 1,
+        "300": 2,
+    }
+
+
+def test_unlimited_kind_always_succeeds():
+    scheduler = RecallScheduler({"llm": (0, 0)})
+    assert not scheduler.enabled("llm")
+    assert all(scheduler.try_acquire("llm", "100") for _ in range(100))
+    assert scheduler.levels("llm") == {}
+
+
+def test_acquire_waits_until_refill(clock, monkeypatch):
+    async def fake_sleep(seconds):
+        clock[0] += seconds
+
+    monkeypatch.setattr("anti_recall.ratelimit.asyncio.sleep", fake_sleep)
+    scheduler = RecallScheduler({"send": (2, 0)})
+
+    async def run():
+        assert scheduler.try_acquire("send", "100", 2)
+        # 每 30 秒补充 1 个令牌，等待上限不够时立即放弃
+        assert not await scheduler.acquire("send", "100", 1, timeout=10)
+        assert clock[0] == 0
+        assert await scheduler.acquire("send", "100", 1, timeout=60)
+        assert clock[0] == 30
+
+    asyncio.run(run())
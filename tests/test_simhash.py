@@ -0,0 +1,92 @@
+"""近似重复检测测试：SimHash 指纹的稳定性和指纹索引的查找、过期与淘汰"""
+
+import time
+
+import pytest
+
+from anti_recall import SimHashIndex, simhash
+
+TEXT = "今晚八点老地方见，记得带上上次借的那本书和充电器"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    # anti_recall.simhash 被同名函数遮住，直接替换 time.monotonic
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_short_text_has_no_fingerprint():
+    assert simhash("好的！！！😂", min_chars=10) is None
+    assert simhash("好的", min_chars=0) is not None
+
+
+def test_punctuation_and_case_are_ignored():
+    assert simhash(TEXT) == simhash(f"  {TEXT}！！😂😂")
+    assert simhash("Hello World, see you tomorrow") == simhash(
+        "hello world see you TOMORROW"
+    )
+
+
+def test_small_edits_stay_close():
+    fingerprint = simhash(TEXT)
+    edited = simhash(TEXT.replace("八点", "九点"))
+    unrelated = simhash("明天上午的会议改到三楼的小会议室开，别走错了")
+    assert (fingerprint ^ edited).bit_count() <= 10
+    assert (fingerprint ^ unrelated).bit_count() > 10
+
+
+def test_lookup_within_distance(clock):
+    index = SimHashIndex(max_distance=3)
+    index.add(0b1111, True)
+
+    assert index.lookup(0b1111) == (True, 0)
+    assert index.lookup(0b0111) == (True, 1)
+    assert index.lookup(0b1111 ^ (0b111 << 40)) == (True, 3)
+    assert index.lookup(0) is None
+
+
+def test_lookup_prefers_closest(clock):
+    index = SimHashIndex(max_distance=6)
+    index.add(0b111, "far")
+    index.add(0b1, "near")
+
+    assert index.lookup(0) == ("near", 1)
+
+
+def test_expired_closest_match_does_not_hide_valid_one(clock):
+    index = SimHashIndex(max_distance=6, ttl=100)
+    index.add(0b1, "near")
+    clock[0] = 60
+    index.add(0b111, "far")
+    clock[0] = 120
+
+    assert index.lookup(0) == ("far", 3)
+    assert len(index) == 1
+
+
+def test_expired_entries_are_not_returned(clock):
+    index = SimHashIndex(ttl=100)
+    index.add(42, False)
+    clock[0] = 100
+
+    assert index.lookup(42) is None
+    assert len(index) == 0
+
+
+def test_max_size_evicts_oldest(clock):
+    index = SimHashIndex(max_distance=0, max_size=2)
+    index.add(1, "a")
+    index.add(2, "b")
+    # 重新写入的指纹移到最新
+    index.add(1, "a2")
+    index.add(3, "c")
+
+    assert len(index) == 2
+    assert index.lookup(2) is None
+    assert index.lookup(1) == ("a2", 0)
+    assert index.lookup(3) == ("c", 0)
+    index.clear()
+    assert len(index) == 0
+    assert index.lookup(1) is None